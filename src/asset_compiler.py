@@ -0,0 +1,128 @@
+import os
+import json
+import pickle
+import hashlib
+
+# bump when the compiled format or the kept fields change, so old snapshots are rebuilt
+SNAPSHOT_VERSION = 2
+
+# the fields of a unit record the bot reads (see Unit, UpgradeTable and StaticData.unit_index), everything else is dropped
+UNIT_FIELDS = ("TID", "UpgradeTimeH", "UpgradeTimeD", "UpgradeCost", "UpgradeResource",
+               "RequiredTownHallLevel", "LaboratoryLevel", "ProductionBuilding", "BarrackLevel", "SpellForgeLevel",
+               "DisableProduction")
+# buildings are only needed for the townhall levels they (and the laboratory) are available at
+BUILDING_FIELDS = ("TownHallLevel",)
+
+# registry name -> fields kept of each record, assets not listed are kept whole
+ASSET_FIELDS = {
+    "buildings": BUILDING_FIELDS,
+    "characters": UNIT_FIELDS,
+    "heroes": UNIT_FIELDS,
+    "pets": UNIT_FIELDS,
+    "spells": UNIT_FIELDS,
+}
+
+
+def source_checksum(assets_dir: str, asset_files: dict) -> str:
+    """Hash the source JSON files, so a snapshot can be checked against the assets it was compiled from
+
+    Args:
+        assets_dir (str): Directory of the asset files
+        asset_files (dict): Registry name -> file in assets_dir
+
+    Returns:
+        str: Hex sha256 digest
+    """
+    digest = hashlib.sha256(f"v{SNAPSHOT_VERSION}".encode())
+    for name, file_name in sorted(asset_files.items()):
+        digest.update(name.encode())
+        with open(os.path.join(assets_dir, file_name), "rb") as f:
+            digest.update(f.read())
+
+    return digest.hexdigest()
+
+
+def strip_records(asset: dict, fields: tuple) -> dict:
+    """Keep only the given fields of every record of an asset
+
+    Args:
+        asset (dict): Parsed asset, record name -> record
+        fields (tuple): Field names to keep
+
+    Returns:
+        dict: The stripped asset
+    """
+    return {sc_name: {field: record[field] for field in fields if field in record}
+            for sc_name, record in asset.items()}
+
+
+def compile_assets(assets_dir: str, asset_files: dict) -> dict:
+    """Parse the asset files and drop everything the bot does not use
+
+    Args:
+        assets_dir (str): Directory of the asset files
+        asset_files (dict): Registry name -> file in assets_dir
+
+    Returns:
+        dict: Registry name -> compiled asset
+    """
+    assets = {}
+    for name, file_name in asset_files.items():
+        with open(os.path.join(assets_dir, file_name)) as jsonf:
+            asset = json.load(jsonf)
+        if name in ASSET_FIELDS:
+            asset = strip_records(asset, ASSET_FIELDS[name])
+        assets[name] = asset
+
+    # only unit names are ever translated, which is a small part of texts_EN.json
+    if "texts" in assets:
+        tids = {record["TID"][0] for name in ASSET_FIELDS for record in assets.get(name, {}).values() if "TID" in record}
+        assets["texts"] = {tid: text for tid, text in assets["texts"].items() if tid in tids}
+
+    return assets
+
+
+def write_snapshot(path: str, assets: dict, checksum: str) -> None:
+    """Write compiled assets to path, replacing any previous snapshot atomically
+
+    Args:
+        path (str): Snapshot file
+        assets (dict): Compiled assets, see compile_assets
+        checksum (str): Checksum of the source files, see source_checksum
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump({"checksum": checksum, "assets": assets}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path: str, checksum: str) -> dict:
+    """Load compiled assets from path, if the snapshot was compiled from the current source files
+
+    Args:
+        path (str): Snapshot file
+        checksum (str): Checksum of the current source files, see source_checksum
+
+    Returns:
+        dict: Registry name -> compiled asset, None if there is no snapshot or it is out of date
+    """
+    try:
+        with open(path, "rb") as f:
+            snapshot = pickle.load(f)
+    except Exception:
+        # a truncated or incompatible pickle can raise nearly anything (AttributeError, ImportError, ValueError, ...),
+        # none of which should stop the bot from starting, the assets are compiled again instead
+        return None
+
+    if not isinstance(snapshot, dict) or snapshot.get("checksum") != checksum:
+        return None
+    return snapshot["assets"]
+
+
+if __name__ == "__main__":
+    # compile the snapshot ahead of time, ex: as a build step before deploying
+    from static_data import ASSETS_DIR, ASSET_FILES, SNAPSHOT_PATH
+
+    checksum = source_checksum(ASSETS_DIR, ASSET_FILES)
+    write_snapshot(SNAPSHOT_PATH, compile_assets(ASSETS_DIR, ASSET_FILES), checksum)
+    print(f"Wrote {SNAPSHOT_PATH} ({os.path.getsize(SNAPSHOT_PATH)} bytes, source checksum {checksum})")
@@ -1,12 +1,34 @@
+import io
+import os
 import re
 import json
-import matplotlib
+import asyncio
+from textwrap import dedent
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
 
+import render
 import clash_of_clans
-coc = clash_of_clans.CoCAPI()
+import tag_cache
+import render_cache
+from metrics import metrics
+from static_data import registry
+# one client (and connection pool) for the whole bot, main.py reuses it
+coc = clash_of_clans.AsyncCoCAPI()
+clantag_cache = tag_cache.ClanTagCache()
+# rendered tables, an unchanged account gets the same table again without a render
+table_cache = render_cache.RenderCache()
+
+# number of processes rendering tables, every render beyond that waits for a free worker
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", 2))
+_render_pool = None
+# render key -> future of the render in progress, so identical concurrent requests share one render
+_renders_in_flight = {}
+
+# endpoints answering 404 only if the clan itself does not exist, see forget_clantag
+CLAN_NOT_FOUND_ENDPOINTS = ("/clans/{tag}", "/clans/{tag}/currentwar")
 
 
 def extract_playertag(displayname: str):
@@ -81,10 +103,10 @@ async def handle_clantag_options(displayname: str, playertag: str, clantag: str)
         validate_tag(playertag)
         clantag = await get_clantag(playertag)
 
-        clantag = add_octothorpe(clantag)
-        validate_tag(clantag)
+    clantag = add_octothorpe(clantag)
+    validate_tag(clantag)
 
-        return clantag
+    return clantag
 
 
 async def get_playertag(displayname: str):
@@ -95,6 +117,7 @@ async def get_playertag(displayname: str):
 
 async def get_clantag(playertag: str) -> str:
     """Fetches a player from CoC API and extracts the clan tag.
+    The result is cached in clantag_cache, so most calls skip the player fetch.
 
     Args:
         playertag (str): A CoC player tag.
@@ -102,8 +125,32 @@ async def get_clantag(playertag: str) -> str:
     Returns:
         str: A clan tag
     """
-    player = coc.player(playertag)
-    return player["clan"]["tag"]
+    clantag = clantag_cache.get(playertag)
+    if clantag is not None:
+        return clantag
+
+    player = await coc.player(playertag)
+    if "clan" not in player:
+        raise Exception(f"{playertag} is not in a clan.")
+
+    clantag = player["clan"]["tag"]
+    clantag_cache.put(playertag, clantag)
+    return clantag
+
+
+def forget_clantag(clantag: str, error: Exception):
+    """Drops every cached player -> clantag resolution pointing at clantag, if a lookup of the clan failed
+    because the clan was not found (404 of an endpoint in CLAN_NOT_FOUND_ENDPOINTS), which a stale cached
+    resolution might be the reason for. A 404 of the league group (not in CWL), a 403 (private war log),
+    throttling, outages and bad input are normal for a clan that exists, so the cache is kept.
+
+    Args:
+        clantag (str): A CoC clan tag, might be None
+        error (Exception): What the lookup of the clan raised
+    """
+    if clantag and isinstance(error, clash_of_clans.CoCAPIError) and error.status_code == 404 \
+            and error.endpoint in CLAN_NOT_FOUND_ENDPOINTS:
+        clantag_cache.invalidate_clan(clantag)
 
 
 def average_TH(members: list) -> int:
@@ -129,25 +176,56 @@ def get_th_lab_map() -> dict:
     Returns:
         dict: {th_level: lab_level, ...}
     """
-    buildings = load_json("assets/buildings.json")
-    lab_th_levels = buildings["Laboratory"]["TownHallLevel"]
-    th_lab_map = {th_lvl: i+1 for i, th_lvl in enumerate(lab_th_levels)}
+    return registry.th_lab_map()
+
+def format_war_status(war: dict, clan_key: str = "clan", attacks_per_member: int = None) -> str:
+    """Format the status of a war (state, stars and attacks of both sides) as a message
+
+    Args:
+        war (dict): War data, ex: from CoCAPI.current_war
+        clan_key (str, optional): Key of our own clan in the war data, "clan" or "opponent". Defaults to "clan".
+        attacks_per_member (int, optional): Attacks per member, if the war data does not contain them (CWL). Defaults to None.
+
+    Returns:
+        str: The message
+    """
+    op_key = "opponent" if clan_key != "opponent" else "clan"
+    us = war[clan_key]
+    op = war[op_key]
+    apm = war["attacksPerMember"] if attacks_per_member is None else attacks_per_member
+    ts = war["teamSize"]
+
+    pretty_name_map = registry.pretty_name_map["war"]
+    war_status = \
+    f"""
+    War Status 
+    State: {pretty_name_map[war["state"]]}
+
+    {us["name"]} (TH lvl {average_TH(us["members"])})  
+    {us["stars"]} / {ts * 3} stars
+    {us["attacks"]} / {ts * apm} attacks
+
+    vs. 
+    
+    {op["name"]} (TH lvl {average_TH(op["members"])})
+    {op["stars"]} / {ts * 3} stars
+    {op["attacks"]} / {ts * apm} attacks
+    """
 
-    return th_lab_map
+    return dedent(war_status)
 
-def search_unit(name: str, units: list[dict]) -> dict:
-    """Search for a unit in a list of unit dics, where the dict contains a name field
+def index_units(units: list[dict], village: str = "home") -> dict:
+    """Index a list of unit dicts of the CoC API (ex: player["troops"]) by name, keeping the units of one village only.
+    Some names exist in both villages (ex: Baby Dragon), so the village has to be picked.
 
     Args:
-        name (str): A unit name
-        units (list[dict]): A list of units in dicts
+        units (list[dict]): A list of units in dicts, containing a name and a village field
+        village (str, optional): "home" or "builderBase". Defaults to "home".
 
     Returns:
-        dict: A dict of the unit details
+        dict: Unit name -> level
     """
-    for unit in units:
-        if unit["name"] == name:
-            return unit
+    return {unit["name"]: unit["level"] for unit in units if unit.get("village", "home") == village}
         
 def display_hours_as_days(hours: int) -> str:
     """Convert hours to days and hours, ex: 36 hours -> 1d 12h
@@ -178,29 +256,62 @@ def load_json(filename: str) -> dict:
     with open(filename) as jsonf:
         return json.load(jsonf)
 
-def plot_table(rows: list, columns: list, file_path: str, title: str):
-    df = pd.DataFrame(rows, columns=columns)
+def render_pool() -> ProcessPoolExecutor:
+    """Get the process pool used for rendering tables, creating it on first use.
+    Workers are spawned rather than forked, since the bot process runs threads (pycord, httpx).
+    A spawned worker imports the entry script again, so main.py only builds the bot in setup().
+
+    Returns:
+        ProcessPoolExecutor: The render pool
+    """
+    global _render_pool
+    if _render_pool is None:
+        _render_pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _render_pool
 
-    fig, ax = plt.subplots(dpi=300)
-    # hide axes
-    fig.patch.set_visible(False)
-    ax.axis('off')
+def shutdown_render_pool():
+    """Stops the render pool workers, if the pool was ever started.
+    """
+    global _render_pool
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=False, cancel_futures=True)
+        _render_pool = None
 
-    table = ax.table(cellText=df.values, colLabels=df.columns, loc='center')
+async def render_table(rows: list, columns: list, title: str) -> io.BytesIO:
+    """Renders a table (see render.plot_table) in the render pool, so the event loop keeps serving other
+    commands while matplotlib works. The image never touches the disk, so concurrent requests
+    cannot overwrite each other's files.
 
-    table.auto_set_column_width(col=list(range(len(columns))))
-    table.auto_set_font_size(False)
-    table.set_fontsize(8)
+    Rendered images are cached by a hash of rows, columns and title (see render_cache), so the same table
+    is only rendered once, and identical requests arriving while it renders wait for that render.
 
-    ## make sure table size fits well into canvas ##
-    # get bounding box of table
-    points = table.get_window_extent().get_points()
-    # add 10 pixel spacing
-    points[0,:] -= 10; points[1,:] += 10
-    # get new bounding box in inches
-    nbbox = matplotlib.transforms.Bbox.from_extents(points/fig.dpi)
+    Args:
+        rows (list): Table rows, each a list of cell strings
+        columns (list): Column labels
+        title (str): Title of the table
 
-    plt.savefig(file_path, bbox_inches=nbbox,)
+    Returns:
+        io.BytesIO: A buffer holding the PNG image, positioned at the start, ready for discord.File
+    """
+    key = render_cache.render_key(rows, columns, title)
+    png, source = await table_cache.load(key)
+    if png is None and key in _renders_in_flight:
+        png, source = await asyncio.shield(_renders_in_flight[key]), "coalesced"
+
+    if png is None:
+        source = "render"
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(render_pool(), render.plot_table, rows, columns, None, title)
+        _renders_in_flight[key] = future
+        try:
+            png = await asyncio.shield(future)
+        finally:
+            _renders_in_flight.pop(key, None)
+        await table_cache.store(key, png)
+
+    metrics.increment("coc_bot_table_renders_total", help="Rendered tables by where the image came from", result=source)
+    # a fresh buffer per response, discord.File reads (and closes) the one it is given
+    return io.BytesIO(png)
 
 def sum_dict_list_columns(dicts: list, ignore_columns: list, ic_values, dtype=int) -> dict:
     """Given a list of dicts, sums along the columns, unless the column is specified to be ignored using ignore_columns.
@@ -1,25 +1,525 @@
 import os
+import re
+import time
+import heapq
+import random
+import asyncio
+import itertools
 import httpx
 import urllib.parse
+from collections import OrderedDict
+
+from metrics import metrics, endpoint
 
 from dotenv import load_dotenv
 load_dotenv()
 COC_API_BASE_URL = os.getenv("COC_API_BASE_URL")
 COC_API_TOKEN = os.getenv("COC_API_TOKEN")
 
-class CoCAPI:
-    def __init__(self) -> None:
-        self.base_url = COC_API_BASE_URL
-        self.headers = {'Authorization' : f"Bearer {COC_API_TOKEN}"}
+# several tokens (and base urls, ex: the RoyaleAPI proxy) can be registered as comma separated lists.
+# Either one base url is shared by every token or there is one base url per token.
+COC_API_TOKENS = [token.strip() for token in os.getenv("COC_API_TOKENS", COC_API_TOKEN or "").split(",") if token.strip()]
+COC_API_BASE_URLS = [url.strip() for url in os.getenv("COC_API_BASE_URLS", COC_API_BASE_URL or "").split(",") if url.strip()]
+
+# connection pool shared by every command, see https://www.python-httpx.org/advanced/
+COC_API_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=30)
+COC_API_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+
+# memory cap of cached API responses, measured as the size of the response bodies
+COC_API_CACHE_BYTES = int(os.getenv("COC_API_CACHE_BYTES", 32 * 1024 * 1024))
+
+MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
+
+# client side request budget per API token, see TokenBucket
+COC_API_RATE = float(os.getenv("COC_API_RATE", 10))
+COC_API_BURST = int(os.getenv("COC_API_BURST", 10))
+
+# throttled (429), unavailable (503) and unreachable requests are retried this many times, with exponential backoff
+COC_API_RETRIES = int(os.getenv("COC_API_RETRIES", 3))
+COC_API_BACKOFF = 0.5
+RETRY_STATUS_CODES = (429, 503)
+
+# a key that got throttled or failed is skipped for COC_API_COOLDOWN * 2^(failures - 1) seconds, at most COC_API_MAX_COOLDOWN.
+# No retry waits longer either, a request the API asks to hold off on for longer fails right away
+COC_API_COOLDOWN = 1.0
+COC_API_MAX_COOLDOWN = float(os.getenv("COC_API_MAX_COOLDOWN", 60))
+
+# request priorities, lower is served first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+
+class CoCAPIError(Exception):
+    def __init__(self, message: str, status_code: int, endpoint: str = None) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        # endpoint the failed request was sent to, ex: /clans/{tag}/currentwar
+        self.endpoint = endpoint
+
+
+def is_key_rejected(res: httpx.Response) -> bool:
+    """Whether the API rejected the key itself (revoked token, token whitelisted for another IP) rather than
+    the request. A 403 for a private war log is about the request, and is not a rejection of the key.
+
+    Args:
+        res (httpx.Response): A CoC API response
+
+    Returns:
+        bool: True for a 401, or a 403 saying the authorization is invalid
+    """
+    if res.status_code == 401:
+        return True
+    if res.status_code != 403:
+        return False
+
+    try:
+        body = res.json()
+    except ValueError:
+        return False
+    if not isinstance(body, dict):
+        return False
+
+    reason, message = body.get("reason", ""), body.get("message", "")
+    # "accessDenied" is also the reason of a private war log, only its message tells them apart
+    return reason.startswith("accessDenied.") or (reason == "accessDenied" and message.startswith("Invalid authorization"))
+
+
+class TokenBucket:
+    """Allows rate requests per second on average, with bursts of up to capacity requests.
+    """
+    def __init__(self, rate: float = COC_API_RATE, capacity: int = COC_API_BURST) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self) -> float:
+        """Get the number of tokens currently in the bucket
+
+        Returns:
+            float: Available tokens
+        """
+        self._refill()
+        return self.tokens
+
+    def try_acquire(self) -> float:
+        """Take a token if one is available
+
+        Returns:
+            float: 0 if a token was taken, otherwise the number of seconds until one is available
+        """
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+
+        return (1 - self.tokens) / self.rate
+
+
+class RequestScheduler:
+    """Lets requests through within the budget of a TokenBucket. Requests over budget wait in a
+    priority queue, so interactive slash commands go ahead of background work, first come first
+    served within a priority.
+    """
+    def __init__(self, bucket: TokenBucket) -> None:
+        self.bucket = bucket
+        self._queue = []
+        self._counter = itertools.count()
+        self._dispatcher = None
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    async def acquire(self, priority: int = INTERACTIVE) -> None:
+        """Wait until a request of the given priority may be sent
+
+        Args:
+            priority (int, optional): INTERACTIVE or BACKGROUND. Defaults to INTERACTIVE.
+        """
+        if not self._queue and self.bucket.try_acquire() == 0:
+            return
+
+        turn = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._counter), turn))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+        await turn
 
-    def player(self, playertag: str) -> dict:
+    async def _dispatch(self) -> None:
+        while self._queue:
+            turn = self._queue[0][2]
+            # the waiting request was cancelled, e.g. its command timed out
+            if turn.done():
+                heapq.heappop(self._queue)
+                continue
+
+            wait = self.bucket.try_acquire()
+            if wait:
+                await asyncio.sleep(wait)
+                continue
+
+            heapq.heappop(self._queue)
+            turn.set_result(None)
+
+
+class CacheEntry:
+    __slots__ = ("data", "etag", "expires", "size")
+
+    def __init__(self, data: dict, etag: str, expires: float, size: int) -> None:
+        self.data = data
+        self.etag = etag
+        self.expires = expires
+        self.size = size
+
+    def is_fresh(self) -> bool:
+        return time.monotonic() < self.expires
+
+
+class ResponseCache:
+    """LRU cache of decoded CoC API responses, keyed by endpoint path (which includes the tag).
+
+    Entries stay fresh for the max-age the API sends in Cache-Control. Stale entries with an ETag
+    are kept around, so they can be revalidated with a conditional request instead of refetched.
+    Least recently used entries are evicted once the cached bodies exceed max_bytes.
+    """
+    def __init__(self, max_bytes: int = COC_API_CACHE_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def max_age(headers: httpx.Headers) -> int:
+        """Get the number of seconds a response may be served from cache
+
+        Args:
+            headers (httpx.Headers): Response headers
+
+        Returns:
+            int: Seconds the response stays fresh, 0 if it must not be reused without revalidation
+        """
+        cache_control = headers.get("cache-control", "")
+        if "no-store" in cache_control or "no-cache" in cache_control:
+            return 0
+
+        match = MAX_AGE_PATTERN.search(cache_control)
+        if match is None:
+            return 0
+
+        # max-age counts from when the response was generated, Age is how long ago that was
+        age = int(headers.get("age", 0)) if headers.get("age", "").isdigit() else 0
+        return max(int(match.group(1)) - age, 0)
+
+    def get(self, key: str) -> CacheEntry:
+        """Get a cached entry (fresh or stale), marking it as recently used
+
+        Args:
+            key (str): Endpoint path
+
+        Returns:
+            CacheEntry: The entry, None if nothing is cached
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def store(self, key: str, data: dict, headers: httpx.Headers, size: int) -> None:
+        """Cache a decoded response, unless the headers make it unusable later
+
+        Args:
+            key (str): Endpoint path
+            data (dict): Decoded response body
+            headers (httpx.Headers): Response headers
+            size (int): Size of the response body in bytes
+        """
+        max_age = self.max_age(headers)
+        etag = headers.get("etag")
+
+        self.discard(key)
+        if "no-store" in headers.get("cache-control", "") or (max_age == 0 and etag is None) or size > self.max_bytes:
+            return
+
+        self._entries[key] = CacheEntry(data, etag, time.monotonic() + max_age, size)
+        self.size += size
+
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted.size
+
+    def revalidate(self, key: str, entry: CacheEntry, headers: httpx.Headers) -> CacheEntry:
+        """Renew a stale entry after the API answered a conditional request with 304 Not Modified.
+        The entry is put back if it was evicted while the request was in flight.
+
+        Args:
+            key (str): Endpoint path
+            entry (CacheEntry): The entry the conditional request was made for
+            headers (httpx.Headers): Headers of the 304 response
+
+        Returns:
+            CacheEntry: The renewed entry
+        """
+        entry.expires = time.monotonic() + self.max_age(headers)
+        entry.etag = headers.get("etag", entry.etag)
+
+        if self._entries.get(key) is not entry:
+            self.discard(key)
+            self._entries[key] = entry
+            self.size += entry.size
+
+        self._entries.move_to_end(key)
+        return entry
+
+    def discard(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry.size
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.size = 0
+
+
+class ApiKey:
+    """A CoC API token, the base url it is whitelisted for, its own request budget and its health.
+    """
+    def __init__(self, token: str, base_url: str, rate: float = COC_API_RATE, burst: int = COC_API_BURST) -> None:
+        self.token = token
+        self.base_url = base_url.rstrip("/")
+        self.headers = {'Authorization' : f"Bearer {token}"}
+        self.scheduler = RequestScheduler(TokenBucket(rate, burst))
+        self.in_flight = 0
+        self.failures = 0
+        self.unhealthy_until = 0.0
+
+    def is_healthy(self) -> bool:
+        return time.monotonic() >= self.unhealthy_until
+
+    def load(self) -> float:
+        """How busy the key is: requests queued or in flight, minus the requests it can still send right away
+
+        Returns:
+            float: Lower is less busy
+        """
+        return len(self.scheduler) + self.in_flight - self.scheduler.bucket.available()
+
+    def report(self, success: bool) -> None:
+        """Update the key's health after a request
+
+        Args:
+            success (bool): False if the request was throttled, the key was rejected, the API was unavailable or unreachable
+        """
+        if success:
+            self.failures = 0
+            return
+
+        self.failures += 1
+        cooldown = min(COC_API_COOLDOWN * 2 ** (self.failures - 1), COC_API_MAX_COOLDOWN)
+        self.unhealthy_until = time.monotonic() + cooldown
+
+
+class AsyncCoCAPI:
+    def __init__(self, base_urls: list = COC_API_BASE_URLS, tokens: list = COC_API_TOKENS) -> None:
+        if len(base_urls) not in (1, len(tokens)):
+            raise Exception("Register either one CoC API base url or one per token.")
+
+        base_urls = base_urls * len(tokens) if len(base_urls) == 1 else base_urls
+        self.keys = [ApiKey(token, base_url) for token, base_url in zip(tokens, base_urls)]
+        self.cache = ResponseCache()
+        # endpoint path -> (task of the request currently fetching it, its priority), shared by everyone asking for it
+        self._in_flight = {}
+        self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """The long-lived HTTP/2 client, shared by every key. Created lazily, so it is bound to the
+        event loop of the bot rather than whatever loop (if any) is running at import time.
+
+        Returns:
+            httpx.AsyncClient: The shared client
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(http2=True,
+                                             limits=COC_API_LIMITS,
+                                             timeout=COC_API_TIMEOUT)
+        return self._client
+
+    async def aclose(self) -> None:
+        """Closes the shared client and its pooled connections.
+        """
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def pick_key(self) -> ApiKey:
+        """Pick the least busy healthy key. If every key is cooling down, pick the one that recovers first.
+
+        Returns:
+            ApiKey: The key to send the next request with
+
+        Raises:
+            Exception: If no key is registered
+        """
+        if not self.keys:
+            raise Exception("No CoC API token registered, set COC_API_TOKEN or COC_API_TOKENS.")
+
+        healthy = [key for key in self.keys if key.is_healthy()]
+        if not healthy:
+            return min(self.keys, key=lambda key: key.unhealthy_until)
+
+        return min(healthy, key=lambda key: key.load())
+
+    def has_healthy_key(self) -> bool:
+        return any(key.is_healthy() for key in self.keys)
+
+    async def _get(self, path: str, error_message: str, priority: int = INTERACTIVE) -> dict:
+        """Sends a GET request to the CoC API using the shared client.
+        Responses are served from self.cache while the API's max-age says they are fresh.
+        Identical requests made while one is already in flight wait for that one's result
+        instead of sending their own, unless only a lower priority one is in flight.
+
+        Args:
+            path (str): Endpoint path relative to the base url, with tags already quoted
+            error_message (str): Message of the exception raised on a non 2xx response
+            priority (int, optional): INTERACTIVE or BACKGROUND. Defaults to INTERACTIVE.
+
+        Raises:
+            CoCAPIError: If status code is not 2xx, raise an exception
+
+        Returns:
+            dict: The decoded JSON response
+        """
+        entry = self.cache.get(path)
+        if entry is not None and entry.is_fresh():
+            metrics.increment("coc_api_lookups_total", help="CoC API lookups by how they were answered",
+                              endpoint=endpoint(path), result="cache")
+            return entry.data
+
+        in_flight = self._in_flight.get(path)
+        # an interactive lookup does not join a background request, it would wait behind background work.
+        # It sends its own, and later lookups of either priority join that one
+        if in_flight is None or in_flight[1] > priority:
+            request = asyncio.create_task(self._fetch(path, entry, error_message, priority))
+            self._in_flight[path] = (request, priority)
+            request.add_done_callback(lambda done: self._request_done(path, done))
+            result = "request"
+        else:
+            request = in_flight[0]
+            result = "coalesced"
+        metrics.increment("coc_api_lookups_total", help="CoC API lookups by how they were answered",
+                          endpoint=endpoint(path), result=result)
+
+        # shielded, so a waiter giving up (ex: a cancelled command) does not cancel the request for the others
+        return await asyncio.shield(request)
+
+    def _request_done(self, path: str, request: asyncio.Task) -> None:
+        if self._in_flight.get(path, (None, None))[0] is request:
+            del self._in_flight[path]
+        # mark the exception as retrieved, in case every waiter was cancelled
+        if not request.cancelled():
+            request.exception()
+
+    async def _fetch(self, path: str, entry: CacheEntry, error_message: str, priority: int) -> dict:
+        """Sends the request behind _get with the least busy key, after waiting for its turn in the
+        key's scheduler. Throttled (429) and unavailable (503) responses, responses rejecting the key (see
+        is_key_rejected) and requests that could not reach the API are retried on another key, or after
+        a backoff if every key is cooling down.
+
+        Args:
+            path (str): Endpoint path relative to the base url, with tags already quoted
+            entry (CacheEntry): Stale cache entry of path, might be None
+            error_message (str): Message of the exception raised on a non 2xx response
+            priority (int): INTERACTIVE or BACKGROUND
+
+        Raises:
+            CoCAPIError: If status code is not 2xx, raise an exception
+
+        Returns:
+            dict: The decoded JSON response
+        """
+        # a stale entry with an ETag can be revalidated, which costs no body if nothing changed
+        headers = {"If-None-Match": entry.etag} if entry is not None and entry.etag else {}
+
+        for attempt in range(COC_API_RETRIES + 1):
+            key = self.pick_key()
+            with metrics.span("coc_api_queue_seconds", "Time CoC API requests wait for the rate limiter",
+                              priority="interactive" if priority == INTERACTIVE else "background"):
+                await key.scheduler.acquire(priority)
+
+            key.in_flight += 1
+            start = time.perf_counter()
+            try:
+                res = await self.client.get(key.base_url + path, headers={**key.headers, **headers})
+            except httpx.TransportError:
+                metrics.increment("coc_api_requests_total", help="CoC API requests by status code, 0 if it could not be reached",
+                                  endpoint=endpoint(path), status="0")
+                key.report(success=False)
+                if attempt == COC_API_RETRIES:
+                    raise CoCAPIError("Could not reach the CoC API, try again in a moment.", 0, endpoint(path))
+                await self._backoff(attempt)
+                continue
+            finally:
+                key.in_flight -= 1
+
+            metrics.observe("coc_api_request_seconds", time.perf_counter() - start, "CoC API response time",
+                            endpoint=endpoint(path))
+            metrics.increment("coc_api_requests_total", help="CoC API requests by status code, 0 if it could not be reached",
+                              endpoint=endpoint(path), status=str(res.status_code))
+            # a rejected key fails fast, so it would otherwise look like the least busy key and get picked again
+            failed = res.status_code in RETRY_STATUS_CODES or is_key_rejected(res)
+            key.report(success=not failed)
+            retry_after = res.headers.get("retry-after", "")
+            # waiting that long would keep the command hanging, likely past Discord's response window
+            wait_too_long = retry_after.isdigit() and int(retry_after) > COC_API_MAX_COOLDOWN and not self.has_healthy_key()
+            if not failed or attempt == COC_API_RETRIES or wait_too_long:
+                break
+
+            await self._backoff(attempt, retry_after)
+
+        if res.status_code == 304 and entry is not None:
+            return self.cache.revalidate(path, entry, res.headers).data
+        elif res.status_code // 100 == 2:
+            data = res.json()
+            self.cache.store(path, data, res.headers, len(res.content))
+            return data
+        elif res.status_code in RETRY_STATUS_CODES:
+            raise CoCAPIError("The CoC API is busy right now, try again in a moment.", res.status_code, endpoint(path))
+        elif is_key_rejected(res):
+            raise CoCAPIError("The CoC API rejected the bot's token, ask an admin to check it.", res.status_code, endpoint(path))
+        else:
+            raise CoCAPIError(error_message, res.status_code, endpoint(path))
+
+    async def _backoff(self, attempt: int, retry_after: str = "") -> None:
+        """Wait before retrying a failed request: Retry-After if the API sent it, otherwise exponential backoff
+        with jitter, at most COC_API_MAX_COOLDOWN seconds. No need to wait if another key can take the request.
+
+        Args:
+            attempt (int): Number of the failed attempt, starting at 0
+            retry_after (str, optional): Retry-After header of the response. Defaults to "".
+        """
+        if self.has_healthy_key():
+            return
+
+        backoff = float(retry_after) if retry_after.isdigit() else COC_API_BACKOFF * 2 ** attempt
+        await asyncio.sleep(min(backoff * random.uniform(1, 1.5), COC_API_MAX_COOLDOWN))
+
+    async def player(self, playertag: str, priority: int = INTERACTIVE) -> dict:
         """Fetches a player's data using the CoC API
 
         Args:
             playertag (str): A CoC player tag
+            priority (int, optional): INTERACTIVE or BACKGROUND. Defaults to INTERACTIVE.
 
         Raises:
-            Exception: If status code is not 2xx, raise an exception
+            CoCAPIError: If status code is not 2xx, raise an exception
 
         Returns:
             dict: Player data
@@ -27,23 +527,17 @@ class CoCAPI:
         # replace # with %23 for a properly formatted url
         playertag = urllib.parse.quote(playertag)
 
-        with httpx.Client() as client: 
-            res = client.get(f"{self.base_url}/players/{playertag}", headers=self.headers)
+        return await self._get(f"/players/{playertag}", "Something went wrong. The passed playertag may not exist.", priority)
 
-        if res.status_code // 100 == 2:
-            return res.json()
-        else:
-            print(res.status_code)
-            raise Exception("Something went wrong. The passed playertag may not exist.")
-        
-    def clan(self, clantag: str) -> dict:
+    async def clan(self, clantag: str, priority: int = INTERACTIVE) -> dict:
         """Fetches a clan's data using the CoC API
 
         Args:
             clantag (str): A CoC clan tag
+            priority (int, optional): INTERACTIVE or BACKGROUND. Defaults to INTERACTIVE.
 
         Raises:
-            Exception: If status code is not 2xx, raise an exception
+            CoCAPIError: If status code is not 2xx, raise an exception
 
         Returns:
             dict: Clan data
@@ -51,23 +545,17 @@ class CoCAPI:
         # replace # with %23 for a properly formatted url
         clantag = urllib.parse.quote(clantag)
 
-        with httpx.Client() as client: 
-            res = client.get(f"{self.base_url}/clans/{clantag}", headers=self.headers)
+        return await self._get(f"/clans/{clantag}", "Something went wrong. The passed clantag may not exist.", priority)
 
-        if res.status_code // 100 == 2:
-            return res.json()
-        else:
-            print(res.status_code)
-            raise Exception("Something went wrong. The passed clantag may not exist.")
-        
-    def current_war(self, clantag: str) -> dict:
+    async def current_war(self, clantag: str, priority: int = INTERACTIVE) -> dict:
         """Fetches a clan's current war data using CoC API
 
         Args:
             clantag (str): A CoC clan tag
+            priority (int, optional): INTERACTIVE or BACKGROUND. Defaults to INTERACTIVE.
 
         Raises:
-            Exception: If status code is not 2xx, raise an exception
+            CoCAPIError: If status code is not 2xx, raise an exception
 
         Returns:
             dict: Current clan war data
@@ -75,23 +563,17 @@ class CoCAPI:
         # replace # with %23 for a properly formatted url
         clantag = urllib.parse.quote(clantag)
 
-        with httpx.Client() as client: 
-            res = client.get(f"{self.base_url}/clans/{clantag}/currentwar", headers=self.headers)
+        return await self._get(f"/clans/{clantag}/currentwar", "Something went wrong. The passed clantag may not exist.", priority)
 
-        if res.status_code // 100 == 2:
-            return res.json()
-        else:
-            print(res.status_code)
-            raise Exception("Something went wrong. The passed clantag may not exist.")
-        
-    def current_league_group(self, clantag: str):
+    async def current_league_group(self, clantag: str, priority: int = INTERACTIVE):
         """Fetches a clan's current war league group data using CoC API
 
         Args:
             clantag (str): A CoC clan tag
+            priority (int, optional): INTERACTIVE or BACKGROUND. Defaults to INTERACTIVE.
 
         Raises:
-            Exception: If status code is not 2xx, raise an exception
+            CoCAPIError: If status code is not 2xx, raise an exception
 
         Returns:
             dict: Current clan war data
@@ -99,23 +581,17 @@ class CoCAPI:
         # replace # with %23 for a properly formatted url
         clantag = urllib.parse.quote(clantag)
 
-        with httpx.Client() as client: 
-            res = client.get(f"{self.base_url}/clans/{clantag}/currentwar/leaguegroup", headers=self.headers)
+        return await self._get(f"/clans/{clantag}/currentwar/leaguegroup", "Something went wrong. The passed clantag may not exist.", priority)
 
-        if res.status_code // 100 == 2:
-            return res.json()
-        else:
-            print(res.status_code)
-            raise Exception("Something went wrong. The passed clantag may not exist.")
-        
-    def CWL_war(self, wartag: str) -> dict:
+    async def CWL_war(self, wartag: str, priority: int = INTERACTIVE) -> dict:
         """Fetches a CWL war using CoC API
 
         Args:
             clantag (str): A CoC CWL war tag
+            priority (int, optional): INTERACTIVE or BACKGROUND. Defaults to INTERACTIVE.
 
         Raises:
-            Exception: If status code is not 2xx, raise an exception
+            CoCAPIError: If status code is not 2xx, raise an exception
 
         Returns:
             dict: Current clan war data
@@ -123,12 +599,4 @@ class CoCAPI:
         # replace # with %23 for a properly formatted url
         wartag = urllib.parse.quote(wartag)
 
-        with httpx.Client() as client: 
-            res = client.get(f"{self.base_url}/clanwarleagues/wars/{wartag}", headers=self.headers)
-
-        if res.status_code // 100 == 2:
-            return res.json()
-        else:
-            print(res.status_code)
-            raise Exception("Something went wrong. The passed wartag may not exist.")
-
+        return await self._get(f"/clanwarleagues/wars/{wartag}", "Something went wrong. The passed wartag may not exist.", priority)
@@ -1,5 +1,6 @@
 from unit import Unit
 import bot_util
+from static_data import registry
 
 class Hero(Unit):
     def __init__(self, curr_level, name, unit_static: dict) -> None:
@@ -14,9 +15,9 @@ class Hero(Unit):
         Returns:
             int: max level
         """
-        return len(self.unit_static["RequiredTownHallLevel"])
+        return len(self.upgrade_table.required_th_levels)
 
-    def get_max_level_th(self, th_level: int) -> int:
+    def compute_max_level_th(self, th_level: int) -> int:
         """Deduce the maximum hero level, at current th_level, from a list of "required townhall levels" of the form: 
         [9, 9, 9, 9, 9, 10, 10, 10, ...]. Assumes self.unit_static contains a RequiredTownHallLevel key.
 
@@ -27,10 +28,21 @@ class Hero(Unit):
             int: The max level of a given item (hero, building, etc.)
         """
 
-        rq_th_levels = self.unit_static["RequiredTownHallLevel"]
+        rq_th_levels = self.upgrade_table.required_th_levels
         if th_level < rq_th_levels[0]:
             return 0
         return max(i+1 for i, rq_th_level in enumerate(rq_th_levels) if rq_th_level <= th_level)
+
+    def is_unlocked_th(self, th_level: int) -> bool:
+        """Check whether the hero can be built at th_level
+
+        Args:
+            th_level (int): A town hall level
+
+        Returns:
+            bool: True if the hero is unlocked
+        """
+        return th_level >= self.upgrade_table.required_th_levels[0]
     
     def get_upgrade_time(self, level: int) -> int:
         return super().get_upgrade_time(level, prefix="Upgrade")
@@ -42,23 +54,17 @@ class Hero(Unit):
         return super().get_upgrade_resource(prefix="Upgrade")
 
     @staticmethod
-    def create_hero_objects(translation: dict, unit_groups: dict, player: dict):
-        heroes_static = bot_util.load_json("assets/heroes.json")
-
-        heroes = []
-        for sc_name, hero_static in heroes_static.items():
-            if "TID" not in hero_static: 
-                continue
-            
-            name = translation[hero_static["TID"][0]][0] 
-            if name not in unit_groups["home_heroes"]:
-                continue
+    def create_hero_objects(player: dict):
+        """Create a Hero object for every hero in the "home_heroes" unit group, at the player's level (0 if not unlocked)
 
-            hero_active = bot_util.search_unit(name, player["heroes"])
-            if not hero_active:
-                hero_active = {"level": 0}
-            hero = Hero(curr_level=hero_active["level"], name=name, unit_static=hero_static)
+        Args:
+            player (dict): Player data from the CoC API
 
-            heroes.append(hero)
+        Returns:
+            list: List of Hero objects, in asset order
+        """
+        # index the player's units once, instead of searching them for every static unit
+        levels = bot_util.index_units(player["heroes"])
 
-        return heroes
\ No newline at end of file
+        return [Hero(curr_level=levels.get(name, 0), name=name, unit_static=hero_static)
+                for name, hero_static in registry.unit_records("home_heroes").items()]
@@ -0,0 +1,192 @@
+import os
+import asyncio
+import sqlite3
+
+import clash_of_clans
+
+# max number of CWL wars fetched at the same time for a single lookup
+CWL_FETCH_LIMIT = 8
+
+LEAGUE_INDEX_PATH = os.getenv("LEAGUE_INDEX_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "league_index.sqlite3"))
+
+
+class LeagueIndex:
+    """Season-scoped index of which CWL war tag every clan fights in, per round, stored in SQLite.
+
+    League groups and the participants of a war tag are fixed for the whole season, so once a round
+    has been scanned, looking up a clan's war in it is a local query followed by a single war fetch.
+    Only the latest season is kept.
+    """
+    def __init__(self, path: str = LEAGUE_INDEX_PATH) -> None:
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS league_wars (
+                    season TEXT NOT NULL,
+                    round INTEGER NOT NULL,
+                    clan_tag TEXT NOT NULL,
+                    war_tag TEXT NOT NULL,
+                    PRIMARY KEY (season, round, clan_tag)
+                )""")
+
+    def record(self, season: str, round_number: int, wars: dict) -> None:
+        """Record the wars of a round, dropping every other season
+
+        Args:
+            season (str): League season, ex: "2023-09"
+            round_number (int): Index of the round in the league group
+            wars (dict): {wartag: war data, ...}
+        """
+        rows = [(season, round_number, war[side]["tag"], wartag)
+                for wartag, war in wars.items() for side in ("clan", "opponent")]
+
+        with self.connection:
+            self.connection.execute("DELETE FROM league_wars WHERE season != ?", (season,))
+            self.connection.executemany("INSERT OR REPLACE INTO league_wars VALUES (?, ?, ?, ?)", rows)
+
+    def war_tag(self, season: str, round_number: int, clantag: str) -> str:
+        """Look up the war tag of a clan's war in a round
+
+        Args:
+            season (str): League season, ex: "2023-09"
+            round_number (int): Index of the round in the league group
+            clantag (str): A CoC clan tag
+
+        Returns:
+            str: The war tag, None if the round has not been recorded
+        """
+        row = self.connection.execute("SELECT war_tag FROM league_wars WHERE season = ? AND round = ? AND clan_tag = ?",
+                                      (season, round_number, clantag)).fetchone()
+        return row[0] if row else None
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def get_current_round_numbers(rounds: list) -> tuple:
+    """Get the index of the current "battle round" of the league group
+
+    Args:
+        rounds (list): List of rounds
+
+    Raises:
+        Exception: If no round has war tags yet
+
+    Returns:
+        tuple: Index of the current round, and possibly the index of the next round (otherwise None)
+    """
+    for i, round in enumerate(rounds):
+        if round["warTags"][0] == "#0":
+            if i == 0:
+                raise Exception("The league wars have not been drawn yet.")
+            return (i - 1, None)
+
+    # if all rounds are filled with battle tags, and none are filled with "#0"
+    # the wars of the last round might either be in preparation day or in battle day.
+    # There is no way of knowing at this point in the code, so both the last and second to last
+    # rounds are returned.
+    return (len(rounds) - 2, len(rounds) - 1)
+
+
+def index_wars_by_clan(wars: list) -> dict:
+    """Index a list of CWL wars by the tags of both participating clans.
+    Also keeps the "clan key", because it alters whether "our own" clan is considered
+    "main clan" or "opponent"
+
+    Args:
+        wars (list): CWL war data
+
+    Returns:
+        dict: {clantag: (war, "clan" | "opponent"), ...}
+    """
+    index = {}
+    for war in wars:
+        index[war["clan"]["tag"]] = (war, "clan")
+        index[war["opponent"]["tag"]] = (war, "opponent")
+
+    return index
+
+
+async def fetch_wars(coc: clash_of_clans.AsyncCoCAPI, wartags: list, limit: int = CWL_FETCH_LIMIT,
+                     priority: int = clash_of_clans.INTERACTIVE) -> list:
+    """Fetch a number of CWL wars concurrently, at most limit at a time
+
+    Args:
+        coc (clash_of_clans.AsyncCoCAPI): CoC API client
+        wartags (list): CWL war tags, "#0" placeholders are skipped
+        limit (int, optional): Max number of requests in flight. Defaults to CWL_FETCH_LIMIT.
+        priority (int, optional): INTERACTIVE or BACKGROUND. Defaults to INTERACTIVE.
+
+    Returns:
+        list: War data, in the order of wartags
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def fetch(wartag: str) -> dict:
+        async with semaphore:
+            return await coc.CWL_war(wartag, priority)
+
+    return await asyncio.gather(*[fetch(wartag) for wartag in wartags if wartag != "#0"])
+
+
+def pick_current_war(clantag: str, wars: list) -> tuple:
+    """Out of a clan's war in the current round and (possibly) the next, pick the one that
+    is going on: if the earliest round has ended, current round is the next round
+
+    Args:
+        clantag (str): A clans clan tag
+        wars (list): The clan's war data of the current round, and possibly the next round
+
+    Returns:
+        tuple: (war data, "clan" | "opponent")
+    """
+    war = wars[1] if len(wars) > 1 and wars[0]["state"] == "warEnded" else wars[0]
+    clan_key = "clan" if war["clan"]["tag"] == clantag else "opponent"
+
+    return (war, clan_key)
+
+
+async def find_current_war(coc: clash_of_clans.AsyncCoCAPI, clantag: str, group: dict, index: LeagueIndex = None,
+                           priority: int = clash_of_clans.INTERACTIVE) -> tuple:
+    """Find the ongoing CWL war of the clan with clantag in its league group.
+
+    If index knows the clan's war tags for the current round(s), only those wars are fetched.
+    Otherwise every war of the round(s) is fetched at once and the rounds are recorded in index
+    for later lookups. Either way the lookup costs a single round-trip of latency.
+
+    Args:
+        coc (clash_of_clans.AsyncCoCAPI): CoC API client
+        clantag (str): A clans clan tag
+        group (dict): The clan's current league group
+        index (LeagueIndex, optional): Index of war tags per round. Defaults to None.
+        priority (int, optional): INTERACTIVE or BACKGROUND. Defaults to INTERACTIVE.
+
+    Raises:
+        Exception: If the clan is not in any war of the current round
+
+    Returns:
+        tuple: (war data, "clan" | "opponent")
+    """
+    season = group["season"]
+    round_numbers = [n for n in get_current_round_numbers(group["rounds"]) if n is not None]
+
+    if index is not None:
+        wartags = [index.war_tag(season, n, clantag) for n in round_numbers]
+        if all(wartags):
+            return pick_current_war(clantag, await fetch_wars(coc, wartags, priority=priority))
+
+    round_wartags = [[wartag for wartag in group["rounds"][n]["warTags"] if wartag != "#0"] for n in round_numbers]
+    wars = await fetch_wars(coc, [wartag for wartags in round_wartags for wartag in wartags], priority=priority)
+
+    clan_wars = []
+    for n, wartags in zip(round_numbers, round_wartags):
+        round_wars, wars = dict(zip(wartags, wars)), wars[len(wartags):]
+        if index is not None:
+            index.record(season, n, round_wars)
+
+        clan_war = index_wars_by_clan(round_wars.values()).get(clantag)
+        if clan_war is None:
+            raise Exception(f"Could not find a league war featuring {clantag} in the current round.")
+        clan_wars.append(clan_war[0])
+
+    return pick_current_war(clantag, clan_wars)
@@ -1,14 +1,16 @@
 import asyncio
-from textwrap import dedent
 from discord.commands import Option
 from discord.ext import commands
 import discord
 import os
+import time
 
 import numpy as np
 
 import bot_util
-import clash_of_clans
+import league
+import progress
+import war_events
 from hero import Hero
 from troop import Troop
 from spell import Spell
@@ -16,16 +18,109 @@ from spell import Spell
 from dotenv import load_dotenv
 
 from unit import Unit
+from static_data import registry
+from war_poller import WarPoller
+from metrics import metrics, METRICS_PORT
+from player_history import PlayerHistory
 
 load_dotenv()
 DISCORD_TOKEN = os.getenv("DISCORD_BOT_API_TOKEN")
 DISCORD_SERVER_ID = os.getenv("DISCORD_SERVER_ID")
+# channel the live attack feed of polled clans is posted to, no feed if not set
+WAR_FEED_CHANNEL_ID = os.getenv("WAR_FEED_CHANNEL_ID")
 
-bot = commands.Bot()
-coc = clash_of_clans.CoCAPI()
+class CoCBot(commands.Bot):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        # id of the context of each running command -> when it started
+        self.command_starts = {}
+        # ids of the contexts of commands that answered with an error, see respond_error
+        self.failed_commands = set()
+        self.metrics_runner = None
+
+    async def on_ready(self):
+        # keep the war state of watched clans warm in the background
+        war_poller.start()
+
+        # on_ready fires again after reconnects, only serve the metrics once
+        if METRICS_PORT and self.metrics_runner is None:
+            self.metrics_runner = await metrics.serve(int(METRICS_PORT))
+
+    async def on_application_command(self, ctx):
+        self.command_starts[id(ctx)] = time.perf_counter()
+
+    def record_command(self, ctx, outcome: str) -> None:
+        """Observe the total time of a finished command and count its outcome
+
+        Args:
+            ctx (discord.ApplicationContext): Context of the finished command
+            outcome (str): "success" or "error"
+        """
+        self.failed_commands.discard(id(ctx))
+        start = self.command_starts.pop(id(ctx), None)
+        command = ctx.command.qualified_name
+        if start is not None:
+            metrics.observe("coc_bot_command_seconds", time.perf_counter() - start,
+                            "Time from invoking a command to it returning", command=command)
+        metrics.increment("coc_bot_commands_total", help="Finished commands by outcome", command=command, outcome=outcome)
+
+    async def on_application_command_completion(self, ctx):
+        # commands answering with an error (see respond_error) still complete normally
+        self.record_command(ctx, "error" if id(ctx) in self.failed_commands else "success")
+
+    async def on_application_command_error(self, ctx, exception):
+        self.record_command(ctx, "error")
+        await super().on_application_command_error(ctx, exception)
+
+    async def close(self):
+        if self.metrics_runner is not None:
+            await self.metrics_runner.cleanup()
+        await war_poller.stop()
+        # release the pooled CoC API connections before the event loop goes away
+        await coc.aclose()
+        bot_util.shutdown_render_pool()
+        league_index.close()
+        history.close()
+        bot_util.clantag_cache.close()
+        await super().close()
+
+coc = bot_util.coc
+# created by setup(), not on import: render workers may import this script again (see bot_util.render_pool),
+# and must not open the databases or build a bot of their own
+league_index: league.LeagueIndex = None
+history: PlayerHistory = None
+war_poller: WarPoller = None
+bot: CoCBot = None
+
+async def post_war_events(clantag: str, events: list):
+    """Posts new war events of a polled clan to the war feed channel
+
+    Args:
+        clantag (str): A CoC clan tag
+        events (list): Events from war_events.diff_wars
+    """
+    channel = bot.get_channel(int(WAR_FEED_CHANNEL_ID))
+    if channel is None:
+        return
+
+    pretty_name_map = registry.pretty_name_map["war"]
+    lines = [war_events.format_event(event, pretty_name_map) for event in events]
+    # many attacks between two polls do not fit into one message
+    for message in war_events.split_messages(clantag, lines):
+        await channel.send(message)
+
+async def respond_error(ctx, error):
+    """Answers a command with what went wrong, and marks it to be counted as failed in the metrics
+
+    Args:
+        ctx (discord.ApplicationContext): Context of the command
+        error (Exception | str): The exception, or a message
+    """
+    bot.failed_commands.add(id(ctx))
+    await ctx.respond(error)
 
 # commands
-@bot.slash_command(name="player_progress", description="Returns the players progress towards maxing current TH", guild_ids=[DISCORD_SERVER_ID])
+@discord.slash_command(name="player_progress", description="Returns the players progress towards maxing current TH", guild_ids=[DISCORD_SERVER_ID])
 async def coc_player_progress(ctx, 
                               playertag: Option(str, "Enter a CoC player tag", required=False, default=None), 
                               th_level: Option(str, "Enter a Town Hall level", required=False, default=None)):
@@ -44,61 +139,56 @@ async def coc_player_progress(ctx,
     Returns:
         None: Returns nothing
     """
+    stage = metrics.stages("player_progress")
+
     # it can happen, that the command cannot respond with image within 3 seconds,
     # so we need to send an inital response, after which there are 15 minutes to respond
     await ctx.defer()
 
     # fetch data from CoC API
-    try:
-        playertag = await bot_util.get_playertag(ctx.author.display_name) if not playertag else playertag
-        playertag = bot_util.add_octothorpe(playertag)
-        bot_util.validate_tag(playertag)
-        player = coc.player(playertag)
-    except Exception as e:
-        return await ctx.respond(e)
+    with stage("fetch"):
+        try:
+            playertag = await bot_util.get_playertag(ctx.author.display_name) if not playertag else playertag
+            playertag = bot_util.add_octothorpe(playertag)
+            bot_util.validate_tag(playertag)
+            player = await coc.player(playertag)
+        except Exception as e:
+            return await respond_error(ctx, e)
+
+    # remember the levels, for /player_progress_since
+    with stage("history"):
+        history.record([player])
     
     try:
         th_lvl = player["townHallLevel"] if not th_level else int(th_level)
     except:
-        await ctx.respond("The passed th_level is probably not a number")
+        await respond_error(ctx, "The passed th_level is probably not a number")
         return
-    # TODO: change all paths to be absolute rather than relative
-    translation = bot_util.load_json("assets/texts_EN.json")
-    unit_groups = bot_util.load_json("assets/unit_groups.json")
     
-    # create unit objects for each unit
-    heroes = Hero.create_hero_objects(translation=translation, unit_groups=unit_groups, player=player)
-    troops = Troop.create_troop_objects(translation=translation, unit_groups=unit_groups, player=player)
-    spells = Spell.create_spell_objects(translation=translation, unit_groups=unit_groups, player=player)
-
-    # extract relevant data for each unit
-    unit_attributes = [("Heroes", Hero.list_display_attributes(heroes, th_level=th_lvl)),
-    ("Troops", Troop.list_display_attributes(troops, th_level=th_lvl)),
-    ("Spells", Spell.list_display_attributes(spells, th_level=th_lvl))]
-
-    ## sum values
-    unit_totals = []
-    for name, units in unit_attributes:
-        unit_total = bot_util.sum_dict_list_columns(units, ignore_columns=[0], ic_values=[name], dtype=int)
-        unit_totals.append(unit_total)
-
-    total = bot_util.sum_dict_list_columns(unit_totals, ignore_columns=[0], ic_values=["Total"], dtype=int)
-    unit_totals.append(total)
+    with stage("compute"):
+        # create unit objects for each unit
+        heroes = Hero.create_hero_objects(player=player)
+        troops = Troop.create_troop_objects(player=player)
+        spells = Spell.create_spell_objects(player=player)
+
+        # sum the progress of each category in one pass over all units
+        category_sums = progress.category_progress([heroes, troops, spells], th_level=th_lvl)
+        unit_totals = progress.progress_rows(["Heroes", "Troops", "Spells"], category_sums, total="Total")
     
-    ## display result
-    displayed_units = Unit.display_units(units=unit_totals, unit_order=["Heroes", "Troops", "Spells", "Total"])
+        ## display result
+        displayed_units = Unit.display_units(units=unit_totals, unit_order=["Heroes", "Troops", "Spells", "Total"])
     columns = ["Name", "Level", "Time", "Elixir", "Dark Elixir", "Gold"]
 
-    plt_file_path = 'temp.png'
     columns = ["Name", "Level", "Time", "Elixir", "Dark Elixir", "Gold"]
     title = f"Resources remaining until {player['name']} ({player['tag']}) has maxed Town Hall level {th_lvl}"
-    bot_util.plot_table(rows=displayed_units, columns=columns, file_path=plt_file_path, title=title)
+    with stage("render"):
+        table_png = await bot_util.render_table(rows=displayed_units, columns=columns, title=title)
 
     # send response
-    await ctx.respond(title, file=discord.File(plt_file_path))
-    os.remove(plt_file_path)
+    with stage("respond"):
+        await ctx.respond(title, file=discord.File(table_png, filename="progress.png"))
 
-@bot.slash_command(name="player_progress_heroes", description="Returns the players progress towards maxing current TH", guild_ids=[DISCORD_SERVER_ID])
+@discord.slash_command(name="player_progress_heroes", description="Returns the players progress towards maxing current TH", guild_ids=[DISCORD_SERVER_ID])
 async def coc_player_progress_heroes(ctx, 
                                      playertag: Option(str, "Enter a CoC player tag", required=False, default=None),
                                      th_level: Option(str, "Enter a Town Hall level", required=False, default=None)):
@@ -114,51 +204,56 @@ async def coc_player_progress_heroes(ctx,
     Returns:
         None: Returns nothing
     """
+    stage = metrics.stages("player_progress_heroes")
+
     # it can happen, that the command cannot respond with image within 3 seconds,
     # so we need to send an inital response, after which there are 15 minutes to respond
     await ctx.defer()
 
     # fetch data from CoC API
-    try:
-        playertag = await bot_util.get_playertag(ctx.author.display_name) if not playertag else playertag
-        playertag = bot_util.add_octothorpe(playertag)
-        bot_util.validate_tag(playertag)
-        player = coc.player(playertag)
-    except Exception as e:
-        return await ctx.respond(e)
+    with stage("fetch"):
+        try:
+            playertag = await bot_util.get_playertag(ctx.author.display_name) if not playertag else playertag
+            playertag = bot_util.add_octothorpe(playertag)
+            bot_util.validate_tag(playertag)
+            player = await coc.player(playertag)
+        except Exception as e:
+            return await respond_error(ctx, e)
+
+    # remember the levels, for /player_progress_since
+    with stage("history"):
+        history.record([player])
     
     #TODO: Some code repetition has snuck in again, rethink structure of individual unit commands (spells, heroes, etc.)
     # and try to reuse some stuff, like the snippet below
     try:
         th_lvl = player["townHallLevel"] if not th_level else int(th_level)
     except:
-        await ctx.respond("The passed th_level is probably not a number")
+        await respond_error(ctx, "The passed th_level is probably not a number")
         return
-    translation = bot_util.load_json("assets/texts_EN.json")
-    unit_groups = bot_util.load_json("assets/unit_groups.json")
+    unit_groups = registry.unit_groups
     
-    # create unit objects for each unit
-    heroes = Hero.create_hero_objects(translation=translation, unit_groups=unit_groups, player=player)
-
-    # extract relevant data for each unit
-    hero_attributes = Hero.list_display_attributes(heroes, th_level=th_lvl)
+    with stage("compute"):
+        # create unit objects for each unit
+        heroes = Hero.create_hero_objects(player=player)
 
-    hero_attributes.append(bot_util.sum_dict_list_columns(hero_attributes, [0], ["Total"], int))
+        # extract relevant data for each unit
+        hero_attributes = progress.progress_rows([unit.name for unit in heroes], progress.unit_progress(heroes, th_level=th_lvl), total="Total")
     
-    ## display result
-    displayed_units = Unit.display_units(units=hero_attributes, unit_order=unit_groups["home_heroes"] + ["Total"])
+        ## display result
+        displayed_units = Unit.display_units(units=hero_attributes, unit_order=[*unit_groups["home_heroes"], "Total"])
     columns = ["Name", "Level", "Time", "Elixir", "Dark Elixir", "Gold"]
 
-    plt_file_path = 'temp.png'
     columns = ["Name", "Level", "Time", "Elixir", "Dark Elixir", "Gold"]
     title = f"Resources remaining until {player['name']} ({player['tag']}) has maxed heroes at Town Hall level {th_lvl}"
-    bot_util.plot_table(rows=displayed_units, columns=columns, file_path=plt_file_path, title=title)
+    with stage("render"):
+        table_png = await bot_util.render_table(rows=displayed_units, columns=columns, title=title)
 
     # send response
-    await ctx.respond(title, file=discord.File(plt_file_path))
-    os.remove(plt_file_path)
+    with stage("respond"):
+        await ctx.respond(title, file=discord.File(table_png, filename="progress.png"))
 
-@bot.slash_command(name="player_progress_troops", description="Returns the players progress towards maxing current TH", guild_ids=[DISCORD_SERVER_ID])
+@discord.slash_command(name="player_progress_troops", description="Returns the players progress towards maxing current TH", guild_ids=[DISCORD_SERVER_ID])
 async def coc_player_progress_troops(ctx, 
                                      playertag: Option(str, "Enter a CoC player tag", required=False, default=None),
                                      th_level: Option(str, "Enter a Town Hall level", required=False, default=None)):
@@ -174,49 +269,54 @@ async def coc_player_progress_troops(ctx,
     Returns:
         None: Returns nothing
     """
+    stage = metrics.stages("player_progress_troops")
+
     # it can happen, that the command cannot respond with image within 3 seconds,
     # so we need to send an inital response, after which there are 15 minutes to respond
     await ctx.defer()
 
     # fetch data from CoC API
-    try:
-        playertag = await bot_util.get_playertag(ctx.author.display_name) if not playertag else playertag
-        playertag = bot_util.add_octothorpe(playertag)
-        bot_util.validate_tag(playertag)
-        player = coc.player(playertag)
-    except Exception as e:
-        return await ctx.respond(e)
+    with stage("fetch"):
+        try:
+            playertag = await bot_util.get_playertag(ctx.author.display_name) if not playertag else playertag
+            playertag = bot_util.add_octothorpe(playertag)
+            bot_util.validate_tag(playertag)
+            player = await coc.player(playertag)
+        except Exception as e:
+            return await respond_error(ctx, e)
+
+    # remember the levels, for /player_progress_since
+    with stage("history"):
+        history.record([player])
     
     try:
         th_lvl = player["townHallLevel"] if not th_level else int(th_level)
     except:
-        await ctx.respond("The passed th_level is probably not a number")
+        await respond_error(ctx, "The passed th_level is probably not a number")
         return
-    translation = bot_util.load_json("assets/texts_EN.json")
-    unit_groups = bot_util.load_json("assets/unit_groups.json")
+    unit_groups = registry.unit_groups
     
-    # create unit objects for each unit
-    troops = Troop.create_troop_objects(translation=translation, unit_groups=unit_groups, player=player)
-
-    # extract relevant data for each unit
-    troop_attributes = Troop.list_display_attributes(troops, th_level=th_lvl)
+    with stage("compute"):
+        # create unit objects for each unit
+        troops = Troop.create_troop_objects(player=player)
 
-    troop_attributes.append(bot_util.sum_dict_list_columns(troop_attributes, [0], ["Total"], int))
+        # extract relevant data for each unit
+        troop_attributes = progress.progress_rows([unit.name for unit in troops], progress.unit_progress(troops, th_level=th_lvl), total="Total")
     
-    ## display result
-    displayed_units = Unit.display_units(units=troop_attributes, unit_order=unit_groups["home_troops"] + ["Total"])
+        ## display result
+        displayed_units = Unit.display_units(units=troop_attributes, unit_order=[*unit_groups["home_troops"], "Total"])
     columns = ["Name", "Level", "Time", "Elixir", "Dark Elixir", "Gold"]
 
-    plt_file_path = 'temp.png'
     columns = ["Name", "Level", "Time", "Elixir", "Dark Elixir", "Gold"]
     title = f"Resources remaining until {player['name']} ({player['tag']}) has maxed troops at Town Hall level {th_lvl}"
-    bot_util.plot_table(rows=displayed_units, columns=columns, file_path=plt_file_path, title=title)
+    with stage("render"):
+        table_png = await bot_util.render_table(rows=displayed_units, columns=columns, title=title)
 
     # send response
-    await ctx.respond(title, file=discord.File(plt_file_path))
-    os.remove(plt_file_path)
+    with stage("respond"):
+        await ctx.respond(title, file=discord.File(table_png, filename="progress.png"))
 
-@bot.slash_command(name="player_progress_spells", description="Returns the players progress towards maxing current TH", guild_ids=[DISCORD_SERVER_ID])
+@discord.slash_command(name="player_progress_spells", description="Returns the players progress towards maxing current TH", guild_ids=[DISCORD_SERVER_ID])
 async def coc_player_progress_spells(ctx, 
                                      playertag: Option(str, "Enter a CoC player tag", required=False, default=None),
                                      th_level: Option(str, "Enter a Town Hall level", required=False, default=None)):
@@ -232,49 +332,222 @@ async def coc_player_progress_spells(ctx,
     Returns:
         None: Returns nothing
     """
+    stage = metrics.stages("player_progress_spells")
+
     # it can happen, that the command cannot respond with image within 3 seconds,
     # so we need to send an inital response, after which there are 15 minutes to respond
     await ctx.defer()
 
     # fetch data from CoC API
-    try:
-        playertag = await bot_util.get_playertag(ctx.author.display_name) if not playertag else playertag
-        playertag = bot_util.add_octothorpe(playertag)
-        bot_util.validate_tag(playertag)
-        player = coc.player(playertag)
-    except Exception as e:
-        return await ctx.respond(e)
+    with stage("fetch"):
+        try:
+            playertag = await bot_util.get_playertag(ctx.author.display_name) if not playertag else playertag
+            playertag = bot_util.add_octothorpe(playertag)
+            bot_util.validate_tag(playertag)
+            player = await coc.player(playertag)
+        except Exception as e:
+            return await respond_error(ctx, e)
+
+    # remember the levels, for /player_progress_since
+    with stage("history"):
+        history.record([player])
     
     try:
         th_lvl = player["townHallLevel"] if not th_level else int(th_level)
     except:
-        await ctx.respond("The passed th_level is probably not a number")
+        await respond_error(ctx, "The passed th_level is probably not a number")
         return
-    translation = bot_util.load_json("assets/texts_EN.json")
-    unit_groups = bot_util.load_json("assets/unit_groups.json")
+    unit_groups = registry.unit_groups
     
-    # create unit objects for each unit
-    spells = Spell.create_spell_objects(translation=translation, unit_groups=unit_groups, player=player)
-
-    # extract relevant data for each unit
-    spell_attributes = Hero.list_display_attributes(spells, th_level=th_lvl)
+    with stage("compute"):
+        # create unit objects for each unit
+        spells = Spell.create_spell_objects(player=player)
 
-    spell_attributes.append(bot_util.sum_dict_list_columns(spell_attributes, [0], ["Total"], int))
+        # extract relevant data for each unit
+        spell_attributes = progress.progress_rows([unit.name for unit in spells], progress.unit_progress(spells, th_level=th_lvl), total="Total")
     
-    ## display result
-    displayed_units = Unit.display_units(units=spell_attributes, unit_order=unit_groups["spells"] + ["Total"])
+        ## display result
+        displayed_units = Unit.display_units(units=spell_attributes, unit_order=[*unit_groups["spells"], "Total"])
     columns = ["Name", "Level", "Time", "Elixir", "Dark Elixir", "Gold"]
 
-    plt_file_path = 'temp.png'
     columns = ["Name", "Level", "Time", "Elixir", "Dark Elixir", "Gold"]
     title = f"Resources remaining until {player['name']} ({player['tag']}) has maxed spells at Town Hall level {th_lvl}"
-    bot_util.plot_table(rows=displayed_units, columns=columns, file_path=plt_file_path, title=title)
+    with stage("render"):
+        table_png = await bot_util.render_table(rows=displayed_units, columns=columns, title=title)
 
     # send response
-    await ctx.respond(title, file=discord.File(plt_file_path))
-    os.remove(plt_file_path)
+    with stage("respond"):
+        await ctx.respond(title, file=discord.File(table_png, filename="progress.png"))
+
+@discord.slash_command(name="clan_progress", description="Returns the progress of every clan member towards maxing their TH", guild_ids=[DISCORD_SERVER_ID])
+async def coc_clan_progress(ctx, playertag: Option(str, "Enter your CoC player tag", required=False, default=None),
+                            clantag: Option(str, "Enter your CoC clan tag", required=False, default=None)):
+    """Sends a response containing a table of every Clash of Clans clan member's progress of upgrading
+    heroes, troops and spells towards maxing their own town hall level, ranked from most to least maxed,
+    either by looking up an explicitly passed playertag or clantag or by extracting a playertag from
+    the discord user's displayname. If no clan tag is passed, the player tag will be used to fetch a
+    clantag associated with the player.
+
+    Args:
+        ctx (_type_): Discord context, containing attributes such as displayname and functions
+        playertag (Option, optional): A CoC player tag. Defaults to False, default=None).
+        clantag (Option, optional): A CoC clan tag. Defaults to False, default=None).
+
+    Returns:
+        None: Returns nothing
+    """
+    stage = metrics.stages("clan_progress")
+
+    # it can happen, that the command cannot respond with image within 3 seconds,
+    # so we need to send an inital response, after which there are 15 minutes to respond
+    await ctx.defer()
+
+    # fetch data from CoC API
+    with stage("fetch"):
+        try:
+            clantag: str = await bot_util.handle_clantag_options(ctx.author.display_name, playertag, clantag)
+            clan = await coc.clan(clantag)
+        except Exception as e:
+            bot_util.forget_clantag(clantag, e)
+            return await respond_error(ctx, e)
+
+    # fetch all members concurrently, the CoC API client keeps them within the rate limit.
+    # Members that could not be fetched are left out of the table
+    with stage("fetch_members"):
+        results = await asyncio.gather(*[coc.player(member["tag"]) for member in clan["memberList"]], return_exceptions=True)
+    players = [result for result in results if not isinstance(result, Exception)]
+    with stage("history"):
+        history.record(players)
+
+    with stage("compute"):
+        # create unit objects for each member, all members get the same units in the same order
+        unit_lists = [[*Hero.create_hero_objects(player=player),
+                       *Troop.create_troop_objects(player=player),
+                       *Spell.create_spell_objects(player=player)]
+                      for player in players]
+        th_levels = [player["townHallLevel"] for player in players]
+
+        # sum the progress of every member in one pass
+        member_sums = progress.players_progress(unit_lists, th_levels)
+
+        # rank by the share of upgrade time already done, most maxed first
+        done = 1 - member_sums[:, 2] / np.maximum(member_sums[:, 3], 1)
+        ranking = np.argsort(-done, kind="stable")
+        names = [f"{rank}. {players[i]['name']} (TH {th_levels[i]})" for rank, i in enumerate(ranking, start=1)]
+        member_rows = progress.progress_rows(names, member_sums[ranking], total="Total")
+
+        ## display result
+        displayed_units = Unit.display_units(units=member_rows, unit_order=[*names, "Total"])
+    columns = ["Name", "Level", "Time", "Elixir", "Dark Elixir", "Gold"]
+    title = f"Resources remaining until the members of {clan['name']} ({clan['tag']}) have maxed their Town Hall level"
+    if len(players) < len(results):
+        title += f" ({len(results) - len(players)} members could not be fetched)"
+    with stage("render"):
+        table_png = await bot_util.render_table(rows=displayed_units, columns=columns, title=title)
+
+    # send response
+    with stage("respond"):
+        await ctx.respond(title, file=discord.File(table_png, filename="progress.png"))
+
+@discord.slash_command(name="th_unlocks", description="Returns what unlocks when upgrading to a TH level", guild_ids=[DISCORD_SERVER_ID])
+async def coc_th_unlocks(ctx, th_level: Option(int, "Enter a Town Hall level", required=True, min_value=1)):
+    """Sends a response listing the heroes, troops and spells that are unlocked, or can be upgraded further,
+    when upgrading to th_level
+
+    Args:
+        ctx (_type_): Discord context, containing attributes such as displayname and functions
+        th_level (Option): A Town Hall level
 
-@bot.slash_command(name="current_war", description="Returns details about a clan's ongoing war", guild_ids=[DISCORD_SERVER_ID])
+    Returns:
+        None: Returns nothing
+    """
+    stage = metrics.stages("th_unlocks")
+
+    with stage("compute"):
+        # units of a player without any, only their static data is needed
+        player = {"heroes": [], "troops": [], "spells": []}
+        units = [*Hero.create_hero_objects(player=player),
+                 *Troop.create_troop_objects(player=player),
+                 *Spell.create_spell_objects(player=player)]
+
+        unlocks = progress.unlocks_at(units, th_level)
+    if not unlocks:
+        return await ctx.respond(f"Nothing unlocks at Town Hall level {th_level}")
+
+    new_units = [name for name, old, new in unlocks if old == 0]
+    raised = [f"{name} ({old} -> {new})" for name, old, new in unlocks if old > 0]
+
+    response = f"Upgrading to Town Hall level {th_level}"
+    if new_units:
+        response += f"\nUnlocks: {', '.join(new_units)}"
+    if raised:
+        response += f"\nRaises max level of: {', '.join(raised)}"
+
+    with stage("respond"):
+        await ctx.respond(response)
+
+@discord.slash_command(name="player_progress_since", description="Returns the upgrades a player has done over the last days", guild_ids=[DISCORD_SERVER_ID])
+async def coc_player_progress_since(ctx,
+                                    playertag: Option(str, "Enter a CoC player tag", required=False, default=None),
+                                    days: Option(int, "Enter a number of days", required=False, default=7, min_value=1)):
+    """Sends a response listing the upgrades a Clash of Clans player has done over the last days, with the
+    upgrade time and resources that went into them, based on the levels recorded whenever the player is looked up
+
+    either by looking up an explicitly passed player tag or by extracting a player tag from
+    the discord user's display name.
+
+    Args:
+        ctx (_type_): Discord context, containing attributes such as displayname and functions
+        playertag (Option, optional): A CoC player tag. Defaults to False, default=None).
+        days (Option, optional): Number of days to look back. Defaults to 7.
+
+    Returns:
+        None: Returns nothing
+    """
+    stage = metrics.stages("player_progress_since")
+
+    await ctx.defer()
+
+    # fetch data from CoC API
+    with stage("fetch"):
+        try:
+            playertag = await bot_util.get_playertag(ctx.author.display_name) if not playertag else playertag
+            playertag = bot_util.add_octothorpe(playertag)
+            bot_util.validate_tag(playertag)
+            player = await coc.player(playertag)
+        except Exception as e:
+            return await respond_error(ctx, e)
+
+    with stage("history"):
+        history.record([player])
+        since, changes = history.changes_since(player["tag"], time.time() - days * 24 * 60 * 60)
+
+    since_date = time.strftime("%Y-%m-%d", time.gmtime(since))
+    if not changes:
+        return await ctx.respond(f"No upgrades recorded for {player['name']} ({player['tag']}) since {since_date}. "
+                                 f"Levels are recorded whenever a player is looked up.")
+
+    hours, resources = progress.upgrades_done(changes)
+    resource_names = registry.pretty_name_map["resource"]
+    spent = [f"{bot_util.display_large_number(amount)} {resource_names.get(resource, resource)}"
+             for resource, amount in resources.items() if amount]
+
+    lines = [f"Upgrades of {player['name']} ({player['tag']}) since {since_date}:"]
+    lines += [f"{name}{'' if village == 'home' else ' (builder base)'}: {old_level} -> {new_level}"
+              for village, name, old_level, new_level in changes]
+    lines.append(f"{len(changes)} units upgraded, {bot_util.display_hours_as_days(hours)} of upgrade time"
+                 + (f", {', '.join(spent)}" if spent else ""))
+
+    # stay within discord's message length, dropping units from the end of the list
+    response = "\n".join(lines)
+    while len(response) > 2000 and len(lines) > 2:
+        del lines[-2]
+        response = "\n".join(lines)
+
+    with stage("respond"):
+        await ctx.respond(response)
+
+@discord.slash_command(name="current_war", description="Returns details about a clan's ongoing war", guild_ids=[DISCORD_SERVER_ID])
 async def current_war(ctx, playertag: Option(str, "Enter your CoC player tag", required=False, default=None),
                        clantag: Option(str, "Enter your CoC clan tag", required=False, default=None)):
     """Sends a response containing a details about Clash of Clans clan's current war, 
@@ -290,16 +563,27 @@ async def current_war(ctx, playertag: Option(str, "Enter your CoC player tag", r
     Returns:
         _type_: _description_
     """
+    stage = metrics.stages("current_war")
+
     # it can happen, that the command cannot respond with image within 3 seconds,
     # so we need to send an inital response, after which there are 15 minutes to respond
     await ctx.defer()
 
     # fetch data
-    try:
-        clantag: str = await bot_util.handle_clantag_options(ctx.author.display_name, playertag, clantag)
-        current_war = coc.current_war(clantag)
-    except Exception as e:
-        return await ctx.respond(e)
+    with stage("fetch"):
+        try:
+            clantag: str = await bot_util.handle_clantag_options(ctx.author.display_name, playertag, clantag)
+            # answer from the poller's snapshot when it has a fresh one
+            snapshot = war_poller.snapshot(clantag)
+            if snapshot:
+                current_war = snapshot.war
+            else:
+                current_war = await coc.current_war(clantag)
+                # the clan exists, keep its war warm for the next lookups
+                war_poller.register(clantag)
+        except Exception as e:
+            bot_util.forget_clantag(clantag, e)
+            return await respond_error(ctx, e)
 
     # format response
     cw = current_war
@@ -309,34 +593,13 @@ async def current_war(ctx, playertag: Option(str, "Enter your CoC player tag", r
         await ctx.respond(repsonse)
         return
     
-    us = cw["clan"]
-    op = cw["opponent"]
-    apm = cw["attacksPerMember"]
-    ts = cw["teamSize"]
-
-    bot_util.average_TH(us["members"])
-
-    pretty_name_map = bot_util.load_json("assets/pretty_name_map.json")["war"]
-    war_status = \
-    f"""
-    War Status 
-    State: {pretty_name_map[cw["state"]]}
-
-    {us["name"]} (TH lvl {bot_util.average_TH(us["members"])})  
-    {us["stars"]} / {ts * 3} stars
-    {us["attacks"]} / {ts * apm} attacks
-
-    vs. 
-    
-    {op["name"]} (TH lvl {bot_util.average_TH(op["members"])})
-    {op["stars"]} / {ts * 3} stars
-    {op["attacks"]} / {ts * apm} attacks
-    """
+    war_status = bot_util.format_war_status(cw)
 
     # send response
-    await ctx.respond(dedent(war_status))
+    with stage("respond"):
+        await ctx.respond(war_status)
 
-@bot.slash_command(name="current_league_war", description="Returns details about a clan's ongoing league war", guild_ids=[DISCORD_SERVER_ID])
+@discord.slash_command(name="current_league_war", description="Returns details about a clan's ongoing league war", guild_ids=[DISCORD_SERVER_ID])
 async def current_league_war(ctx, playertag: Option(str, "Enter your CoC player tag", required=False, default=None),
                        clantag: Option(str, "Enter your CoC clan tag", required=False, default=None)):
     """Sends a response containing a details about Clash of Clans clan's current war, 
@@ -353,99 +616,81 @@ async def current_league_war(ctx, playertag: Option(str, "Enter your CoC player
         _type_: _description_
     """
 
-    def get_current_league_round(rounds: list) -> list:
-        """Get the current "battle round" of the league group
-
-        Args:
-            rounds (list): List of rounds
-
-        Returns:
-            list: A list of war tags
-        """
-        prev = [0]
-        for round in rounds:
-            if round["warTags"][0] == "#0":
-                return (prev["warTags"], None)
-            prev = round
-        
-        # if all rounds are filled with battle tags, and none are filled with "#0"
-        # the wars of the last round might either be in preparation day or in battle day.
-        # There is no way of knowing at this point in the code, so both the last and second to last
-        # rounds are returned.
-        return (rounds[-2]["warTags"], rounds[-1]["warTags"])
-    
-    def find_right_war(clantag: str, wartags: list) -> dict:
-        """First, find out which of the two rounds in wartags is an ongoing war (not prep).
-        Among the list of wartags of the current round, find the war featuring the clan with clantag. 
+    stage = metrics.stages("current_league_war")
 
-        Args:
-            clantag (str): A clans clan tag
-            wartags (tuiple[list]): A tuple of lists of wartags
-
-        Returns:
-            dict: War data
-        """
-
-        round, next_round = wartags
-        # get the war state of the earliest round
-        round_state = coc.CWL_war(round[0])["state"]
-
-        # if the earliest round has ended, current round is the next round
-        wartags = next_round if round_state == "warEnded" else round
-
-        # find the war of this round featuring clantag
-        # also return the "clan key" because it alters whether "our own" clan is considered
-        # "main clan" or "opponent"
-        for wartag in wartags:
-            war = coc.CWL_war(wartag)
-            if war["clan"]["tag"] == clantag:
-                return (war, "clan")
-            
-            if war["opponent"]["tag"] == clantag:
-                return (war, "opponent")
     # it can happen, that the command cannot respond with image within 3 seconds,
     # so we need to send an inital response, after which there are 15 minutes to respond
     await ctx.defer()
 
     # fetch data
-    try:
-        clantag: str = await bot_util.handle_clantag_options(ctx.author.display_name, playertag, clantag)
-        current_group = coc.current_league_group(clantag)
-        current_round = get_current_league_round(current_group["rounds"])
-        current_war, clan_key = find_right_war(clantag, current_round)
-        op_key = "opponent" if clan_key != "opponent" else "clan"
-    except Exception as e:
-        return await ctx.respond(e)
-
-    # format response (a lot if duplicate code here, fix that)
+    with stage("fetch"):
+        try:
+            clantag: str = await bot_util.handle_clantag_options(ctx.author.display_name, playertag, clantag)
+            # answer from the poller's snapshot when it has a fresh one
+            snapshot = war_poller.snapshot(clantag)
+            if snapshot and snapshot.league_war:
+                current_war, clan_key = snapshot.league_war
+            else:
+                current_group = await coc.current_league_group(clantag)
+                current_war, clan_key = await league.find_current_war(coc, clantag, current_group, league_index)
+                war_poller.register(clantag)
+        except Exception as e:
+            bot_util.forget_clantag(clantag, e)
+            return await respond_error(ctx, e)
+
+    # format response
     cw = current_war
-    
-    us = cw[clan_key]
-    op = cw[op_key]
-    apm = 1
-    ts = cw["teamSize"]
 
-    bot_util.average_TH(us["members"])
+    # league wars have one attack per member
+    war_status = bot_util.format_war_status(cw, clan_key, attacks_per_member=1)
 
-    pretty_name_map = bot_util.load_json("assets/pretty_name_map.json")["war"]
-    war_status = \
-    f"""
-    War Status 
-    State: {pretty_name_map[cw["state"]]}
+    # send response
+    with stage("respond"):
+        await ctx.respond(war_status)
 
-    {us["name"]} (TH lvl {bot_util.average_TH(us["members"])})  
-    {us["stars"]} / {ts * 3} stars
-    {us["attacks"]} / {ts * apm} attacks
+@discord.slash_command(name="bot_metrics", description="Returns latency statistics of the bot's commands", guild_ids=[DISCORD_SERVER_ID])
+@discord.default_permissions(administrator=True)
+async def bot_metrics(ctx):
+    """Responds with a summary of the latency histograms, count, mean and p50/p95 of every command, stage and endpoint.
+    Only visible to administrators.
 
-    vs. 
-    
-    {op["name"]} (TH lvl {bot_util.average_TH(op["members"])})
-    {op["stars"]} / {ts * 3} stars
-    {op["attacks"]} / {ts * apm} attacks
-    """
+    Args:
+        ctx (discord.ApplicationContext): Context of the command
 
-    # send response
-    await ctx.respond(dedent(war_status))
+    Returns:
+        None: Returns nothing
+    """
+    summary = metrics.summary() or "Nothing measured yet"
+    # a message is at most 2000 characters, the code block takes 8
+    await ctx.respond(f"```\n{summary[:1990]}\n```")
 
+def setup() -> CoCBot:
+    """Opens the databases, creates the war poller and builds the bot with every command
 
-bot.run(DISCORD_TOKEN)
+    Returns:
+        CoCBot: The bot, ready to run
+    """
+    global league_index, history, war_poller, bot
+    league_index = league.LeagueIndex()
+    history = PlayerHistory()
+    war_poller = WarPoller(coc, league_index)
+    if WAR_FEED_CHANNEL_ID:
+        war_poller.listeners.append(post_war_events)
+
+    bot = CoCBot()
+    for command in (coc_player_progress, coc_player_progress_heroes, coc_player_progress_troops, coc_player_progress_spells,
+                    coc_clan_progress, coc_th_unlocks, coc_player_progress_since, current_war, current_league_war, bot_metrics):
+        bot.add_application_command(command)
+
+    # the highest TH level comes from the static data, which is not loaded on import
+    th_level_option = next(option for option in coc_th_unlocks.options if option.name == "th_level")
+    th_level_option.max_value = registry.max_th_level()
+
+    return bot
+
+
+if __name__ == "__main__":
+    # parse the static game data once, before the first command comes in
+    with metrics.span("coc_bot_startup_seconds", "Time spent on each start up step", step="static_data"):
+        registry.preload()
+    setup().run(DISCORD_TOKEN)
@@ -0,0 +1,224 @@
+import os
+import re
+import time
+import threading
+from contextlib import contextmanager
+
+from aiohttp import web
+
+# port of the Prometheus endpoint (GET /metrics), not served if not set
+METRICS_PORT = os.getenv("METRICS_PORT")
+# interface the endpoint listens on, only local scrapers by default. "0.0.0.0" for every interface
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# upper bounds in seconds of the latency histograms' buckets, see https://prometheus.io/docs/concepts/metric_types/#histogram
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# quoted tags in CoC API paths, replaced by a placeholder so every tag counts towards the same endpoint
+TAG_PATTERN = re.compile(r"%23[0-9A-Za-z]+")
+
+
+def endpoint(path: str) -> str:
+    """Get the endpoint of a CoC API path, ex: /players/%232PP -> /players/{tag}
+
+    Args:
+        path (str): A CoC API path, with tags quoted
+
+    Returns:
+        str: The path with its tags replaced by {tag}
+    """
+    return TAG_PATTERN.sub("{tag}", path)
+
+
+class Histogram:
+    """Counts of observed values per bucket, plus their sum, like a Prometheus histogram.
+    """
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        # counts[i] counts values <= buckets[i], the last one counts values past every bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile as the upper bound of the bucket it falls in
+
+        Args:
+            q (float): Quantile, between 0 and 1
+
+        Returns:
+            float: Upper bound of the bucket, inf if past every bucket, 0 if nothing was observed
+        """
+        if self.count == 0:
+            return 0.0
+
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= q * self.count:
+                return bound
+        return float("inf")
+
+
+class Metrics:
+    """Latency histograms and counters of the bot, labeled by command, stage, endpoint etc.,
+    exported in the Prometheus text format.
+    """
+    def __init__(self) -> None:
+        # (name, ((label, value), ...)) -> Histogram / float
+        self.histograms = {}
+        self.counters = {}
+        # metric name -> help text
+        self.help = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return (name, tuple(sorted(labels.items())))
+
+    def observe(self, name: str, value: float, help: str = "", **labels) -> None:
+        """Add a value to a histogram
+
+        Args:
+            name (str): Metric name, ex: "coc_bot_stage_seconds"
+            value (float): The observed value
+            help (str, optional): Description of the metric. Defaults to "".
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+            self.help.setdefault(name, help)
+
+    def increment(self, name: str, amount: float = 1, help: str = "", **labels) -> None:
+        """Increase a counter
+
+        Args:
+            name (str): Metric name, ex: "coc_api_requests_total"
+            amount (float, optional): Amount to add. Defaults to 1.
+            help (str, optional): Description of the metric. Defaults to "".
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+            self.help.setdefault(name, help)
+
+    @contextmanager
+    def span(self, name: str, help: str = "", **labels):
+        """Time the body of a with statement into a histogram, also when it raises
+
+        Args:
+            name (str): Metric name of the histogram, ex: "coc_bot_stage_seconds"
+            help (str, optional): Description of the metric. Defaults to "".
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, help, **labels)
+
+    def stages(self, command: str):
+        """Get a function timing the stages of a command, use as:
+
+            stage = metrics.stages("player_progress")
+            with stage("fetch"):
+                ...
+
+        Args:
+            command (str): Command name
+
+        Returns:
+            callable: Stage name -> span
+        """
+        return lambda stage: self.span("coc_bot_stage_seconds", "Time spent in each stage of a command",
+                                       command=command, stage=stage)
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text format
+
+        Returns:
+            str: The exposition, see https://prometheus.io/docs/instrumenting/exposition_formats/
+        """
+        def format_labels(labels: tuple, extra: tuple = ()) -> str:
+            pairs = [f'{label}="{value}"' for label, value in (*labels, *extra)]
+            return "{" + ",".join(pairs) + "}" if pairs else ""
+
+        lines = []
+        with self._lock:
+            for kind, metrics in (("counter", self.counters), ("histogram", self.histograms)):
+                for name in sorted({name for name, _ in metrics}):
+                    lines.append(f"# HELP {name} {self.help.get(name, '')}")
+                    lines.append(f"# TYPE {name} {kind}")
+
+                    for (metric_name, labels), value in sorted(metrics.items()):
+                        if metric_name != name:
+                            continue
+                        if kind == "counter":
+                            lines.append(f"{name}{format_labels(labels)} {value}")
+                            continue
+
+                        cumulative = 0
+                        for bound, count in zip((*value.buckets, "+Inf"), value.counts):
+                            cumulative += count
+                            lines.append(f"{name}_bucket{format_labels(labels, (('le', bound),))} {cumulative}")
+                        lines.append(f"{name}_sum{format_labels(labels)} {value.sum}")
+                        lines.append(f"{name}_count{format_labels(labels)} {value.count}")
+
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        """Summarise the latency histograms as a readable table: count, mean and p50/p95 per label set
+
+        Returns:
+            str: One line per histogram
+        """
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+
+        lines = []
+        for (name, labels), histogram in histograms:
+            label_text = " ".join(f"{value}" for _, value in labels)
+            mean = histogram.sum / histogram.count
+            lines.append(f"{name} {label_text}: n={histogram.count} mean={mean * 1000:.0f}ms "
+                         f"p50<={histogram.quantile(0.5) * 1000:.0f}ms p95<={histogram.quantile(0.95) * 1000:.0f}ms")
+
+        return "\n".join(lines)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.histograms = {}
+            self.counters = {}
+
+    async def serve(self, port: int, host: str = METRICS_HOST) -> web.AppRunner:
+        """Serve the metrics on http://host:port/metrics in the running event loop
+
+        Args:
+            port (int): Port to listen on, 0 for any free port (see the runner's addresses)
+            host (str, optional): Interface to listen on. Defaults to METRICS_HOST.
+
+        Returns:
+            web.AppRunner: The runner, call its cleanup() to stop serving
+        """
+        async def handle(request: web.Request) -> web.Response:
+            return web.Response(body=self.render().encode(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+        app = web.Application()
+        app.add_routes([web.get("/metrics", handle)])
+
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+
+# the one metrics registry shared by the whole bot
+metrics = Metrics()
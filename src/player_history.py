@@ -0,0 +1,127 @@
+import os
+import time
+import sqlite3
+
+PLAYER_HISTORY_PATH = os.getenv("PLAYER_HISTORY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "player_history.sqlite3"))
+
+# player fields holding leveled units, all of them carry a village
+UNIT_FIELDS = ("heroes", "troops", "spells")
+# the townhall is stored as a unit of its own, so its upgrades show up like any other
+TOWN_HALL = "Town Hall"
+
+
+def player_levels(player: dict) -> dict:
+    """Extract every level of a player that is tracked by the history
+
+    Args:
+        player (dict): Player data from the CoC API
+
+    Returns:
+        dict: (village, unit name) -> level
+    """
+    levels = {("home", TOWN_HALL): player["townHallLevel"]}
+    for field in UNIT_FIELDS:
+        for unit in player.get(field, []):
+            levels[(unit.get("village", "home"), unit["name"])] = unit["level"]
+
+    return levels
+
+
+class PlayerHistory:
+    """History of player levels, stored in SQLite.
+
+    A row is only written when a level differs from the last one recorded for that unit, so a player
+    costs one row per upgrade, no matter how often they are looked up. The level of a unit at any point
+    in time is the latest row at or before it.
+    """
+    def __init__(self, path: str = PLAYER_HISTORY_PATH) -> None:
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS unit_levels (
+                    player_tag TEXT NOT NULL,
+                    village TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    recorded REAL NOT NULL,
+                    level INTEGER NOT NULL,
+                    PRIMARY KEY (player_tag, village, name, recorded)
+                ) WITHOUT ROWID""")
+
+    def levels_at(self, playertag: str, at: float = None) -> dict:
+        """Get the levels of a player at a point in time
+
+        Args:
+            playertag (str): A CoC player tag
+            at (float, optional): Unix time. Defaults to None, the latest levels.
+
+        Returns:
+            dict: (village, unit name) -> level, empty if nothing was recorded by then
+        """
+        at = time.time() if at is None else at
+        # SQLite takes the bare level column from the row holding MAX(recorded)
+        rows = self.connection.execute("""
+            SELECT village, name, level, MAX(recorded) FROM unit_levels
+            WHERE player_tag = ? AND recorded <= ?
+            GROUP BY village, name""", (playertag, at)).fetchall()
+
+        return {(village, name): level for village, name, level, _ in rows}
+
+    def first_recorded(self, playertag: str) -> float:
+        """Get when a player was first recorded
+
+        Args:
+            playertag (str): A CoC player tag
+
+        Returns:
+            float: Unix time, None if the player was never recorded
+        """
+        return self.connection.execute("SELECT MIN(recorded) FROM unit_levels WHERE player_tag = ?", (playertag,)).fetchone()[0]
+
+    def record(self, players: list) -> int:
+        """Record the current levels of players, writing only the levels that changed
+
+        Args:
+            players (list): Player data from the CoC API
+
+        Returns:
+            int: Number of rows written
+        """
+        now = time.time()
+        rows = []
+        for player in players:
+            latest = self.levels_at(player["tag"], now)
+            rows += [(player["tag"], village, name, now, level)
+                     for (village, name), level in player_levels(player).items() if latest.get((village, name)) != level]
+
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO unit_levels VALUES (?, ?, ?, ?, ?)", rows)
+
+        return len(rows)
+
+    def changes_since(self, playertag: str, since: float) -> tuple:
+        """Compare the latest levels of a player with their levels at since. If the player was first
+        recorded after since, the first recorded levels are compared against instead.
+
+        Args:
+            playertag (str): A CoC player tag
+            since (float): Unix time
+
+        Returns:
+            tuple: Unix time compared against (None if the player was never recorded), and a list of
+                (village, unit name, old level, new level) per unit whose level changed, old level is 0 for new units
+        """
+        first = self.first_recorded(playertag)
+        if first is None:
+            return None, []
+
+        since = max(since, first)
+        old_levels = self.levels_at(playertag, since)
+        new_levels = self.levels_at(playertag)
+
+        changes = [(village, name, old_levels.get((village, name), 0), level)
+                   for (village, name), level in new_levels.items() if old_levels.get((village, name), 0) != level]
+
+        return since, changes
+
+    def close(self) -> None:
+        self.connection.close()
@@ -0,0 +1,223 @@
+import numpy as np
+
+from static_data import registry, UNIT_GROUP_ASSETS
+
+# columns of a progress row, in the order Unit.display_units reads them after "name"
+PROGRESS_COLUMNS = ["remaining_level", "max_level",
+                    "remaining_time", "max_time",
+                    "remaining_elixir", "max_elixir",
+                    "remaining_dark_elixir", "max_dark_elixir",
+                    "remaining_gold", "max_gold"]
+
+# upgrade resource -> index of its (remaining, max) column pair, counted after time
+RESOURCE_COLUMNS = {"Elixir": 0, "DarkElixir": 1, "Gold": 2}
+
+
+class ProgressTable:
+    """The upgrade tables of a list of units stacked into NumPy arrays, so the progress of
+    all of them is computed with a handful of array operations.
+    """
+    def __init__(self, upgrade_tables: list, max_levels_by_th: list) -> None:
+        # (unit x th level) max levels, see Unit.max_levels_by_th
+        self.max_levels = np.array(max_levels_by_th, dtype=np.int64).reshape(len(upgrade_tables), -1)
+
+        width = max((max(len(table.cumulative_time), len(table.cumulative_cost)) for table in upgrade_tables), default=1)
+
+        # rows are padded with their last value, so levels past a unit's data are clamped like UpgradeTable does
+        self.cumulative_time = np.array([self._pad(table.cumulative_time, width) for table in upgrade_tables], dtype=np.int64).reshape(-1, width)
+        self.cumulative_cost = np.array([self._pad(table.cumulative_cost, width) for table in upgrade_tables], dtype=np.int64).reshape(-1, width)
+
+        # one-hot (unit x resource), units paying with a resource that is not displayed get an all-zero row
+        self.resources = np.zeros((len(upgrade_tables), len(RESOURCE_COLUMNS)), dtype=np.int64)
+        for i, table in enumerate(upgrade_tables):
+            if table.resource in RESOURCE_COLUMNS:
+                self.resources[i, RESOURCE_COLUMNS[table.resource]] = 1
+
+    def max_levels_at(self, th_levels) -> np.ndarray:
+        """Look up the max level of every unit at one or several th levels, clamped to the known th levels
+
+        Args:
+            th_levels (int | list): A th level or a list of them, ex: one per player
+
+        Returns:
+            np.ndarray: (unit) array for a single th level, (th level x unit) for a list
+        """
+        th_levels = np.clip(th_levels, 0, self.max_levels.shape[1] - 1)
+        return self.max_levels[:, th_levels].T
+
+    @staticmethod
+    def _pad(cumulative: tuple, width: int) -> list:
+        return list(cumulative) + [cumulative[-1]] * (width - len(cumulative))
+
+    def compute(self, current_levels: np.ndarray, max_levels: np.ndarray) -> np.ndarray:
+        """Compute the progress of every unit towards max_levels. The last axis of the level arrays
+        runs over the units, leading axes (ex: one per player) are kept.
+
+        Args:
+            current_levels (np.ndarray): Current level per unit
+            max_levels (np.ndarray): Target (max) level per unit
+
+        Returns:
+            np.ndarray: (... x unit x PROGRESS_COLUMNS) array
+        """
+        rows = np.arange(current_levels.shape[-1])
+        last = self.cumulative_time.shape[1] - 1
+        current = np.minimum(current_levels, last)
+        target = np.minimum(max_levels, last)
+
+        max_time = self.cumulative_time[rows, target]
+        max_cost = self.cumulative_cost[rows, target]
+        remaining_time = np.maximum(max_time - self.cumulative_time[rows, current], 0)
+        remaining_cost = np.maximum(max_cost - self.cumulative_cost[rows, current], 0)
+
+        progress = np.empty((*current_levels.shape, len(PROGRESS_COLUMNS)), dtype=np.int64)
+        progress[..., 0] = np.maximum(max_levels - current_levels, 0)
+        progress[..., 1] = max_levels
+        progress[..., 2] = remaining_time
+        progress[..., 3] = max_time
+        # remaining / max cost pairs, spread over the resource columns
+        progress[..., 4::2] = remaining_cost[..., None] * self.resources
+        progress[..., 5::2] = max_cost[..., None] * self.resources
+
+        return progress
+
+
+def progress_table(units: list) -> ProgressTable:
+    """Get the ProgressTable of a list of units, built once per distinct list of units
+
+    Args:
+        units (list): List of Unit subtypes
+
+    Returns:
+        ProgressTable: The stacked tables
+    """
+    upgrade_tables = [unit.upgrade_table for unit in units]
+    key = ("progress_table", tuple(id(table) for table in upgrade_tables))
+
+    return registry.derived(key, lambda: ProgressTable(upgrade_tables, [unit.max_levels_by_th() for unit in units]))
+
+
+def unit_progress(units: list, th_level: int) -> np.ndarray:
+    """Compute the progress of units towards their max level at th_level
+
+    Args:
+        units (list): List of Unit subtypes
+        th_level (int): The level of the townhall used to determine max level of unit
+
+    Returns:
+        np.ndarray: (unit x PROGRESS_COLUMNS) array
+    """
+    table = progress_table(units)
+    current_levels = np.array([unit.curr_level for unit in units], dtype=np.int64)
+
+    return table.compute(current_levels, table.max_levels_at(th_level))
+
+
+def category_progress(categories: list, th_level: int) -> np.ndarray:
+    """Compute the summed progress of several categories of units (ex: heroes, troops, spells) in one pass
+
+    Args:
+        categories (list): List of lists of Unit subtypes
+        th_level (int): The level of the townhall used to determine max level of unit
+
+    Returns:
+        np.ndarray: (category x PROGRESS_COLUMNS) array of sums
+    """
+    units = [unit for category in categories for unit in category]
+    progress = unit_progress(units, th_level)
+
+    # category index of every row of progress
+    category_ids = np.repeat(np.arange(len(categories)), [len(category) for category in categories])
+    sums = np.zeros((len(categories), len(PROGRESS_COLUMNS)), dtype=np.int64)
+    np.add.at(sums, category_ids, progress)
+
+    return sums
+
+
+def players_progress(unit_lists: list, th_levels: list) -> np.ndarray:
+    """Compute the total progress of many players in one pass, each towards their own th level.
+    Every list in unit_lists must hold the same units in the same order, which is what
+    create_*_objects return for any player.
+
+    Args:
+        unit_lists (list): Per player, a list of Unit subtypes
+        th_levels (list): Per player, the level of the townhall used to determine max level of units
+
+    Returns:
+        np.ndarray: (player x PROGRESS_COLUMNS) array of sums
+    """
+    if not unit_lists:
+        return np.zeros((0, len(PROGRESS_COLUMNS)), dtype=np.int64)
+
+    table = progress_table(unit_lists[0])
+    current_levels = np.array([[unit.curr_level for unit in player_units] for player_units in unit_lists], dtype=np.int64)
+
+    return table.compute(current_levels, table.max_levels_at(th_levels)).sum(axis=1)
+
+
+def unlocks_at(units: list, th_level: int) -> list[tuple]:
+    """List the units whose max level goes up when upgrading to th_level, including newly unlocked ones.
+    An unlocked unit is at least level 1, even if it cannot be upgraded yet (see Unit.unlocked_by_th),
+    so a level of 0 before means the unit is unlocked at th_level.
+
+    Args:
+        units (list): List of Unit subtypes
+        th_level (int): The townhall level upgraded to
+
+    Returns:
+        list[tuple]: (name, max level at th_level - 1, max level at th_level) per unit, in the order of units
+    """
+    table = progress_table(units)
+    unlocked = np.array([unit.unlocked_by_th() for unit in units], dtype=bool).reshape(len(units), -1)
+    th_levels = np.clip([th_level - 1, th_level], 0, unlocked.shape[1] - 1)
+
+    # (unit x [before, after]) levels, 0 while locked
+    levels = np.where(unlocked[:, th_levels], np.maximum(table.max_levels_at(th_levels).T, 1), 0).tolist()
+
+    return [(unit.name, old, new) for unit, (old, new) in zip(units, levels) if new > old]
+
+
+def upgrades_done(changes: list) -> tuple:
+    """Sum the upgrade time and resources that went into level changes of home village units.
+    Units outside of the unit index (ex: builder base units, the townhall) are not counted.
+
+    Args:
+        changes (list): (village, unit name, old level, new level) tuples, see PlayerHistory.changes_since
+
+    Returns:
+        tuple: Hours of upgrade time, and {resource: amount} in raw resource names (ex: "DarkElixir")
+    """
+    def build():
+        return {name: unit_static for group in UNIT_GROUP_ASSETS for name, unit_static in registry.unit_records(group).items()}
+
+    records = registry.derived("unit_records_by_name", build)
+
+    hours = 0
+    resources = {}
+    for village, name, old_level, new_level in changes:
+        if village != "home" or name not in records:
+            continue
+
+        table = registry.upgrade_table(records[name])
+        hours += table.time_between(old_level, new_level)
+        resources[table.resource] = resources.get(table.resource, 0) + table.cost_between(old_level, new_level)
+
+    return hours, resources
+
+
+def progress_rows(names: list, progress: np.ndarray, total: str = None) -> list[dict]:
+    """Turn a progress array into the dicts Unit.display_units displays, optionally with a row summing all rows
+
+    Args:
+        names (list): Row names
+        progress (np.ndarray): (row x PROGRESS_COLUMNS) array
+        total (str, optional): Name of a total row appended at the end. Defaults to None.
+
+    Returns:
+        list[dict]: One dict per row
+    """
+    if total is not None:
+        names = [*names, total]
+        progress = np.vstack([progress, progress.sum(axis=0)])
+
+    return [{"name": name, **dict(zip(PROGRESS_COLUMNS, row))} for name, row in zip(names, progress.tolist())]
@@ -0,0 +1,60 @@
+"""Drawing of the table images. Imported by the render pool workers, so it must stay free of side effects
+and only import what drawing needs: no Discord, no CoC API client, no databases.
+"""
+import io
+
+import matplotlib
+import pandas as pd
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+
+def plot_table(rows: list, columns: list, file_path, title: str) -> bytes:
+    """Renders rows as a table image (PNG). Runs in the render pool, see bot_util.render_table.
+
+    Args:
+        rows (list): Table rows, each a list of cell strings
+        columns (list): Column labels
+        file_path (str | BinaryIO | None): A path or a writable binary buffer (ex: io.BytesIO) the PNG is
+            also written to, if given
+        title (str): Title of the table
+
+    Returns:
+        bytes: The PNG image
+    """
+    df = pd.DataFrame(rows, columns=columns)
+
+    # a bare Figure (no pyplot) is not tracked by pyplot's figure manager,
+    # so it is freed as soon as this function returns instead of piling up across requests
+    fig = Figure(dpi=300)
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    # hide axes
+    fig.patch.set_visible(False)
+    ax.axis('off')
+
+    table = ax.table(cellText=df.values, colLabels=df.columns, loc='center')
+
+    table.auto_set_column_width(col=list(range(len(columns))))
+    table.auto_set_font_size(False)
+    table.set_fontsize(8)
+
+    ## make sure table size fits well into canvas ##
+    # get bounding box of table, laid out with the canvas' renderer instead of a separate draw
+    points = table.get_window_extent(canvas.get_renderer()).get_points()
+    # add 10 pixel spacing
+    points[0,:] -= 10; points[1,:] += 10
+    # get new bounding box in inches
+    nbbox = matplotlib.transforms.Bbox.from_extents(points/fig.dpi)
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", bbox_inches=nbbox)
+    png = buffer.getvalue()
+
+    if isinstance(file_path, str):
+        with open(file_path, "wb") as pngf:
+            pngf.write(png)
+    elif file_path is not None:
+        file_path.write(png)
+
+    return png
@@ -0,0 +1,238 @@
+import os
+import json
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+
+# max bytes of PNGs kept in memory, least recently used ones are evicted past it
+RENDER_CACHE_BYTES = int(os.getenv("RENDER_CACHE_BYTES", 64 * 1024 * 1024))
+# directory evicted PNGs are spilled to, not spilled if not set
+RENDER_CACHE_DIR = os.getenv("RENDER_CACHE_DIR")
+# max bytes of PNGs kept in RENDER_CACHE_DIR, oldest ones are deleted past it
+RENDER_CACHE_DIR_BYTES = int(os.getenv("RENDER_CACHE_DIR_BYTES", 512 * 1024 * 1024))
+
+# part of every key, bump it when render.plot_table draws differently, so old images are not served anymore
+RENDER_VERSION = 1
+
+
+def render_key(rows: list, columns: list, title: str) -> str:
+    """Get the key of a rendered table, a hash of everything render.plot_table draws
+
+    Args:
+        rows (list): Table rows, each a list of cell strings
+        columns (list): Column labels
+        title (str): Title of the table
+
+    Returns:
+        str: Hex sha256 digest
+    """
+    content = json.dumps([RENDER_VERSION, title, columns, rows], separators=(",", ":"), default=str)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+class RenderCache:
+    """Content addressed cache of rendered tables: the same rows, columns and title always render to
+    the same PNG, so it is only rendered once. PNGs are kept in memory up to max_bytes, least recently used
+    first out. With a directory, evicted PNGs are written there and read back on the next hit.
+
+    Which PNGs are on disk, and their sizes, is tracked in memory (read from the directory once, on first use),
+    so a lookup or an eviction never scans the directory. Coroutines should use load and store, which do the
+    file work in a thread instead of blocking the event loop.
+    """
+    def __init__(self, max_bytes: int = RENDER_CACHE_BYTES, directory: str = RENDER_CACHE_DIR,
+                 max_directory_bytes: int = RENDER_CACHE_DIR_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        # key -> PNG
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.directory = directory
+        self.max_directory_bytes = max_directory_bytes
+        self.directory_size = 0
+        # key -> size of the spilled PNG, least recently used first
+        self._spilled = OrderedDict()
+        self._indexed = directory is None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.png")
+
+    def _index_directory(self) -> None:
+        """Pick up the PNGs spilled before a restart, oldest first. Only scans the directory the first time
+        """
+        with self._lock:
+            if self._indexed:
+                return
+            self._indexed = True
+
+        os.makedirs(self.directory, exist_ok=True)
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".png"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name[:-len(".png")], stat.st_size))
+
+        with self._lock:
+            spilled_since = self._spilled
+            self._spilled = OrderedDict((key, size) for _, key, size in sorted(files) if key not in spilled_since)
+            self._spilled.update(spilled_since)
+            self.directory_size = sum(self._spilled.values())
+        self._prune_directory()
+
+    def get(self, key: str) -> bytes:
+        """Get a PNG cached in memory, marking it as recently used
+
+        Args:
+            key (str): Key from render_key
+
+        Returns:
+            bytes: The PNG, None if it is not in memory
+        """
+        with self._lock:
+            png = self._entries.get(key)
+            if png is not None:
+                self._entries.move_to_end(key)
+            return png
+
+    def is_spilled(self, key: str) -> bool:
+        with self._lock:
+            return key in self._spilled
+
+    def put(self, key: str, png: bytes) -> list:
+        """Cache a rendered PNG in memory, evicting the least recently used ones when over budget
+
+        Args:
+            key (str): Key from render_key
+            png (bytes): The PNG image
+
+        Returns:
+            list: (key, PNG) of every evicted entry, see spill
+        """
+        evicted = []
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return evicted
+            if len(png) > self.max_bytes:
+                return evicted
+
+            self._entries[key] = png
+            self.size += len(png)
+            while self.size > self.max_bytes:
+                evicted_key, evicted_png = self._entries.popitem(last=False)
+                self.size -= len(evicted_png)
+                evicted.append((evicted_key, evicted_png))
+
+        return evicted
+
+    def read_spilled(self, key: str) -> bytes:
+        """Read a spilled PNG back from disk. Blocking, see load
+
+        Args:
+            key (str): Key from render_key
+
+        Returns:
+            bytes: The PNG, None if it is not on disk
+        """
+        if not self.is_spilled(key):
+            return None
+
+        try:
+            with open(self._path(key), "rb") as pngf:
+                png = pngf.read()
+        except FileNotFoundError:
+            with self._lock:
+                self.directory_size -= self._spilled.pop(key, 0)
+            return None
+
+        with self._lock:
+            if key in self._spilled:
+                self._spilled.move_to_end(key)
+        return png
+
+    def spill(self, evicted: list) -> None:
+        """Write PNGs evicted from memory to the directory, then delete the least recently used ones
+        until the directory is within max_directory_bytes. Blocking, see store
+
+        Args:
+            evicted (list): (key, PNG) pairs from put
+        """
+        if self.directory is None:
+            return
+
+        self._index_directory()
+        for key, png in evicted:
+            if self.is_spilled(key):
+                continue
+
+            path = self._path(key)
+            # write under a temporary name, so a concurrent read never gets half a PNG
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as pngf:
+                pngf.write(png)
+            os.replace(tmp_path, path)
+
+            with self._lock:
+                self._spilled[key] = len(png)
+                self.directory_size += len(png)
+
+        self._prune_directory()
+
+    def _prune_directory(self) -> None:
+        while True:
+            with self._lock:
+                if self.directory_size <= self.max_directory_bytes or not self._spilled:
+                    return
+                key, size = self._spilled.popitem(last=False)
+                self.directory_size -= size
+
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    async def load(self, key: str) -> tuple:
+        """Get a cached PNG from memory, or from disk without blocking the event loop.
+        A PNG read from disk is put back into memory
+
+        Args:
+            key (str): Key from render_key
+
+        Returns:
+            tuple: (PNG, "memory" or "disk"), (None, None) if nothing is cached
+        """
+        png = self.get(key)
+        if png is not None:
+            return png, "memory"
+
+        if not self._indexed:
+            await asyncio.to_thread(self._index_directory)
+        if not self.is_spilled(key):
+            return None, None
+
+        png = await asyncio.to_thread(self.read_spilled, key)
+        if png is None:
+            return None, None
+
+        await self.store(key, png)
+        return png, "disk"
+
+    async def store(self, key: str, png: bytes) -> None:
+        """Cache a rendered PNG, spilling what it evicts to disk without blocking the event loop
+
+        Args:
+            key (str): Key from render_key
+            png (bytes): The PNG image
+        """
+        evicted = self.put(key, png)
+        if evicted and self.directory is not None:
+            await asyncio.to_thread(self.spill, evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
@@ -1,5 +1,6 @@
 from unit import Unit
 import bot_util
+from static_data import registry
 
 class Spell(Unit):
     def __init__(self, curr_level, name, unit_static: dict) -> None:
@@ -17,9 +18,9 @@ class Spell(Unit):
         Returns:
             int: max level
         """
-        return len(self.unit_static["LaboratoryLevel"])
+        return len(self.upgrade_table.required_lab_levels)
     
-    def get_max_level_th(self, th_level: int):
+    def compute_max_level_th(self, th_level: int) -> int:
         """Deduce the maximum spell level, at current th_level, from a list of "required townhall levels" of the form: 
         [9, 9, 9, 9, 9, 10, 10, 10, ...]. Assumes self.unit_static contains a ProductionBuilding and LaboratoryLevel key.
 
@@ -29,14 +30,27 @@ class Spell(Unit):
         Returns:
             int: The max level of a given item (hero, building, etc.)
         """
-        if not Unit.unit_is_available_th(self.unit_static["ProductionBuilding"][0], th_level):
+        if not Unit.unit_is_available_th(self.upgrade_table.production_building, th_level):
             return 0
 
-        th2lab: dict = bot_util.get_th_lab_map()
-        rq_lab_levels = self.unit_static["LaboratoryLevel"]
-        if th2lab[th_level] < rq_lab_levels[1]:
+        # townhalls without a laboratory have lab level 0
+        lab_level = registry.th_lab_map().get(th_level, 0)
+        rq_lab_levels = self.upgrade_table.required_lab_levels
+        if lab_level < rq_lab_levels[1]:
             return 0
-        return max(i+1 for i, rq_lab_level in enumerate(rq_lab_levels) if rq_lab_level <= th2lab[th_level])
+        return max(i+1 for i, rq_lab_level in enumerate(rq_lab_levels) if rq_lab_level <= lab_level)
+
+    def is_unlocked_th(self, th_level: int) -> bool:
+        """Check whether the spell can be trained at th_level, i.e. the level of the Spell Factory it needs can be built
+
+        Args:
+            th_level (int): A town hall level
+
+        Returns:
+            bool: True if the spell is unlocked
+        """
+        return Unit.unit_is_available_th(self.upgrade_table.production_building, th_level,
+                                         self.upgrade_table.production_building_level)
 
     def get_upgrade_time(self, level: int) -> int:
         return super().get_upgrade_time(level, prefix="Upgrade")
@@ -48,27 +62,17 @@ class Spell(Unit):
         return super().get_upgrade_resource(prefix="Upgrade")
     
     @staticmethod
-    def create_spell_objects(translation: dict, unit_groups: dict, player: dict):
-        spells_static = bot_util.load_json("assets/spells.json")
+    def create_spell_objects(player: dict):
+        """Create a Spell object for every spell in the "spells" unit group, at the player's level (0 if not unlocked)
 
-        spells = []
-        for sc_name, spell_static in spells_static.items():
-            if "TID" not in spell_static: 
-                continue
-
-            if "DisableProduction" in spell_static:
-                continue
-            
-            name = translation[spell_static["TID"][0]][0] 
-            if name not in unit_groups["spells"]:
-                continue
-
-            spell_active = bot_util.search_unit(name, player["spells"])
-
-            if not spell_active:
-                spell_active = {"level": 0}
-            spell = Spell(curr_level=spell_active["level"], name=name, unit_static=spell_static)
+        Args:
+            player (dict): Player data from the CoC API
 
-            spells.append(spell)
+        Returns:
+            list: List of Spell objects, in asset order
+        """
+        # index the player's units once, instead of searching them for every static unit
+        levels = bot_util.index_units(player["spells"])
 
-        return spells
\ No newline at end of file
+        return [Spell(curr_level=levels.get(name, 0), name=name, unit_static=spell_static)
+                for name, spell_static in registry.unit_records("spells").items()]
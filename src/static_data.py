@@ -0,0 +1,275 @@
+import os
+import threading
+from types import MappingProxyType
+
+import asset_compiler
+from upgrade_table import UpgradeTable
+
+# absolute, so the bot does not depend on being started from the repository root
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "assets")
+
+# registry name -> file in ASSETS_DIR
+ASSET_FILES = {
+    "buildings": "buildings.json",
+    "characters": "characters.json",
+    "heroes": "heroes.json",
+    "pets": "pets.json",
+    "spells": "spells.json",
+    "texts": "texts_EN.json",
+    "unit_groups": "unit_groups.json",
+    "pretty_name_map": "pretty_name_map.json",
+}
+
+# compiled, stripped down copy of the assets, rebuilt whenever the JSON files change (see asset_compiler)
+SNAPSHOT_PATH = os.getenv("STATIC_DATA_SNAPSHOT", os.path.join(ASSETS_DIR, "static_data.pickle"))
+
+# unit group of unit_groups.json -> asset the static records of its units are in
+UNIT_GROUP_ASSETS = {
+    "home_heroes": "heroes",
+    "home_troops": "characters",
+    "siege_machines": "characters",
+    "spells": "spells",
+    "pets": "pets",
+}
+
+
+def is_home_unit(asset: str, sc_name: str, unit_static) -> bool:
+    """Check whether a static record is an upgradable home village unit, skipping tutorial, disabled
+    and builder base records, some of which share their display name with a home village unit
+
+    Args:
+        asset (str): Registry name of the asset the record is in, ex: "characters"
+        sc_name (str): Key of the record in the asset
+        unit_static: The static record
+
+    Returns:
+        bool: True if the record belongs in the unit index
+    """
+    if "TID" not in unit_static:
+        return False
+    # pets are never produced, so all of them are marked DisableProduction
+    if asset in ("characters", "spells") and "DisableProduction" in unit_static:
+        return False
+    if asset == "characters" and ("Tutorial" in sc_name or unit_static["ProductionBuilding"][0] == "Barrack2"):
+        return False
+    return True
+
+
+def freeze(obj):
+    """Recursively turns parsed JSON into read-only containers (dicts -> mappingproxy, lists -> tuples),
+    so the shared static data cannot be modified by one request and leak into the next.
+
+    Args:
+        obj: Parsed JSON value
+
+    Returns:
+        A read-only equivalent of obj
+    """
+    if isinstance(obj, dict):
+        return MappingProxyType({key: freeze(value) for key, value in obj.items()})
+    if isinstance(obj, list):
+        return tuple(freeze(value) for value in obj)
+    return obj
+
+
+class StaticData:
+    """Process-wide registry of the static game data in assets/.
+
+    The assets are loaded once, on first use (or through preload), from a compiled snapshot holding only
+    the fields the bot reads, and handed out as immutable views. If the snapshot is missing or was compiled
+    from other JSON files, the JSON files are compiled and the snapshot is rewritten.
+    Values derived from the assets, like the th -> lab map, are cached alongside.
+    """
+    def __init__(self, assets_dir: str = ASSETS_DIR, snapshot_path: str = SNAPSHOT_PATH) -> None:
+        self.assets_dir = assets_dir
+        self.snapshot_path = snapshot_path
+        self._assets = {}
+        self._derived = {}
+        self._lock = threading.RLock()
+
+    def get(self, name: str) -> MappingProxyType:
+        """Get an asset by registry name, loading the assets if they have not been loaded yet
+
+        Args:
+            name (str): One of the keys of ASSET_FILES
+
+        Returns:
+            MappingProxyType: Read-only view of the asset
+        """
+        asset = self._assets.get(name)
+        if asset is not None:
+            return asset
+
+        with self._lock:
+            if not self._assets:
+                self._load()
+            return self._assets[name]
+
+    def _load(self) -> None:
+        checksum = asset_compiler.source_checksum(self.assets_dir, ASSET_FILES)
+        assets = asset_compiler.load_snapshot(self.snapshot_path, checksum)
+
+        if assets is None:
+            assets = asset_compiler.compile_assets(self.assets_dir, ASSET_FILES)
+            try:
+                asset_compiler.write_snapshot(self.snapshot_path, assets, checksum)
+            except OSError as e:
+                # without a snapshot the next start up just compiles again
+                print(f"Could not write static data snapshot {self.snapshot_path}: {e}")
+
+        self._assets = {name: freeze(asset) for name, asset in assets.items()}
+
+    def derived(self, key, build):
+        """Get a value computed from the static data, building it once with build()
+
+        Args:
+            key: Any hashable key identifying the value
+            build (callable): Zero argument function computing the value
+
+        Returns:
+            The cached value
+        """
+        if key in self._derived:
+            return self._derived[key]
+
+        with self._lock:
+            if key not in self._derived:
+                self._derived[key] = build()
+            return self._derived[key]
+
+    def preload(self) -> None:
+        """Load every asset and build the unit index up front, typically once at bot start up.
+        """
+        self.unit_index()
+
+    def reload(self) -> None:
+        """Drop every loaded asset and derived value, e.g. after the assets have been refreshed
+        from coc.guide. The next access loads the new files, recompiling the snapshot.
+        """
+        with self._lock:
+            self._assets = {}
+            self._derived = {}
+
+    @property
+    def buildings(self) -> MappingProxyType:
+        return self.get("buildings")
+
+    @property
+    def characters(self) -> MappingProxyType:
+        return self.get("characters")
+
+    @property
+    def heroes(self) -> MappingProxyType:
+        return self.get("heroes")
+
+    @property
+    def pets(self) -> MappingProxyType:
+        return self.get("pets")
+
+    @property
+    def spells(self) -> MappingProxyType:
+        return self.get("spells")
+
+    @property
+    def texts(self) -> MappingProxyType:
+        return self.get("texts")
+
+    @property
+    def unit_groups(self) -> MappingProxyType:
+        return self.get("unit_groups")
+
+    @property
+    def pretty_name_map(self) -> MappingProxyType:
+        return self.get("pretty_name_map")
+
+    def th_lab_map(self) -> MappingProxyType:
+        """Get a mapping from "Thownhall level" to the associated max level of the laboratory.
+        Some units report the "required lab level" instead of "required th level", so this is needed.
+
+        Returns:
+            MappingProxyType: {th_level: lab_level, ...}
+        """
+        def build():
+            lab_th_levels = self.buildings["Laboratory"]["TownHallLevel"]
+            return MappingProxyType({th_lvl: i+1 for i, th_lvl in enumerate(lab_th_levels)})
+
+        return self.derived("th_lab_map", build)
+
+    def unit_index(self) -> MappingProxyType:
+        """Get the index of the units of every group in UNIT_GROUP_ASSETS, from display name to static record,
+        so units can be looked up without translating every record of the assets. Units are in asset order
+        and, where several records share a display name, the first one wins.
+
+        Returns:
+            MappingProxyType: {group: {name: unit_static, ...}, ...}
+        """
+        def build():
+            index = {}
+            for group, asset in UNIT_GROUP_ASSETS.items():
+                names = set(self.unit_groups[group])
+                units = {}
+                for sc_name, unit_static in self.get(asset).items():
+                    if not is_home_unit(asset, sc_name, unit_static):
+                        continue
+
+                    name = self.texts[unit_static["TID"][0]][0]
+                    if name in names and name not in units:
+                        units[name] = unit_static
+                index[group] = MappingProxyType(units)
+
+            return MappingProxyType(index)
+
+        return self.derived("unit_index", build)
+
+    def unit_records(self, group: str) -> MappingProxyType:
+        """Get the units of a group, see unit_index
+
+        Args:
+            group (str): One of the keys of UNIT_GROUP_ASSETS, ex: "home_troops"
+
+        Returns:
+            MappingProxyType: {name: unit_static, ...}
+        """
+        return self.unit_index()[group]
+
+    def unit_name(self, unit_static) -> str:
+        """Get the display name of an indexed static record
+
+        Args:
+            unit_static: A static record of the unit index
+
+        Returns:
+            str: The display name, None if the record is not indexed
+        """
+        def build():
+            return MappingProxyType({id(unit_static): name
+                                     for units in self.unit_index().values()
+                                     for name, unit_static in units.items()})
+
+        return self.derived("unit_names", build).get(id(unit_static))
+
+    def max_th_level(self) -> int:
+        """Get the highest townhall level in the static data
+
+        Returns:
+            int: Townhall level
+        """
+        return max(self.th_lab_map())
+
+    def upgrade_table(self, unit_static, prefix: str = "Upgrade") -> UpgradeTable:
+        """Get the compiled upgrade table of a unit's static record, compiling it on first use.
+        Tables are keyed by the identity of the record, which the table keeps alive, so the key
+        stays valid until the next reload.
+
+        Args:
+            unit_static: A unit's static record, ex: registry.heroes["Barbarian King"]
+            prefix (str, optional): Key prefix of the upgrade fields. Defaults to "Upgrade".
+
+        Returns:
+            UpgradeTable: The compiled table
+        """
+        return self.derived(("upgrade_table", id(unit_static), prefix), lambda: UpgradeTable(unit_static, prefix))
+
+
+# the one registry shared by the whole bot
+registry = StaticData()
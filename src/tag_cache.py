@@ -0,0 +1,94 @@
+import os
+import time
+import sqlite3
+
+TAG_CACHE_PATH = os.getenv("TAG_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tag_cache.sqlite3"))
+
+# players rarely change clans, so a resolved clan tag is trusted for this many seconds
+CLAN_TAG_TTL = int(os.getenv("CLAN_TAG_TTL", 6 * 60 * 60))
+
+
+class ClanTagCache:
+    """Remembers which clan a player is in, so war commands do not have to fetch the whole player
+    profile just to read its clan tag. Kept in memory and in a small SQLite file, so it survives restarts.
+    """
+    def __init__(self, path: str = TAG_CACHE_PATH, ttl: int = CLAN_TAG_TTL) -> None:
+        self.ttl = ttl
+        # playertag -> (clantag, expiry as unix time)
+        self._memory = {}
+        self.path = path
+        self._connection = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """The SQLite connection, opened on first use rather than when bot_util is imported
+
+        Returns:
+            sqlite3.Connection: The connection
+        """
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path)
+            with self._connection:
+                self._connection.execute("""
+                    CREATE TABLE IF NOT EXISTS clan_tags (
+                        player_tag TEXT PRIMARY KEY,
+                        clan_tag TEXT NOT NULL,
+                        expires REAL NOT NULL
+                    )""")
+        return self._connection
+
+    def get(self, playertag: str) -> str:
+        """Get the cached clan tag of a player
+
+        Args:
+            playertag (str): A CoC player tag
+
+        Returns:
+            str: The clan tag, None if it is not cached or has expired
+        """
+        cached = self._memory.get(playertag)
+        if cached is None:
+            cached = self.connection.execute("SELECT clan_tag, expires FROM clan_tags WHERE player_tag = ?",
+                                             (playertag,)).fetchone()
+            if cached is None:
+                return None
+            self._memory[playertag] = cached
+
+        clantag, expires = cached
+        if time.time() >= expires:
+            self.invalidate(playertag)
+            return None
+
+        return clantag
+
+    def put(self, playertag: str, clantag: str) -> None:
+        """Cache the clan tag of a player for self.ttl seconds
+
+        Args:
+            playertag (str): A CoC player tag
+            clantag (str): The tag of the player's clan
+        """
+        expires = time.time() + self.ttl
+        self._memory[playertag] = (clantag, expires)
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO clan_tags VALUES (?, ?, ?)", (playertag, clantag, expires))
+
+    def invalidate(self, playertag: str) -> None:
+        self._memory.pop(playertag, None)
+        with self.connection:
+            self.connection.execute("DELETE FROM clan_tags WHERE player_tag = ?", (playertag,))
+
+    def invalidate_clan(self, clantag: str) -> None:
+        """Forget every player resolved to clantag, e.g. after a lookup of that clan failed
+
+        Args:
+            clantag (str): A CoC clan tag
+        """
+        self._memory = {playertag: cached for playertag, cached in self._memory.items() if cached[0] != clantag}
+        with self.connection:
+            self.connection.execute("DELETE FROM clan_tags WHERE clan_tag = ?", (clantag,))
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
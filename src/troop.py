@@ -1,5 +1,6 @@
 from unit import Unit
 import bot_util
+from static_data import registry
 
 class Troop(Unit):
     def __init__(self, curr_level, name, unit_static: dict) -> None:
@@ -17,9 +18,9 @@ class Troop(Unit):
         Returns:
             int: max level
         """
-        return len(self.unit_static["LaboratoryLevel"])
+        return len(self.upgrade_table.required_lab_levels)
     
-    def get_max_level_th(self, th_level: int):
+    def compute_max_level_th(self, th_level: int) -> int:
         """Deduce the maximum troop level, at current th_level, from a list of "required townhall levels" of the form: 
         [9, 9, 9, 9, 9, 10, 10, 10, ...]. Assumes self.unit_static contains a ProductionBuilding and LaboratoryLevel key.
 
@@ -29,14 +30,27 @@ class Troop(Unit):
         Returns:
             int: The max level of a given item (hero, building, etc.)
         """
-        if not Unit.unit_is_available_th(self.unit_static["ProductionBuilding"][0], th_level):
+        if not Unit.unit_is_available_th(self.upgrade_table.production_building, th_level):
             return 0
 
-        th2lab: dict = bot_util.get_th_lab_map()
-        rq_lab_levels = self.unit_static["LaboratoryLevel"]
-        if th2lab[th_level] < rq_lab_levels[1]:
+        # townhalls without a laboratory have lab level 0
+        lab_level = registry.th_lab_map().get(th_level, 0)
+        rq_lab_levels = self.upgrade_table.required_lab_levels
+        if lab_level < rq_lab_levels[1]:
             return 0
-        return max(i+1 for i, rq_lab_level in enumerate(rq_lab_levels) if rq_lab_level <= th2lab[th_level])
+        return max(i+1 for i, rq_lab_level in enumerate(rq_lab_levels) if rq_lab_level <= lab_level)
+
+    def is_unlocked_th(self, th_level: int) -> bool:
+        """Check whether the troop can be trained at th_level, i.e. the level of the Barracks it needs can be built
+
+        Args:
+            th_level (int): A town hall level
+
+        Returns:
+            bool: True if the troop is unlocked
+        """
+        return Unit.unit_is_available_th(self.upgrade_table.production_building, th_level,
+                                         self.upgrade_table.production_building_level)
 
     def get_upgrade_time(self, level: int) -> int:
         return super().get_upgrade_time(level, prefix="Upgrade")
@@ -48,33 +62,17 @@ class Troop(Unit):
         return super().get_upgrade_resource(prefix="Upgrade")
     
     @staticmethod
-    def create_troop_objects(translation: dict, unit_groups: dict, player: dict):
-        troops_static = bot_util.load_json("assets/characters.json")
-
-        troops = []
-        for sc_name, troop_static in troops_static.items():
-            if "TID" not in troop_static: 
-                continue
+    def create_troop_objects(player: dict):
+        """Create a Troop object for every troop in the "home_troops" unit group, at the player's level (0 if not unlocked)
 
-            if "Tutorial" in sc_name:
-                continue
-
-            if "DisableProduction" in troop_static:
-                continue
-
-            if troop_static["ProductionBuilding"][0] == "Barrack2":
-                continue
-            
-            name = translation[troop_static["TID"][0]][0] 
-            if name not in unit_groups["home_troops"]:
-                continue
-
-            troop_active = bot_util.search_unit(name, player["troops"])
+        Args:
+            player (dict): Player data from the CoC API
 
-            if not troop_active:
-                troop_active = {"level": 0}
-            troop = Troop(curr_level=troop_active["level"], name=name, unit_static=troop_static)
+        Returns:
+            list: List of Troop objects, in asset order
+        """
+        # index the player's units once, instead of searching them for every static unit
+        levels = bot_util.index_units(player["troops"])
 
-            troops.append(troop)
-        
-        return troops
\ No newline at end of file
+        return [Troop(curr_level=levels.get(name, 0), name=name, unit_static=troop_static)
+                for name, troop_static in registry.unit_records("home_troops").items()]
@@ -1,9 +1,12 @@
 from abc import ABC, abstractmethod
 import bot_util
+from static_data import registry
 
 class Unit(ABC):
     def __init__(self, curr_level, name, unit_static: dict) -> None:
         self.unit_static = unit_static
+        # requirement arrays and cumulative time/cost of the "Upgrade" fields, compiled once per unit
+        self.upgrade_table = registry.upgrade_table(unit_static)
         self.curr_level = curr_level
         self.name = name
 
@@ -12,39 +15,60 @@ class Unit(ABC):
         pass
 
     @abstractmethod
-    def get_max_level_th(self, th_level: int):
+    def compute_max_level_th(self, th_level: int) -> int:
         pass
 
-    def get_upgrade_time(self, level: int, prefix: str) -> int:
-        upgrade_time = 0
+    @abstractmethod
+    def is_unlocked_th(self, th_level: int) -> bool:
+        pass
 
-        h_key = prefix + "TimeH"
-        d_key = prefix + "TimeD"
+    def max_levels_by_th(self) -> tuple:
+        """Get the max level of the unit at every townhall level, from 0 to registry.max_th_level().
+        Computed once per unit, as the unit's row of the (unit x th level) max level matrix.
+
+        Returns:
+            tuple: Max level, indexed by townhall level
+        """
+        def build():
+            return tuple(self.compute_max_level_th(th_level) for th_level in range(registry.max_th_level() + 1))
 
-        if h_key in self.unit_static:
-            upgrade_time += sum(self.unit_static[h_key][:level])
+        return registry.derived(("max_levels_by_th", type(self).__name__, id(self.unit_static)), build)
 
-        if d_key in self.unit_static:
-            upgrade_time += sum(self.unit_static[d_key][:level]) * 24
+    def unlocked_by_th(self) -> tuple:
+        """Get whether the unit is unlocked at every townhall level, from 0 to registry.max_th_level().
+        A unit can be unlocked at a townhall level where its max level is still 0, if its first
+        upgrade needs a higher laboratory level.
 
-        return upgrade_time
+        Returns:
+            tuple: True if unlocked, indexed by townhall level
+        """
+        def build():
+            return tuple(self.is_unlocked_th(th_level) for th_level in range(registry.max_th_level() + 1))
 
-    def get_upgrade_cost(self, level: int, prefix: str) -> int:
-        upgrade_cost = 0
+        return registry.derived(("unlocked_by_th", type(self).__name__, id(self.unit_static)), build)
 
-        cost_key = prefix + "Cost"
+    def get_max_level_th(self, th_level: int) -> int:
+        """Get the max level of the unit at th_level. Levels past the highest townhall are clamped.
 
-        if cost_key in self.unit_static:
-            upgrade_cost += sum(self.unit_static[cost_key][:level])
+        Args:
+            th_level (int): A player's current town hall level
 
-        return upgrade_cost
+        Returns:
+            int: The max level of the unit
+        """
+        max_levels = self.max_levels_by_th()
+        return max_levels[min(max(th_level, 0), len(max_levels) - 1)]
+
+    def get_upgrade_time(self, level: int, prefix: str) -> int:
+        return registry.upgrade_table(self.unit_static, prefix).time(level)
+
+    def get_upgrade_cost(self, level: int, prefix: str) -> int:
+        return registry.upgrade_table(self.unit_static, prefix).cost(level)
     
     def get_upgrade_resource(self, prefix: str):
-        name_map: dict = bot_util.load_json("assets/pretty_name_map.json")
-
-        resource_key = prefix + "Resource"
+        name_map = registry.pretty_name_map
 
-        return name_map["resource"][self.unit_static[resource_key][0]]
+        return name_map["resource"][registry.upgrade_table(self.unit_static, prefix).resource]
     
     # static methods
     @staticmethod
@@ -52,6 +76,8 @@ class Unit(ABC):
         # create list the length of units, 
         # so units can be placed directly at indices, in the right order
         display_lists = [None] * len(unit_order)
+        # name -> position, so each unit is placed without searching unit_order
+        positions = {name: i for i, name in enumerate(unit_order)}
 
         for unit in units:
             # list to hold unit attributes in a displayable manner
@@ -82,7 +108,7 @@ class Unit(ABC):
                 display_list.append(cost)
 
 
-            i = unit_order.index(unit["name"])
+            i = positions[unit["name"]]
             display_lists[i] = display_list
         
         return display_lists
@@ -151,13 +177,17 @@ class Unit(ABC):
 
     
     @staticmethod
-    def unit_is_available_th(production_building: str, th_level: int) -> bool:
+    def unit_is_available_th(production_building: str, th_level: int, building_level: int = 1) -> bool:
         """Check whether a spell or troop can be available in the Forge / Barracks at th_level
 
+        Args:
+            production_building (str): Name of the building producing the unit, ex: "Barrack"
+            th_level (int): A town hall level
+            building_level (int, optional): Level of the building the unit needs. Defaults to 1.
+
         Returns:
             bool: A boolean value, true if unit is available at th_level
         """
-        buildings = bot_util.load_json("assets/buildings.json")
-        pb_th_levels = buildings[production_building]["TownHallLevel"]
-        return any(th_level >= pb_th_level for pb_th_level in pb_th_levels)
+        pb_th_levels = registry.buildings[production_building]["TownHallLevel"]
+        return building_level <= len(pb_th_levels) and th_level >= pb_th_levels[building_level - 1]
 
@@ -0,0 +1,79 @@
+from itertools import accumulate, zip_longest
+
+
+class UpgradeTable:
+    """Upgrade data of a single unit, compiled once from its static record.
+
+    Times and costs are stored as prefix sums, where index i holds the total needed to reach level i
+    (index 0 is always 0), so the time or cost between any two levels is two lookups.
+    """
+    def __init__(self, unit_static, prefix: str = "Upgrade") -> None:
+        # kept so the record outlives the table, see StaticData.upgrade_table
+        self.unit_static = unit_static
+        self.prefix = prefix
+
+        hours = unit_static.get(prefix + "TimeH", ())
+        days = unit_static.get(prefix + "TimeD", ())
+        level_hours = (h + d * 24 for h, d in zip_longest(hours, days, fillvalue=0))
+        self.cumulative_time = tuple(accumulate(level_hours, initial=0))
+
+        costs = unit_static.get(prefix + "Cost", ())
+        self.cumulative_cost = tuple(accumulate(costs, initial=0))
+
+        resources = unit_static.get(prefix + "Resource")
+        self.resource = resources[0] if resources else None
+
+        self.required_th_levels = tuple(unit_static.get("RequiredTownHallLevel", ()))
+        self.required_lab_levels = tuple(unit_static.get("LaboratoryLevel", ()))
+
+        production_buildings = unit_static.get("ProductionBuilding")
+        self.production_building = production_buildings[0] if production_buildings else None
+        # level of the production building that unlocks the unit, troops and spells name it differently
+        building_levels = unit_static.get("BarrackLevel") or unit_static.get("SpellForgeLevel")
+        self.production_building_level = building_levels[0] if building_levels else 1
+
+    def time(self, level: int) -> int:
+        """Total upgrade time in hours needed to reach level, levels past the data are clamped
+
+        Args:
+            level (int): A unit level
+
+        Returns:
+            int: Hours
+        """
+        return self.cumulative_time[min(level, len(self.cumulative_time) - 1)]
+
+    def cost(self, level: int) -> int:
+        """Total upgrade cost needed to reach level, levels past the data are clamped
+
+        Args:
+            level (int): A unit level
+
+        Returns:
+            int: Amount of self.resource
+        """
+        return self.cumulative_cost[min(level, len(self.cumulative_cost) - 1)]
+
+    def time_between(self, from_level: int, to_level: int) -> int:
+        """Upgrade time in hours remaining from from_level to to_level, 0 if already there
+
+        Args:
+            from_level (int): Current level
+            to_level (int): Target level
+
+        Returns:
+            int: Hours
+        """
+        return max(self.time(to_level) - self.time(from_level), 0)
+
+    def cost_between(self, from_level: int, to_level: int) -> int:
+        """Upgrade cost remaining from from_level to to_level, 0 if already there
+
+        Args:
+            from_level (int): Current level
+            to_level (int): Target level
+
+        Returns:
+            int: Amount of self.resource
+        """
+        return max(self.cost(to_level) - self.cost(from_level), 0)
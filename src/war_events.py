@@ -0,0 +1,143 @@
+# max characters of a Discord message
+DISCORD_MESSAGE_LIMIT = 2000
+
+
+def same_war(previous: dict, current: dict) -> bool:
+    """Check whether two war payloads describe the same war
+
+    Args:
+        previous (dict): War data
+        current (dict): War data
+
+    Returns:
+        bool: True if both are snapshots of the same war
+    """
+    def war_id(war: dict) -> tuple:
+        if war["state"] == "notInWar":
+            return None
+        return (war.get("preparationStartTime"), war["clan"]["tag"], war["opponent"]["tag"])
+
+    return war_id(previous) == war_id(current)
+
+
+def attack_count(war: dict) -> int:
+    if war["state"] == "notInWar":
+        return 0
+    return war["clan"]["attacks"] + war["opponent"]["attacks"]
+
+
+def iter_attacks(war: dict):
+    """Iterate over every attack of a war
+
+    Args:
+        war (dict): War data
+
+    Yields:
+        tuple: ("clan" | "opponent", attack), the side is the one the attacker belongs to
+    """
+    for side in ("clan", "opponent"):
+        for member in war[side]["members"]:
+            for attack in member.get("attacks", []):
+                yield (side, attack)
+
+
+def diff_wars(previous: dict, current: dict, clan_key: str = "clan") -> list:
+    """Compare two consecutive snapshots of a war and list what happened in between:
+    a "state" event when the war state changed and an "attack" event per new attack, in attack order.
+    If nothing changed (same war, state and attack count), no member is looked at at all.
+
+    Args:
+        previous (dict): The earlier war data, None if there is none (then nothing is reported)
+        current (dict): The latest war data
+        clan_key (str, optional): Key of our own clan in the war data, "clan" or "opponent". Defaults to "clan".
+
+    Returns:
+        list: Events, dicts with a "type" key of "state" or "attack"
+    """
+    if previous is None:
+        return []
+
+    new_war = not same_war(previous, current)
+    events = []
+
+    if new_war or previous["state"] != current["state"]:
+        events.append({"type": "state", "from": None if new_war else previous["state"], "to": current["state"]})
+
+    if not new_war and attack_count(previous) == attack_count(current):
+        return events
+    if current["state"] == "notInWar":
+        return events
+
+    # attack order numbers are increasing across the whole war, so new attacks are the ones past the last seen
+    last_order = 0 if new_war else max((attack["order"] for _, attack in iter_attacks(previous)), default=0)
+
+    op_key = "opponent" if clan_key == "clan" else "clan"
+    members = {member["tag"]: member for key in (clan_key, op_key) for member in current[key]["members"]}
+
+    # best stars on each base before an attack, to count the stars it newly won
+    best_stars = {}
+    for side, attack in sorted(iter_attacks(current), key=lambda side_attack: side_attack[1]["order"]):
+        defender = attack["defenderTag"]
+        new_stars = max(attack["stars"] - best_stars.get(defender, 0), 0)
+        best_stars[defender] = max(best_stars.get(defender, 0), attack["stars"])
+
+        if attack["order"] <= last_order:
+            continue
+
+        events.append({"type": "attack",
+                       "ours": side == clan_key,
+                       "attacker": members.get(attack["attackerTag"]),
+                       "defender": members.get(defender),
+                       "attack": attack,
+                       "new_stars": new_stars})
+
+    return events
+
+
+def format_event(event: dict, pretty_name_map: dict) -> str:
+    """Turn an event of diff_wars into a line of the war feed
+
+    Args:
+        event (dict): An event
+        pretty_name_map (dict): The "war" part of assets/pretty_name_map.json
+
+    Returns:
+        str: A displayable line
+    """
+    if event["type"] == "state":
+        return f'War status: {pretty_name_map.get(event["to"], event["to"])}'
+
+    attack = event["attack"]
+    attacker = event["attacker"] or {"name": attack["attackerTag"], "townhallLevel": "?"}
+    defender = event["defender"] or {"name": attack["defenderTag"], "townhallLevel": "?"}
+    direction = "attacked" if event["ours"] else "was attacked by"
+    us, them = (attacker, defender) if event["ours"] else (defender, attacker)
+
+    return (f'{us["name"]} (TH {us["townhallLevel"]}) {direction} {them["name"]} (TH {them["townhallLevel"]}): '
+            f'{attack["stars"]} stars, {attack["destructionPercentage"]}% (+{event["new_stars"]} new stars)')
+
+
+def split_messages(header: str, lines: list, limit: int = DISCORD_MESSAGE_LIMIT) -> list:
+    """Pack lines of the war feed into as few messages as possible, each starting with header and
+    at most limit characters long. A line too long for a message of its own is cut off.
+
+    Args:
+        header (str): First line of every message, ex: the clan tag
+        lines (list): Lines from format_event
+        limit (int, optional): Max characters per message. Defaults to DISCORD_MESSAGE_LIMIT.
+
+    Returns:
+        list: Messages, lines in their original order
+    """
+    messages = []
+    message = header
+    for line in lines:
+        line = line[:limit - len(header) - 1]
+        if len(message) + 1 + len(line) > limit:
+            messages.append(message)
+            message = header
+        message += "\n" + line
+
+    if message != header:
+        messages.append(message)
+    return messages
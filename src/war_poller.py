@@ -0,0 +1,213 @@
+import os
+import time
+import asyncio
+
+import clash_of_clans
+import league
+import war_events
+
+# clans kept warm from start up, comma separated clan tags
+COC_WATCHED_CLANS = [tag.strip() for tag in os.getenv("COC_WATCHED_CLANS", "").split(",") if tag.strip()]
+
+# seconds between polls, by war state. The most active state of a clan's regular and league war wins.
+POLL_INTERVALS = {
+    "inWar": 60,
+    "preparation": 600,
+    "warEnded": 900,
+    "notInWar": 1800,
+}
+# seconds before retrying a clan whose poll failed
+POLL_RETRY_INTERVAL = 300
+# clans registered by commands are dropped after this many seconds without a lookup
+POLL_IDLE_TIMEOUT = 24 * 60 * 60
+# seconds a snapshot answers commands for at most, whatever its poll interval. A war can start or end
+# between two polls of a quiet clan, so commands past this age look the war up themselves
+SNAPSHOT_MAX_AGE = int(os.getenv("WAR_SNAPSHOT_MAX_AGE", 120))
+
+
+class WarSnapshot:
+    """The latest known war state of a clan.
+    """
+    def __init__(self, clantag: str, war: dict, league_group: dict, league_war: tuple) -> None:
+        self.clantag = clantag
+        self.war = war
+        self.league_group = league_group
+        # (war data, "clan" | "opponent"), None outside of CWL or if the league war could not be found
+        self.league_war = league_war
+        self.fetched_at = time.monotonic()
+
+    @property
+    def interval(self) -> int:
+        """Seconds until the clan should be polled again, based on how much is going on
+
+        Returns:
+            int: Seconds
+        """
+        states = [self.war["state"]]
+        if self.league_war is not None:
+            states.append(self.league_war[0]["state"])
+        elif self.league_group is not None:
+            # in CWL, but its war could not be found (yet)
+            states.append(self.league_group["state"])
+
+        return min(POLL_INTERVALS.get(state, POLL_RETRY_INTERVAL) for state in states)
+
+    def is_fresh(self) -> bool:
+        # a snapshot stays usable for one extra interval, in case the poller is running behind,
+        # but never past SNAPSHOT_MAX_AGE
+        return time.monotonic() - self.fetched_at < min(2 * self.interval, SNAPSHOT_MAX_AGE)
+
+
+class WarPoller:
+    """Background task polling the current war and CWL state of registered clans, so war commands
+    can answer from the latest snapshot instead of waiting for the CoC API.
+
+    Clans are polled often during battle day and rarely in preparation or outside of war.
+    Requests are sent with BACKGROUND priority, so slash commands go ahead of them.
+
+    Listeners (coroutine functions taking a clan tag and a list of war_events events) are called
+    with what changed between two consecutive snapshots of a clan, if anything did.
+    """
+    def __init__(self, coc: clash_of_clans.AsyncCoCAPI, index: league.LeagueIndex = None, clans: list = COC_WATCHED_CLANS) -> None:
+        self.coc = coc
+        self.index = index
+        self.snapshots = {}
+        self.listeners = []
+        # clantag -> monotonic time of the last lookup, None for clans that are always watched
+        self._clans = {clantag: None for clantag in clans}
+        self._next_poll = {clantag: 0 for clantag in clans}
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def register(self, clantag: str) -> None:
+        """Keep a clan's war state warm from now on. Clans not looked up for POLL_IDLE_TIMEOUT
+        seconds are dropped again, unless they were registered at start up.
+        Only register clans the CoC API knows, ex: after a successful lookup of their war.
+
+        Args:
+            clantag (str): A CoC clan tag
+        """
+        if clantag not in self._clans:
+            self._next_poll[clantag] = 0
+            self._wakeup.set()
+        elif self._clans[clantag] is None:
+            return
+
+        self._clans[clantag] = time.monotonic()
+
+    def snapshot(self, clantag: str) -> WarSnapshot:
+        """Get the latest snapshot of a clan. Looking up a registered clan keeps it registered,
+        other clans are not registered, since their tag may not even exist (see register)
+
+        Args:
+            clantag (str): A CoC clan tag
+
+        Returns:
+            WarSnapshot: The snapshot, None if there is no fresh one
+        """
+        if clantag in self._clans:
+            self.register(clantag)
+
+        snapshot = self.snapshots.get(clantag)
+        return snapshot if snapshot is not None and snapshot.is_fresh() else None
+
+    async def poll(self, clantag: str) -> WarSnapshot:
+        """Fetch the current war and, during CWL, the league group and league war of a clan
+
+        Args:
+            clantag (str): A CoC clan tag
+
+        Returns:
+            WarSnapshot: The new snapshot
+        """
+        priority = clash_of_clans.BACKGROUND
+        war = await self.coc.current_war(clantag, priority)
+
+        try:
+            league_group = await self.coc.current_league_group(clantag, priority)
+        except clash_of_clans.CoCAPIError as e:
+            # the league group endpoint answers 404 outside of CWL
+            if e.status_code != 404:
+                raise
+            league_group = None
+
+        league_war = None
+        if league_group is not None:
+            try:
+                league_war = await league.find_current_war(self.coc, clantag, league_group, self.index, priority)
+            except Exception as e:
+                # ex: the wars are not drawn yet on the first day of CWL. The regular war is still worth
+                # keeping, the league war is looked up again on the next poll
+                print(f"Finding the league war of {clantag} failed: {e}")
+
+        snapshot = WarSnapshot(clantag, war, league_group, league_war)
+        previous = self.snapshots.get(clantag)
+        self.snapshots[clantag] = snapshot
+
+        if previous is not None and self.listeners:
+            await self._notify(clantag, previous, snapshot)
+
+        return snapshot
+
+    async def _notify(self, clantag: str, previous: WarSnapshot, snapshot: WarSnapshot) -> None:
+        events = war_events.diff_wars(previous.war, snapshot.war)
+        if previous.league_war is not None and snapshot.league_war is not None:
+            events += war_events.diff_wars(previous.league_war[0], snapshot.league_war[0], clan_key=snapshot.league_war[1])
+
+        if not events:
+            return
+
+        for listener in self.listeners:
+            try:
+                await listener(clantag, events)
+            except Exception as e:
+                print(f"War event listener failed for {clantag}: {e}")
+
+    async def _poll_due(self, clantag: str) -> None:
+        try:
+            snapshot = await self.poll(clantag)
+            self._next_poll[clantag] = time.monotonic() + snapshot.interval
+        except Exception as e:
+            print(f"Polling {clantag} failed: {e}")
+            self._next_poll[clantag] = time.monotonic() + POLL_RETRY_INTERVAL
+
+    def _drop_idle_clans(self) -> None:
+        now = time.monotonic()
+        for clantag, last_lookup in list(self._clans.items()):
+            if last_lookup is not None and now - last_lookup > POLL_IDLE_TIMEOUT:
+                del self._clans[clantag]
+                del self._next_poll[clantag]
+                self.snapshots.pop(clantag, None)
+
+    async def run(self) -> None:
+        """Poll every registered clan whenever it is due, forever.
+        """
+        while True:
+            self._drop_idle_clans()
+
+            now = time.monotonic()
+            due = [clantag for clantag, next_poll in self._next_poll.items() if next_poll <= now]
+            await asyncio.gather(*[self._poll_due(clantag) for clantag in due])
+
+            # sleep until the next clan is due, or a new clan is registered
+            self._wakeup.clear()
+            next_poll = min(self._next_poll.values(), default=now + POLL_INTERVALS["notInWar"])
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(next_poll - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        """Start the polling task in the running event loop, if it is not running already.
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,35 @@
+import os
+import sys
+import json
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# the bot's modules import each other as top level modules, like when running src/main.py
+sys.path.insert(0, os.path.join(TESTS_DIR, "..", "src"))
+# keep the caches of bot_util out of the repository
+os.environ.setdefault("TAG_CACHE_PATH", ":memory:")
+
+
+def load_fixture(name: str) -> dict:
+    with open(os.path.join(TESTS_DIR, name)) as jsonf:
+        return json.load(jsonf)
+
+
+@pytest.fixture(scope="session")
+def player() -> dict:
+    """A TH 14 player, as returned by CoCAPI.player"""
+    return load_fixture("player.json")
+
+
+@pytest.fixture(scope="session")
+def league_war() -> dict:
+    """A finished CWL war, as returned by CoCAPI.CWL_war"""
+    return load_fixture("leaguewar.json")
+
+
+@pytest.fixture(scope="session")
+def league_group() -> dict:
+    """A CWL league group, as returned by CoCAPI.current_league_group"""
+    return load_fixture("leaguegroup.json")
@@ -0,0 +1,132 @@
+"""A local stand-in for the CoC API, serving the fixtures in tests/ with configurable latency and throttling.
+
+    python tests/fake_coc_api.py --port 8089 --latency 0.2 --throttle 0.05
+
+then point the bot at it with COC_API_BASE_URL=http://127.0.0.1:8089 (any COC_API_TOKEN works).
+"""
+import os
+import json
+import random
+import asyncio
+import argparse
+
+from aiohttp import web
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_fixture(name: str) -> dict:
+    with open(os.path.join(TESTS_DIR, name)) as jsonf:
+        return json.load(jsonf)
+
+
+class FakeCoCAPI:
+    """Serves every player as the player fixture, every war (regular or CWL) as the league war fixture
+    and every league group as the league group fixture, under the requested tags.
+
+    Each response is delayed by latency +- jitter seconds, and throttle is the share of requests
+    answered with 429, like the real API does when a token goes over its limit.
+    """
+    def __init__(self, latency: float = 0.1, jitter: float = 0.05, throttle: float = 0.0, max_age: int = 0, seed: int = None) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle = throttle
+        # the real API caches most responses for a while, 0 makes every command reach the server
+        self.max_age = max_age
+        self.random = random.Random(seed)
+        # path -> number of requests, including throttled ones
+        self.requests = {}
+        self.throttled = 0
+
+        self.player = load_fixture("player.json")
+        self.league_war = load_fixture("leaguewar.json")
+        self.league_group = load_fixture("leaguegroup.json")
+        # a regular war looks like a league war plus the attacks per member
+        self.war = dict(self.league_war, attacksPerMember=2)
+
+        self.app = web.Application(middlewares=[self.simulate])
+        self.app.add_routes([
+            web.get("/players/{tag}", self.get_player),
+            web.get("/clans/{tag}", self.get_clan),
+            web.get("/clans/{tag}/currentwar", self.get_current_war),
+            web.get("/clans/{tag}/currentwar/leaguegroup", self.get_league_group),
+            web.get("/clanwarleagues/wars/{tag}", self.get_league_war),
+        ])
+        self._runner = None
+
+    @web.middleware
+    async def simulate(self, request: web.Request, handler):
+        self.requests[request.path] = self.requests.get(request.path, 0) + 1
+        await asyncio.sleep(max(self.latency + self.random.uniform(-self.jitter, self.jitter), 0))
+
+        if self.random.random() < self.throttle:
+            self.throttled += 1
+            return web.json_response({"reason": "requestThrottled"}, status=429)
+
+        response = await handler(request)
+        response.headers["Cache-Control"] = f"public max-age={self.max_age}"
+        return response
+
+    def clan_members(self, clantag: str) -> list:
+        clans = {clan["tag"]: clan for clan in self.league_group["clans"]}
+        clan = clans.get(clantag, self.league_group["clans"][0])
+        return clan["members"]
+
+    async def get_player(self, request: web.Request) -> web.Response:
+        tag = request.match_info["tag"]
+        members = {member["tag"]: member for member in self.league_group["clans"][0]["members"]}
+        name = members[tag]["name"] if tag in members else self.player["name"]
+        return web.json_response(dict(self.player, tag=tag, name=name))
+
+    async def get_clan(self, request: web.Request) -> web.Response:
+        tag = request.match_info["tag"]
+        members = [{"tag": member["tag"], "name": member["name"], "townHallLevel": member["townHallLevel"]}
+                   for member in self.clan_members(tag)]
+        return web.json_response({"tag": tag, "name": "Fake clan", "members": len(members), "memberList": members})
+
+    async def get_current_war(self, request: web.Request) -> web.Response:
+        return web.json_response(self.war)
+
+    async def get_league_group(self, request: web.Request) -> web.Response:
+        # like outside of CWL
+        if self.league_group is None:
+            return web.json_response({"reason": "notFound"}, status=404)
+        return web.json_response(self.league_group)
+
+    async def get_league_war(self, request: web.Request) -> web.Response:
+        return web.json_response(self.league_war)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving in the running event loop
+
+        Args:
+            host (str, optional): Interface to listen on. Defaults to "127.0.0.1".
+            port (int, optional): Port to listen on. Defaults to 0, any free port.
+
+        Returns:
+            str: The base url to pass as COC_API_BASE_URL, with the port actually bound
+        """
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        port = self._runner.addresses[0][1]
+        return f"http://{host}:{port}"
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.1, help="mean response time in seconds")
+    parser.add_argument("--jitter", type=float, default=0.05, help="max deviation from the mean response time in seconds")
+    parser.add_argument("--throttle", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--max-age", type=int, default=0, help="max-age of the Cache-Control header of responses")
+    args = parser.parse_args()
+
+    api = FakeCoCAPI(args.latency, args.jitter, args.throttle, args.max_age)
+    web.run_app(api.app, host=args.host, port=args.port)
@@ -0,0 +1,180 @@
+"""Load test of the slash commands of main.py, without Discord or the real CoC API.
+
+Starts the fake CoC API of fake_coc_api.py, points the bot at it and calls the command coroutines with
+fake contexts, keeping a number of invocations in flight at once. Reports throughput and latency percentiles.
+
+    python tests/load_harness.py --command player_progress --concurrency 20 --requests 200 --latency 0.2 --throttle 0.05
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+
+import numpy as np
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TESTS_DIR, "..", "src"))
+
+from fake_coc_api import FakeCoCAPI
+
+PLAYER_TAG = "#9C2PVQ8LJ"
+CLAN_TAG = "#2G2GRVR09"
+
+# command name -> (function in main.py, options it is invoked with)
+COMMANDS = {
+    "player_progress": ("coc_player_progress", {"playertag": PLAYER_TAG, "th_level": None}),
+    "player_progress_heroes": ("coc_player_progress_heroes", {"playertag": PLAYER_TAG, "th_level": None}),
+    "player_progress_troops": ("coc_player_progress_troops", {"playertag": PLAYER_TAG, "th_level": None}),
+    "player_progress_spells": ("coc_player_progress_spells", {"playertag": PLAYER_TAG, "th_level": None}),
+    "player_progress_since": ("coc_player_progress_since", {"playertag": PLAYER_TAG, "days": 7}),
+    "clan_progress": ("coc_clan_progress", {"playertag": None, "clantag": CLAN_TAG}),
+    "th_unlocks": ("coc_th_unlocks", {"th_level": 14}),
+    "current_war": ("current_war", {"playertag": None, "clantag": CLAN_TAG}),
+    "current_league_war": ("current_league_war", {"playertag": None, "clantag": CLAN_TAG}),
+}
+
+
+class FakeAuthor:
+    def __init__(self, display_name: str) -> None:
+        self.display_name = display_name
+
+
+class FakeContext:
+    """Stands in for discord's ApplicationContext, recording responses instead of sending them.
+    """
+    def __init__(self) -> None:
+        self.author = FakeAuthor(f"Load tester ({PLAYER_TAG})")
+        self.responses = []
+
+    async def defer(self) -> None:
+        pass
+
+    async def respond(self, content=None, file=None) -> None:
+        self.responses.append((content, file))
+
+    @property
+    def failed(self) -> bool:
+        # commands respond with the exception itself when something went wrong
+        return not self.responses or any(isinstance(content, Exception) for content, _ in self.responses)
+
+
+async def invoke(command, options: dict) -> tuple:
+    """Run a command once
+
+    Returns:
+        tuple: Seconds it took, and whether it succeeded
+    """
+    ctx = FakeContext()
+    start = time.perf_counter()
+    try:
+        await command.callback(ctx, **options)
+        succeeded = not ctx.failed
+    except Exception:
+        succeeded = False
+
+    return time.perf_counter() - start, succeeded
+
+
+async def run_load(command, options: dict, concurrency: int, requests: int, player_tags: list = None) -> tuple:
+    """Run a command requests times, with up to concurrency invocations at once
+
+    Args:
+        player_tags (list, optional): Player tags the invocations passing a playertag take turns with,
+            so they are not all answered by one coalesced or cached API request. Defaults to None, keep the tag.
+
+    Returns:
+        tuple: Total seconds, and (seconds, succeeded) per invocation
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(i: int):
+        invocation_options = options
+        if player_tags and options.get("playertag"):
+            invocation_options = dict(options, playertag=player_tags[i % len(player_tags)])
+
+        async with semaphore:
+            return await invoke(command, invocation_options)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[limited(i) for i in range(requests)])
+    return time.perf_counter() - start, results
+
+
+def report(name: str, concurrency: int, elapsed: float, results: list, api: FakeCoCAPI) -> str:
+    latencies = np.array([latency for latency, _ in results]) * 1000
+    failures = sum(not succeeded for _, succeeded in results)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+
+    return (f"{name}: {len(results)} invocations, {concurrency} concurrent, {failures} failed\n"
+            f"  throughput {len(results) / elapsed:.1f}/s, latency p50 {p50:.0f} ms, p95 {p95:.0f} ms, p99 {p99:.0f} ms\n"
+            f"  CoC API: {sum(api.requests.values())} requests, {api.throttled} throttled")
+
+
+async def main(args) -> int:
+    api = FakeCoCAPI(latency=args.latency, jitter=args.jitter, throttle=args.throttle, max_age=args.max_age, seed=0)
+    base_url = await api.start(port=args.port)
+
+    # point the bot at the fake API, before main.py is imported
+    os.environ.update({
+        "COC_API_BASE_URL": base_url,
+        "COC_API_BASE_URLS": base_url,
+        "COC_API_TOKEN": "load-test",
+        "COC_API_TOKENS": "load-test",
+    })
+    # imported only now, main.py connects nothing on import but reads the environment set up above
+    import main as bot
+    bot.setup()
+
+    # every member of the league group fixture, the fake API serves them all
+    player_tags = None if args.same_tag else [member["tag"] for clan in api.league_group["clans"] for member in clan["members"]]
+
+    failures = 0
+    try:
+        for name in args.command:
+            function, options = COMMANDS[name]
+            command = getattr(bot, function)
+
+            # one untimed run, so first use costs (render workers, static data) are not measured
+            await invoke(command, options)
+            api.requests.clear()
+            api.throttled = 0
+            bot.metrics.clear()
+
+            elapsed, results = await run_load(command, options, args.concurrency, args.requests, player_tags)
+            failures += sum(not succeeded for _, succeeded in results)
+            print(report(name, args.concurrency, elapsed, results, api))
+            if args.stages:
+                print(bot.metrics.summary())
+    finally:
+        await bot.coc.aclose()
+        bot.bot_util.shutdown_render_pool()
+        await api.stop()
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--command", nargs="+", choices=list(COMMANDS), default=["player_progress"])
+    parser.add_argument("--concurrency", type=int, default=10, help="invocations in flight at once")
+    parser.add_argument("--requests", type=int, default=100, help="invocations per command")
+    parser.add_argument("--same-tag", action="store_true", help="look up the same player in every invocation")
+    parser.add_argument("--stages", action="store_true", help="print the latency of each stage and CoC API endpoint")
+    parser.add_argument("--port", type=int, default=8089, help="port of the fake CoC API, 0 for any free port")
+    parser.add_argument("--latency", type=float, default=0.1, help="mean response time of the fake CoC API in seconds")
+    parser.add_argument("--jitter", type=float, default=0.05, help="max deviation from the mean response time in seconds")
+    parser.add_argument("--throttle", type=float, default=0.0, help="share of CoC API requests answered with 429")
+    parser.add_argument("--max-age", type=int, default=0, help="how long the bot may cache CoC API responses")
+    args = parser.parse_args()
+
+    # keep the bot's SQLite files out of the repository
+    storage = tempfile.mkdtemp(prefix="coc_load_test_")
+    os.environ.update({
+        "TAG_CACHE_PATH": os.path.join(storage, "tag_cache.sqlite3"),
+        "LEAGUE_INDEX_PATH": os.path.join(storage, "league_index.sqlite3"),
+        "PLAYER_HISTORY_PATH": os.path.join(storage, "player_history.sqlite3"),
+    })
+
+    sys.exit(asyncio.run(main(args)))
@@ -0,0 +1,135 @@
+"""Benchmarks of the per request CPU work of the bot's commands, run with pytest-benchmark.
+
+Record a baseline, and compare against it after a change:
+
+    pytest tests --benchmark-storage=tests/benchmarks --benchmark-save=baseline
+    pytest tests --benchmark-storage=tests/benchmarks --benchmark-compare --benchmark-compare-fail=mean:25%
+"""
+import copy
+import asyncio
+
+import pytest
+
+import bot_util
+import render
+import render_cache
+import progress
+import war_events
+from hero import Hero
+from troop import Troop
+from spell import Spell
+from unit import Unit
+from static_data import registry
+
+COLUMNS = ["Name", "Level", "Time", "Elixir", "Dark Elixir", "Gold"]
+
+
+@pytest.fixture(scope="module", autouse=True)
+def preload():
+    # like at bot start up, so loading the assets is not part of any benchmark
+    registry.preload()
+
+
+@pytest.fixture(scope="module")
+def troops(player) -> list:
+    return Troop.create_troop_objects(player=player)
+
+
+@pytest.fixture(scope="module")
+def troop_rows(troops, player) -> list:
+    rows = progress.progress_rows([unit.name for unit in troops], progress.unit_progress(troops, player["townHallLevel"]), total="Total")
+    return Unit.display_units(units=rows, unit_order=[*registry.unit_groups["home_troops"], "Total"])
+
+
+def war_before_last_attacks(war: dict, attacks: int) -> dict:
+    """The war, as it was before its last few attacks"""
+    orders = sorted(attack["order"] for _, attack in war_events.iter_attacks(war))
+    last_order = orders[-attacks - 1]
+
+    previous = copy.deepcopy(war)
+    for side in ("clan", "opponent"):
+        for member in previous[side]["members"]:
+            if "attacks" in member:
+                member["attacks"] = [attack for attack in member["attacks"] if attack["order"] <= last_order]
+        previous[side]["attacks"] = sum(len(member.get("attacks", [])) for member in previous[side]["members"])
+
+    return previous
+
+
+def test_create_hero_objects(benchmark, player):
+    heroes = benchmark(Hero.create_hero_objects, player=player)
+    assert len(heroes) == len(registry.unit_groups["home_heroes"])
+
+
+def test_create_troop_objects(benchmark, player):
+    troops = benchmark(Troop.create_troop_objects, player=player)
+    assert len(troops) == len(registry.unit_groups["home_troops"])
+
+
+def test_create_spell_objects(benchmark, player):
+    spells = benchmark(Spell.create_spell_objects, player=player)
+    assert len(spells) == len(registry.unit_groups["spells"])
+
+
+def test_list_display_attributes(benchmark, troops, player):
+    attributes = benchmark(Unit.list_display_attributes, troops, th_level=player["townHallLevel"])
+    assert len(attributes) == len(troops)
+
+
+def test_sum_dict_list_columns(benchmark, troops, player):
+    attributes = Unit.list_display_attributes(troops, th_level=player["townHallLevel"])
+    total = benchmark(bot_util.sum_dict_list_columns, attributes, [0], ["Total"], int)
+    assert total["name"] == "Total"
+
+
+def test_unit_progress(benchmark, troops, player):
+    rows = benchmark(progress.unit_progress, troops, player["townHallLevel"])
+    assert rows.shape == (len(troops), len(progress.PROGRESS_COLUMNS))
+
+
+def test_category_progress(benchmark, player):
+    categories = [Hero.create_hero_objects(player=player),
+                  Troop.create_troop_objects(player=player),
+                  Spell.create_spell_objects(player=player)]
+    sums = benchmark(progress.category_progress, categories, player["townHallLevel"])
+    assert sums.shape == (3, len(progress.PROGRESS_COLUMNS))
+
+
+def test_display_units(benchmark, troops, player):
+    rows = progress.progress_rows([unit.name for unit in troops], progress.unit_progress(troops, player["townHallLevel"]), total="Total")
+    displayed = benchmark(Unit.display_units, units=rows, unit_order=[*registry.unit_groups["home_troops"], "Total"])
+    assert None not in displayed
+
+
+def test_plot_table(benchmark, troop_rows):
+    # a render takes long enough that a few rounds give a stable number
+    png = benchmark.pedantic(render.plot_table, args=(troop_rows, COLUMNS, None, "Benchmark"), rounds=5, warmup_rounds=1)
+    assert png.startswith(b"\x89PNG")
+
+
+def test_render_table_cached(benchmark, troop_rows, monkeypatch, tmp_path):
+    # a cache of its own, so nothing is left behind in the bot's cache for later tests
+    monkeypatch.setattr(bot_util, "table_cache", render_cache.RenderCache(directory=str(tmp_path)))
+    # the table is already cached, so no render (and no render worker) is involved
+    bot_util.table_cache.put(render_cache.render_key(troop_rows, COLUMNS, "Benchmark"), b"\x89PNG cached")
+    buffer = benchmark(lambda: asyncio.run(bot_util.render_table(troop_rows, COLUMNS, "Benchmark")))
+    assert buffer.getvalue() == b"\x89PNG cached"
+
+
+def test_format_war_status(benchmark, league_war):
+    status = benchmark(bot_util.format_war_status, league_war, "clan", attacks_per_member=1)
+    assert league_war["clan"]["name"] in status
+
+
+def test_diff_wars(benchmark, league_war):
+    previous = war_before_last_attacks(league_war, attacks=5)
+    events = benchmark(war_events.diff_wars, previous, league_war)
+    assert len([event for event in events if event["type"] == "attack"]) == 5
+
+
+def test_format_events(benchmark, league_war):
+    events = war_events.diff_wars(war_before_last_attacks(league_war, attacks=5), league_war)
+    pretty_name_map = registry.pretty_name_map["war"]
+
+    lines = benchmark(lambda: [war_events.format_event(event, pretty_name_map) for event in events])
+    assert len(lines) == len(events)
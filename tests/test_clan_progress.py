@@ -0,0 +1,107 @@
+import re
+import asyncio
+
+from aiohttp import web
+
+import main
+import bot_util
+from clash_of_clans import AsyncCoCAPI
+from fake_coc_api import FakeCoCAPI
+from load_harness import FakeContext
+from player_history import PlayerHistory
+from hero import Hero
+from troop import Troop
+from spell import Spell
+from unit import Unit
+
+CLAN_TAG = "#2G2GRVR09"
+
+
+class ClanAPI(FakeCoCAPI):
+    """Serves the player fixture at a different town hall level per member, and 404 for the missing members"""
+    def __init__(self, th_levels: list, missing: int = 0) -> None:
+        super().__init__(latency=0, jitter=0, seed=0)
+        members = self.clan_members(CLAN_TAG)
+        self.th_levels = {member["tag"]: th_level for member, th_level in zip(members, th_levels)}
+        self.missing = {member["tag"] for member in members[:missing]}
+
+    async def get_player(self, request: web.Request) -> web.Response:
+        tag = request.match_info["tag"]
+        if tag in self.missing:
+            return web.json_response({"reason": "notFound"}, status=404)
+
+        player = dict(self.player, tag=tag, name=f"Member {tag}", townHallLevel=self.th_levels.get(tag, 14))
+        return web.json_response(player)
+
+
+def time_done(player: dict) -> float:
+    """Share of the upgrade time towards maxing the player's TH already done, computed unit by unit"""
+    units = [*Hero.create_hero_objects(player=player), *Troop.create_troop_objects(player=player),
+             *Spell.create_spell_objects(player=player)]
+    rows = Unit.list_display_attributes(units, th_level=player["townHallLevel"])
+    remaining, total = sum(row["remaining_time"] for row in rows), sum(row["max_time"] for row in rows)
+    return 1 - remaining / max(total, 1)
+
+
+def run_clan_progress(monkeypatch, api: ClanAPI) -> tuple:
+    """Run /clan_progress against api, returning the context and the rows and title the table was rendered with"""
+    rendered = {}
+
+    async def render_table(rows: list, columns: list, title: str):
+        rendered.update(rows=rows, title=title)
+        return None
+
+    monkeypatch.setattr(bot_util, "render_table", render_table)
+    monkeypatch.setattr(main.discord, "File", lambda fp, filename: filename)
+    monkeypatch.setattr(main, "history", PlayerHistory(":memory:"))
+
+    async def run():
+        base_url = await api.start()
+        coc = AsyncCoCAPI(base_urls=[base_url], tokens=["test"])
+        monkeypatch.setattr(main, "coc", coc)
+
+        ctx = FakeContext()
+        try:
+            await main.coc_clan_progress.callback(ctx, playertag=None, clantag=CLAN_TAG)
+        finally:
+            await coc.aclose()
+            await api.stop()
+        return ctx
+
+    ctx = asyncio.run(run())
+    main.history.close()
+    return ctx, rendered["rows"], rendered["title"]
+
+
+def test_members_ranked_most_maxed_first(monkeypatch):
+    th_levels = [14, 10, 15, 12, 9, 13, 11, 15]
+    api = ClanAPI(th_levels)
+
+    ctx, rows, title = run_clan_progress(monkeypatch, api)
+
+    assert not ctx.failed and ctx.responses[0][0] == title
+    assert "could not be fetched" not in title
+
+    names = [row[0] for row in rows]
+    assert names[-1] == "Total"
+    members = names[:-1]
+    assert len(members) == len(api.clan_members(CLAN_TAG))
+    assert [int(re.match(r"(\d+)\. ", name).group(1)) for name in members] == list(range(1, len(members) + 1))
+
+    # the TH level each row is for, read back from its name
+    ranked_th_levels = [int(re.search(r"\(TH (\d+)\)$", name).group(1)) for name in members]
+    done = [time_done(dict(api.player, townHallLevel=th_level)) for th_level in ranked_th_levels]
+    assert done == sorted(done, reverse=True)
+    # the same player is fully maxed at a low TH, and far from it at the highest
+    assert ranked_th_levels[0] == min(th_levels) and ranked_th_levels[-1] == max(th_levels)
+
+
+def test_members_that_could_not_be_fetched_are_left_out(monkeypatch):
+    api = ClanAPI([14] * 8, missing=2)
+
+    ctx, rows, title = run_clan_progress(monkeypatch, api)
+
+    assert not ctx.failed
+    assert title.endswith("(2 members could not be fetched)")
+    assert len(rows) == len(api.clan_members(CLAN_TAG)) - 2 + 1
+    assert not any(tag in row[0] for tag in api.missing for row in rows)
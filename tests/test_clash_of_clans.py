@@ -0,0 +1,410 @@
+import time
+import asyncio
+
+import httpx
+import pytest
+
+import clash_of_clans
+from clash_of_clans import AsyncCoCAPI, ResponseCache, RequestScheduler, TokenBucket, CoCAPIError, INTERACTIVE, BACKGROUND
+
+BASE_URL = "http://coc.test/v1"
+
+
+def make_api(handler, tokens: list = ["token"]) -> AsyncCoCAPI:
+    """A client whose requests are answered by handler instead of the CoC API"""
+    api = AsyncCoCAPI(base_urls=[BASE_URL], tokens=tokens)
+    api._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return api
+
+
+def headers(**values) -> httpx.Headers:
+    return httpx.Headers({name.replace("_", "-"): value for name, value in values.items()})
+
+
+def test_max_age_subtracts_age():
+    assert ResponseCache.max_age(headers(cache_control="public max-age=600", age="100")) == 500
+    assert ResponseCache.max_age(headers(cache_control="public max-age=600", age="700")) == 0
+    assert ResponseCache.max_age(headers(cache_control="public max-age=600", age="soon")) == 600
+    assert ResponseCache.max_age(headers()) == 0
+
+
+def test_max_age_no_store_and_no_cache():
+    assert ResponseCache.max_age(headers(cache_control="no-store, max-age=600")) == 0
+    assert ResponseCache.max_age(headers(cache_control="no-cache, max-age=600")) == 0
+
+
+def test_store_skips_unusable_responses():
+    cache = ResponseCache(max_bytes=1000)
+
+    cache.store("/no-store", {}, headers(cache_control="no-store", etag='"a"'), 10)
+    cache.store("/no-validator", {}, headers(cache_control="max-age=0"), 10)
+    cache.store("/too-large", {}, headers(cache_control="max-age=60"), 1001)
+    assert len(cache) == 0
+
+    # stale right away, but the ETag makes it worth keeping for a conditional request
+    cache.store("/etag", {"a": 1}, headers(cache_control="max-age=0", etag='"a"'), 10)
+    entry = cache.get("/etag")
+    assert entry.data == {"a": 1} and entry.etag == '"a"' and not entry.is_fresh()
+
+
+def test_lru_eviction_by_size():
+    cache = ResponseCache(max_bytes=100)
+    fresh = headers(cache_control="max-age=60")
+
+    cache.store("/a", "a", fresh, 40)
+    cache.store("/b", "b", fresh, 40)
+    # /a was used last, so /b is the least recently used once /c comes in
+    cache.get("/a")
+    cache.store("/c", "c", fresh, 40)
+
+    assert cache.get("/b") is None
+    assert cache.get("/a").data == "a" and cache.get("/c").data == "c"
+    assert cache.size == 80
+
+
+def test_revalidate_reinserts_evicted_entry():
+    cache = ResponseCache(max_bytes=100)
+    cache.store("/a", "a", headers(cache_control="max-age=0", etag='"1"'), 40)
+    entry = cache.get("/a")
+
+    # evicted while the conditional request was in flight
+    cache.discard("/a")
+    renewed = cache.revalidate("/a", entry, headers(cache_control="max-age=60", etag='"2"'))
+
+    assert cache.get("/a") is renewed and renewed.is_fresh()
+    assert renewed.etag == '"2"' and cache.size == 40
+
+
+def test_etag_revalidation_with_304():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304, headers={"cache-control": "max-age=60", "etag": '"v1"'})
+        return httpx.Response(200, json={"tag": "#9C2PVQ8LJ"}, headers={"cache-control": "max-age=0", "etag": '"v1"'})
+
+    async def lookups():
+        api = make_api(handler)
+        first = await api.player("#9C2PVQ8LJ")
+        # stale, so revalidated with the ETag and renewed by the 304
+        second = await api.player("#9C2PVQ8LJ")
+        # fresh now, so served without a request
+        third = await api.player("#9C2PVQ8LJ")
+        await api.aclose()
+        return first, second, third
+
+    first, second, third = asyncio.run(lookups())
+
+    assert first == second == third == {"tag": "#9C2PVQ8LJ"}
+    assert len(requests) == 2
+    assert "if-none-match" not in requests[0].headers
+    assert requests[1].headers["if-none-match"] == '"v1"'
+
+
+class CountingBucket(TokenBucket):
+    """A token bucket counting the tokens it hands out"""
+    def __init__(self, rate: float, capacity: int) -> None:
+        super().__init__(rate, capacity)
+        self.granted = 0
+
+    def try_acquire(self) -> float:
+        wait = super().try_acquire()
+        if wait == 0:
+            self.granted += 1
+        return wait
+
+
+@pytest.fixture
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(clash_of_clans, "COC_API_BACKOFF", 0.01)
+    monkeypatch.setattr(clash_of_clans, "COC_API_RETRIES", 2)
+
+
+def test_interactive_served_before_queued_background():
+    async def serve_order() -> list:
+        scheduler = RequestScheduler(TokenBucket(rate=100, capacity=1))
+        # uses up the burst, so everything after has to queue
+        await scheduler.acquire(BACKGROUND)
+
+        order = []
+        async def request(name: str, priority: int):
+            await scheduler.acquire(priority)
+            order.append(name)
+
+        await asyncio.gather(request("background 1", BACKGROUND), request("background 2", BACKGROUND),
+                             request("interactive", INTERACTIVE))
+        return order
+
+    assert asyncio.run(serve_order()) == ["interactive", "background 1", "background 2"]
+
+
+def test_cancelled_waiter_uses_no_token():
+    async def serve() -> tuple:
+        bucket = CountingBucket(rate=50, capacity=1)
+        scheduler = RequestScheduler(bucket)
+        await scheduler.acquire()
+
+        cancelled = asyncio.create_task(scheduler.acquire())
+        waiting = asyncio.create_task(scheduler.acquire())
+        await asyncio.sleep(0)
+        cancelled.cancel()
+
+        await waiting
+        return bucket.granted, len(scheduler), cancelled.cancelled()
+
+    # the first acquire and the one that kept waiting, nothing for the cancelled one
+    assert asyncio.run(serve()) == (2, 0, True)
+
+
+def test_throttled_requests_retried_then_raised(fast_backoff):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(429, json={"reason": "requestThrottled"})
+
+    async def lookup():
+        api = make_api(handler)
+        try:
+            await api.player("#9C2PVQ8LJ")
+        finally:
+            await api.aclose()
+
+    with pytest.raises(CoCAPIError) as error:
+        asyncio.run(lookup())
+
+    assert error.value.status_code == 429
+    assert len(requests) == clash_of_clans.COC_API_RETRIES + 1
+
+
+def test_transport_errors_retried_with_backoff(fast_backoff):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if len(requests) <= 2:
+            raise httpx.ConnectError("unreachable", request=request)
+        return httpx.Response(200, json={"tag": "#9C2PVQ8LJ"})
+
+    async def lookup():
+        api = make_api(handler)
+        start = time.perf_counter()
+        player = await api.player("#9C2PVQ8LJ")
+        await api.aclose()
+        return player, time.perf_counter() - start
+
+    player, elapsed = asyncio.run(lookup())
+
+    assert player == {"tag": "#9C2PVQ8LJ"} and len(requests) == 3
+    # backoff of 0.01 s after the first failure and 0.02 s after the second
+    assert elapsed >= 0.03
+
+
+def test_transport_errors_raised_after_retries(fast_backoff):
+    def handler(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("unreachable", request=request)
+
+    async def lookup():
+        api = make_api(handler)
+        try:
+            await api.player("#9C2PVQ8LJ")
+        finally:
+            await api.aclose()
+
+    with pytest.raises(CoCAPIError) as error:
+        asyncio.run(lookup())
+    assert error.value.status_code == 0
+
+
+def test_rejected_key_fails_over(fast_backoff):
+    tokens = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        token = request.headers["authorization"].removeprefix("Bearer ")
+        tokens.append(token)
+        if token == "wrong-ip":
+            return httpx.Response(403, json={"reason": "accessDenied.invalidIp",
+                                             "message": "Invalid authorization: API key does not allow access from IP 1.2.3.4"})
+        return httpx.Response(200, json={"tag": "#9C2PVQ8LJ"})
+
+    async def lookup():
+        api = make_api(handler, tokens=["wrong-ip", "valid"])
+        player = await api.player("#9C2PVQ8LJ")
+        await api.aclose()
+        return api, player
+
+    api, player = asyncio.run(lookup())
+
+    assert player == {"tag": "#9C2PVQ8LJ"}
+    assert tokens == ["wrong-ip", "valid"]
+    assert not api.keys[0].is_healthy() and api.keys[1].is_healthy()
+
+
+def test_revoked_key_raises_after_retries(fast_backoff):
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(403, json={"reason": "accessDenied", "message": "Invalid authorization"})
+
+    async def lookup():
+        api = make_api(handler)
+        try:
+            await api.player("#9C2PVQ8LJ")
+        finally:
+            await api.aclose()
+
+    with pytest.raises(CoCAPIError, match="rejected the bot's token"):
+        asyncio.run(lookup())
+
+
+def test_private_war_log_is_not_a_key_failure():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(403, json={"reason": "accessDenied", "message": "Access denied, clan war log is private."})
+
+    api = make_api(handler)
+
+    async def lookup():
+        try:
+            await api.current_war("#2G2GRVR09")
+        finally:
+            await api.aclose()
+
+    with pytest.raises(CoCAPIError, match="clantag may not exist") as error:
+        asyncio.run(lookup())
+
+    assert error.value.status_code == 403 and len(requests) == 1
+    assert api.keys[0].is_healthy()
+
+
+def test_concurrent_lookups_share_one_request():
+    requests = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json={"tag": "#9C2PVQ8LJ"})
+
+    async def lookups():
+        api = make_api(handler)
+        players = await asyncio.gather(*[api.player("#9C2PVQ8LJ") for _ in range(5)])
+        await api.aclose()
+        return players
+
+    players = asyncio.run(lookups())
+
+    assert len(requests) == 1
+    assert all(player is players[0] for player in players)
+
+
+def test_concurrent_lookups_share_the_error():
+    requests = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        await asyncio.sleep(0.01)
+        return httpx.Response(404, json={"reason": "notFound"})
+
+    async def lookups():
+        api = make_api(handler)
+        results = await asyncio.gather(*[api.player("#9C2PVQ8LJ") for _ in range(5)], return_exceptions=True)
+        await api.aclose()
+        return results
+
+    errors = asyncio.run(lookups())
+
+    assert len(requests) == 1
+    assert isinstance(errors[0], CoCAPIError) and errors[0].status_code == 404
+    assert all(error is errors[0] for error in errors)
+
+
+def test_interactive_lookup_does_not_join_background_request():
+    requests = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json={"tag": "#2G2GRVR09"})
+
+    async def lookups():
+        api = make_api(handler)
+        background = asyncio.create_task(api.current_war("#2G2GRVR09", BACKGROUND))
+        await asyncio.sleep(0)
+        # the first interactive lookup sends its own request, the second joins it
+        wars = await asyncio.gather(api.current_war("#2G2GRVR09", INTERACTIVE), api.current_war("#2G2GRVR09", INTERACTIVE),
+                                    background)
+        await api.aclose()
+        return wars
+
+    wars = asyncio.run(lookups())
+
+    assert len(requests) == 2
+    assert wars[0] is wars[1] and wars[2] == wars[0]
+
+
+def test_errors_carry_the_endpoint():
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(404, json={"reason": "notFound"})
+
+    async def lookup():
+        api = make_api(handler)
+        try:
+            await api.current_league_group("#2G2GRVR09")
+        finally:
+            await api.aclose()
+
+    with pytest.raises(CoCAPIError) as error:
+        asyncio.run(lookup())
+    assert error.value.status_code == 404 and error.value.endpoint == "/clans/{tag}/currentwar/leaguegroup"
+
+
+def test_long_retry_after_fails_right_away(fast_backoff):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(429, json={"reason": "requestThrottled"}, headers={"retry-after": "3600"})
+
+    async def lookup():
+        api = make_api(handler)
+        start = time.perf_counter()
+        try:
+            await api.player("#9C2PVQ8LJ")
+        finally:
+            await api.aclose()
+            elapsed.append(time.perf_counter() - start)
+
+    elapsed = []
+    with pytest.raises(CoCAPIError) as error:
+        asyncio.run(lookup())
+
+    assert error.value.status_code == 429
+    assert len(requests) == 1 and elapsed[0] < 1
+
+
+def test_backoff_capped(fast_backoff, monkeypatch):
+    monkeypatch.setattr(clash_of_clans, "COC_API_BACKOFF", 60)
+    monkeypatch.setattr(clash_of_clans, "COC_API_MAX_COOLDOWN", 0.01)
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if len(requests) == 1:
+            return httpx.Response(503, json={"reason": "inMaintenance"}, headers={"retry-after": "0"})
+        if len(requests) == 2:
+            raise httpx.ConnectError("unreachable", request=request)
+        return httpx.Response(200, json={"tag": "#9C2PVQ8LJ"})
+
+    async def lookup():
+        api = make_api(handler)
+        start = time.perf_counter()
+        player = await api.player("#9C2PVQ8LJ")
+        await api.aclose()
+        return player, time.perf_counter() - start
+
+    player, elapsed = asyncio.run(lookup())
+
+    assert player == {"tag": "#9C2PVQ8LJ"} and len(requests) == 3
+    # the exponential backoff after the transport error would be a minute without the cap
+    assert elapsed < 1
@@ -0,0 +1,112 @@
+import copy
+import asyncio
+
+import pytest
+
+import league
+
+
+class FakeCoC:
+    """Answers CWL_war like the CoC API would for the league group fixture: in every round, the clan at
+    position i of the group fights the clan at position 7 - i, in the war with the round's i-th war tag.
+    Wars of the last drawn round are ongoing, earlier ones have ended.
+    """
+    def __init__(self, group: dict, war: dict) -> None:
+        self.requests = []
+        self.wars = {}
+
+        clantags = [clan["tag"] for clan in group["clans"]]
+        drawn = [round for round in group["rounds"] if round["warTags"][0] != "#0"]
+        for n, round in enumerate(drawn):
+            for i, wartag in enumerate(round["warTags"][:len(clantags) // 2]):
+                self.wars[wartag] = dict(copy.deepcopy(war),
+                                         state="inWar" if n == len(drawn) - 1 else "warEnded",
+                                         clan=dict(war["clan"], tag=clantags[i]),
+                                         opponent=dict(war["opponent"], tag=clantags[-1 - i]))
+
+    async def CWL_war(self, wartag: str, priority: int = 0) -> dict:
+        self.requests.append(wartag)
+        return self.wars[wartag]
+
+
+@pytest.fixture
+def coc(league_group, league_war) -> FakeCoC:
+    return FakeCoC(league_group, league_war)
+
+
+def test_current_round_numbers(league_group):
+    # rounds 0 to 4 are drawn, 5 and 6 are not
+    assert league.get_current_round_numbers(league_group["rounds"]) == (4, None)
+
+
+def test_current_round_numbers_all_drawn(league_group):
+    rounds = [dict(round, warTags=league_group["rounds"][0]["warTags"]) for round in league_group["rounds"]]
+    assert league.get_current_round_numbers(rounds) == (5, 6)
+
+
+def test_current_round_numbers_nothing_drawn(league_group):
+    rounds = [dict(round, warTags=["#0"] * 4) for round in league_group["rounds"]]
+    with pytest.raises(Exception, match="not been drawn"):
+        league.get_current_round_numbers(rounds)
+
+
+def test_pick_current_war(league_war):
+    clantag, opponent_tag = league_war["clan"]["tag"], league_war["opponent"]["tag"]
+    ended = dict(league_war, state="warEnded")
+    preparation = dict(league_war, state="preparation")
+
+    # the current round has ended, so the war of the next round is the ongoing one
+    assert league.pick_current_war(clantag, [ended, preparation]) == (preparation, "clan")
+    assert league.pick_current_war(opponent_tag, [dict(league_war, state="inWar"), preparation])[1] == "opponent"
+    assert league.pick_current_war(clantag, [ended]) == (ended, "clan")
+
+
+def test_find_current_war(coc, league_group):
+    clantag = league_group["clans"][0]["tag"]
+    war, clan_key = asyncio.run(league.find_current_war(coc, clantag, league_group))
+
+    assert war is coc.wars[league_group["rounds"][4]["warTags"][0]]
+    assert clan_key == "clan" and war["clan"]["tag"] == clantag
+    # without an index, every war of the round is fetched
+    assert coc.requests == league_group["rounds"][4]["warTags"]
+
+
+def test_find_current_war_as_opponent(coc, league_group):
+    clantag = league_group["clans"][-1]["tag"]
+    war, clan_key = asyncio.run(league.find_current_war(coc, clantag, league_group))
+
+    assert clan_key == "opponent" and war["opponent"]["tag"] == clantag
+    assert war["state"] == "inWar"
+
+
+def test_find_current_war_clan_not_in_group(coc, league_group):
+    with pytest.raises(Exception, match="Could not find a league war"):
+        asyncio.run(league.find_current_war(coc, "#NOTINGROUP", league_group))
+
+
+def test_index_fetches_only_the_clans_war(coc, league_group):
+    index = league.LeagueIndex(":memory:")
+    clantag = league_group["clans"][2]["tag"]
+
+    first = asyncio.run(league.find_current_war(coc, clantag, league_group, index))
+    coc.requests.clear()
+    second = asyncio.run(league.find_current_war(coc, clantag, league_group, index))
+
+    assert second == first
+    # the round is recorded, so the second lookup knows which war tag to fetch
+    assert coc.requests == [league_group["rounds"][4]["warTags"][2]]
+    index.close()
+
+
+def test_index_keeps_only_the_latest_season(league_war):
+    index = league.LeagueIndex(":memory:")
+    clantag, opponent_tag = league_war["clan"]["tag"], league_war["opponent"]["tag"]
+
+    index.record("2023-08", 0, {"#OLDWAR": league_war})
+    assert index.war_tag("2023-08", 0, opponent_tag) == "#OLDWAR"
+
+    index.record("2023-09", 0, {"#NEWWAR": league_war})
+    assert index.war_tag("2023-08", 0, clantag) is None
+    assert index.war_tag("2023-09", 0, clantag) == "#NEWWAR"
+    assert index.war_tag("2023-09", 1, clantag) is None
+    index.close()
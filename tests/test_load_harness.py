@@ -0,0 +1,16 @@
+import os
+import sys
+import subprocess
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_load_harness_runs_commands():
+    # a separate process, as main.py reads the CoC API settings when it is imported
+    result = subprocess.run([sys.executable, os.path.join(TESTS_DIR, "load_harness.py"),
+                             "--command", "player_progress", "current_war", "current_league_war",
+                             "--concurrency", "4", "--requests", "8", "--latency", "0.01", "--jitter", "0", "--port", "0"],
+                            capture_output=True, text=True, timeout=300)
+
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "player_progress: 8 invocations, 4 concurrent, 0 failed" in result.stdout
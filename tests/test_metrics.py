@@ -0,0 +1,86 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+import main
+from metrics import Metrics, metrics, endpoint
+
+
+class FakeCommand:
+    qualified_name = "player_progress"
+
+
+class FakeContext:
+    command = FakeCommand()
+
+    def __init__(self) -> None:
+        self.responses = []
+
+    async def respond(self, content=None) -> None:
+        self.responses.append(content)
+
+
+@pytest.fixture
+def counters():
+    metrics.clear()
+    yield metrics.counters
+    metrics.clear()
+
+
+def outcomes() -> dict:
+    return {dict(labels)["outcome"]: count for (name, labels), count in metrics.counters.items() if name == "coc_bot_commands_total"}
+
+
+def test_error_responses_count_as_failed_commands(monkeypatch, counters):
+    async def commands():
+        # built in the running loop, like setup() is before the bot runs
+        bot = main.CoCBot()
+        monkeypatch.setattr(main, "bot", bot)
+
+        failing, succeeding = FakeContext(), FakeContext()
+        for ctx in (failing, succeeding):
+            await bot.on_application_command(ctx)
+
+        await main.respond_error(failing, Exception("The passed playertag may not exist."))
+        await succeeding.respond("done")
+
+        for ctx in (failing, succeeding):
+            await bot.on_application_command_completion(ctx)
+        return bot
+
+    bot = asyncio.run(commands())
+
+    assert outcomes() == {"error": 1, "success": 1}
+    assert not bot.failed_commands and not bot.command_starts
+
+
+def test_endpoint_groups_tags():
+    assert endpoint("/players/%239C2PVQ8LJ") == "/players/{tag}"
+    assert endpoint("/clans/%232G2GRVR09/currentwar") == "/clans/{tag}/currentwar"
+
+
+def test_served_locally_in_prometheus_format():
+    registry = Metrics()
+    registry.increment("coc_api_requests_total", help="Requests", endpoint="/players/{tag}", status="200")
+    registry.observe("coc_bot_stage_seconds", 0.02, "Stages", command="player_progress", stage="fetch")
+
+    async def scrape():
+        # any free port, read back from the runner
+        runner = await registry.serve(0)
+        try:
+            host, port = runner.addresses[0][:2]
+            # bound to the loopback interface only
+            assert host == "127.0.0.1"
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f"http://127.0.0.1:{port}/metrics") as response:
+                    return response.headers["Content-Type"], await response.text()
+        finally:
+            await runner.cleanup()
+
+    content_type, text = asyncio.run(scrape())
+
+    assert content_type.startswith("text/plain; version=0.0.4")
+    assert 'coc_api_requests_total{endpoint="/players/{tag}",status="200"} 1' in text
+    assert 'coc_bot_stage_seconds_bucket{command="player_progress",stage="fetch",le="0.025"} 1' in text
+    assert 'coc_bot_stage_seconds_count{command="player_progress",stage="fetch"} 1' in text
@@ -0,0 +1,79 @@
+import copy
+
+import pytest
+
+import player_history
+from player_history import PlayerHistory, player_levels
+
+
+class Clock:
+    def __init__(self, now: float) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock(1_000_000.0)
+    monkeypatch.setattr(player_history.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def history():
+    history = PlayerHistory(":memory:")
+    yield history
+    history.close()
+
+
+def upgraded(player: dict, field: str, index: int) -> dict:
+    """The player with one more level on a unit"""
+    player = copy.deepcopy(player)
+    player[field][index]["level"] += 1
+    return player
+
+
+def test_record_writes_only_changed_levels(history, clock, player):
+    assert history.record([player]) == len(player_levels(player))
+
+    clock.now += 60
+    assert history.record([player]) == 0
+
+    clock.now += 60
+    assert history.record([upgraded(player, "troops", 0)]) == 1
+    assert history.levels_at(player["tag"])[("home", player["troops"][0]["name"])] == player["troops"][0]["level"] + 1
+
+
+def test_changes_since_before_first_record(history, clock, player):
+    first = clock.now
+    history.record([player])
+    clock.now += 24 * 60 * 60
+    history.record([upgraded(player, "heroes", 0)])
+
+    # asked for a week, but the player was only recorded a day ago, so compared against that
+    since, changes = history.changes_since(player["tag"], clock.now - 7 * 24 * 60 * 60)
+
+    hero = player["heroes"][0]
+    assert since == first
+    assert changes == [(hero.get("village", "home"), hero["name"], hero["level"], hero["level"] + 1)]
+
+
+def test_changes_since_between_records(history, clock, player):
+    history.record([player])
+    clock.now += 100
+    player = upgraded(player, "heroes", 0)
+    history.record([player])
+    clock.now += 100
+    history.record([upgraded(player, "spells", 0)])
+
+    since, changes = history.changes_since(player["tag"], clock.now - 50)
+
+    spell = player["spells"][0]
+    assert since == clock.now - 50
+    assert changes == [("home", spell["name"], spell["level"], spell["level"] + 1)]
+
+
+def test_changes_since_unknown_player(history):
+    assert history.changes_since("#NEVERSEEN", 0) == (None, [])
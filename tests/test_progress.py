@@ -0,0 +1,108 @@
+import pytest
+
+import bot_util
+import progress
+from hero import Hero
+from troop import Troop
+from spell import Spell
+from unit import Unit
+from static_data import registry
+
+CATEGORIES = {"heroes": Hero.create_hero_objects, "troops": Troop.create_troop_objects, "spells": Spell.create_spell_objects}
+TH_LEVELS = range(3, 16)
+
+
+def baseline_rows(units: list, th_level: int) -> list:
+    """The rows as computed before the vectorized engine, one dict per unit plus a summed Total row"""
+    rows = Unit.list_display_attributes(units, th_level=th_level)
+    total = bot_util.sum_dict_list_columns(rows, [0], ["Total"], int)
+    return [*rows, total]
+
+
+@pytest.mark.parametrize("th_level", TH_LEVELS)
+@pytest.mark.parametrize("category", CATEGORIES)
+def test_unit_progress_matches_baseline(player, category, th_level):
+    units = CATEGORIES[category](player=player)
+
+    rows = progress.progress_rows([unit.name for unit in units], progress.unit_progress(units, th_level), total="Total")
+
+    expected = baseline_rows(units, th_level)
+    assert [row["name"] for row in rows] == [row["name"] for row in expected]
+    for row, expected_row in zip(rows, expected):
+        assert {column: int(row[column]) for column in progress.PROGRESS_COLUMNS} == \
+               {column: int(expected_row[column]) for column in progress.PROGRESS_COLUMNS}, row["name"]
+
+
+@pytest.mark.parametrize("th_level", TH_LEVELS)
+def test_category_progress_matches_baseline(player, th_level):
+    categories = [create(player=player) for create in CATEGORIES.values()]
+
+    sums = progress.category_progress(categories, th_level)
+
+    for units, row in zip(categories, sums.tolist()):
+        total = baseline_rows(units, th_level)[-1]
+        assert row == [int(total[column]) for column in progress.PROGRESS_COLUMNS]
+
+
+def test_players_progress_matches_category_sums(player):
+    unit_lists = [[unit for create in CATEGORIES.values() for unit in create(player=player)]] * 3
+    th_levels = [9, 12, 15]
+
+    sums = progress.players_progress(unit_lists, th_levels)
+
+    for th_level, row in zip(th_levels, sums.tolist()):
+        assert row == progress.category_progress([unit_lists[0]], th_level)[0].tolist()
+
+
+def units_of(player: dict, *names: str) -> dict:
+    units = {unit.name: unit for create in CATEGORIES.values() for unit in create(player=player)}
+    return {name: units[name] for name in names}
+
+
+def test_max_levels_by_th(player):
+    units = units_of(player, "Barbarian King", "Healer", "Archer")
+
+    for unit in units.values():
+        max_levels = unit.max_levels_by_th()
+        assert len(max_levels) == registry.max_th_level() + 1
+        assert list(max_levels) == sorted(max_levels)
+        assert max_levels == tuple(unit.compute_max_level_th(th_level) for th_level in range(len(max_levels)))
+
+    king = units["Barbarian King"].max_levels_by_th()
+    assert king[6] == 0 and king[7] == 5
+    # unlocked at TH 6, but its first upgrade needs the laboratory of TH 7
+    healer = units["Healer"].max_levels_by_th()
+    assert healer[6] == 0 and healer[7] > 0
+
+
+def test_unlocked_by_th(player):
+    units = units_of(player, "Barbarian", "Archer", "Healer", "Barbarian King")
+
+    assert units["Barbarian"].unlocked_by_th()[1]
+    assert not units["Archer"].unlocked_by_th()[1] and units["Archer"].unlocked_by_th()[2]
+    assert not units["Healer"].unlocked_by_th()[5] and units["Healer"].unlocked_by_th()[6]
+    assert not units["Barbarian King"].unlocked_by_th()[6] and units["Barbarian King"].unlocked_by_th()[7]
+
+
+def test_unlocks_at(player):
+    units = [unit for create in CATEGORIES.values() for unit in create(player=player)]
+
+    def new_units(th_level: int) -> list:
+        return [name for name, old, new in progress.unlocks_at(units, th_level) if old == 0]
+
+    assert new_units(1) == ["Barbarian"]
+    # units unlocked at lower levels whose first upgrade comes later are not unlocked again
+    assert "Archer" not in new_units(3) and "Barbarian" not in new_units(3)
+    assert "Healer" in new_units(6) and "Healer" not in new_units(7)
+    assert "Barbarian King" in new_units(7)
+
+    unlocks = {name: (old, new) for name, old, new in progress.unlocks_at(units, 7)}
+    # an unlocked unit counts as level 1 until it can be upgraded
+    assert unlocks["Healer"][0] == 1 and unlocks["Healer"][1] > 1
+    assert unlocks["Barbarian King"] == (0, 5)
+    assert all(new > old for old, new in unlocks.values())
+
+
+def test_unlocks_at_clamps_past_the_highest_th(player):
+    units = units_of(player, "Barbarian", "Barbarian King").values()
+    assert progress.unlocks_at(list(units), registry.max_th_level() + 1) == []
@@ -0,0 +1,89 @@
+import os
+import asyncio
+
+import render_cache
+from render_cache import RenderCache, render_key
+
+
+def test_lru_eviction_by_size():
+    cache = RenderCache(max_bytes=100)
+
+    assert cache.put("a", b"a" * 40) == []
+    assert cache.put("b", b"b" * 40) == []
+    # a was used last, so b is the least recently used once c comes in
+    cache.get("a")
+    assert cache.put("c", b"c" * 40) == [("b", b"b" * 40)]
+
+    assert cache.get("b") is None
+    assert cache.get("a") == b"a" * 40 and cache.get("c") == b"c" * 40
+    assert cache.size == 80 and len(cache) == 2
+
+
+def test_too_large_png_not_cached():
+    cache = RenderCache(max_bytes=100)
+    assert cache.put("a", b"a" * 101) == []
+    assert len(cache) == 0 and cache.size == 0
+
+
+def test_spill_and_read_back(tmp_path):
+    cache = RenderCache(max_bytes=100, directory=str(tmp_path))
+
+    async def lookups() -> list:
+        await cache.store("a", b"a" * 60)
+        # evicts a to disk
+        await cache.store("b", b"b" * 60)
+        results = [await cache.load("a")]
+        # read back from disk and promoted to memory, which spills b
+        results.append(await cache.load("a"))
+        results.append(await cache.load("b"))
+        results.append(await cache.load("missing"))
+        return results
+
+    results = asyncio.run(lookups())
+
+    assert results == [(b"a" * 60, "disk"), (b"a" * 60, "memory"), (b"b" * 60, "disk"), (None, None)]
+    assert sorted(os.listdir(tmp_path)) == ["a.png", "b.png"]
+    assert cache.directory_size == 120
+
+
+def test_directory_budget_drops_oldest(tmp_path):
+    cache = RenderCache(max_bytes=10, directory=str(tmp_path), max_directory_bytes=25)
+
+    async def fill() -> None:
+        for key in "abcd":
+            await cache.store(key, key.encode() * 10)
+
+    asyncio.run(fill())
+
+    # d is still in memory, a was the oldest one on disk
+    assert sorted(os.listdir(tmp_path)) == ["b.png", "c.png"]
+    assert cache.directory_size == 20
+    assert asyncio.run(cache.load("a")) == (None, None)
+
+
+def test_spilled_pngs_survive_restart(tmp_path):
+    (tmp_path / "old.png").write_bytes(b"o" * 30)
+    (tmp_path / "older.png").write_bytes(b"p" * 30)
+    os.utime(tmp_path / "older.png", (0, 0))
+
+    cache = RenderCache(max_bytes=100, directory=str(tmp_path), max_directory_bytes=40)
+
+    assert asyncio.run(cache.load("old")) == (b"o" * 30, "disk")
+    # over budget once indexed, so the older file went first
+    assert os.listdir(tmp_path) == ["old.png"]
+    assert cache.directory_size == 30
+
+
+def test_render_key_depends_on_content():
+    key = render_key([["1", "2"]], ["a", "b"], "title")
+
+    assert key == render_key([["1", "2"]], ["a", "b"], "title")
+    assert key != render_key([["1", "3"]], ["a", "b"], "title")
+    assert key != render_key([["1", "2"]], ["a", "c"], "title")
+    assert key != render_key([["1", "2"]], ["a", "b"], "other title")
+
+
+def test_render_version_invalidates_keys(monkeypatch):
+    key = render_key([["1", "2"]], ["a", "b"], "title")
+    monkeypatch.setattr(render_cache, "RENDER_VERSION", render_cache.RENDER_VERSION + 1)
+    assert render_key([["1", "2"]], ["a", "b"], "title") != key
@@ -0,0 +1,88 @@
+import os
+import json
+import pickle
+from types import MappingProxyType
+
+import pytest
+
+import asset_compiler
+from static_data import StaticData, ASSETS_DIR, ASSET_FILES, UNIT_GROUP_ASSETS
+
+
+def plain(obj):
+    """Turn the registry's read-only views back into dicts and lists, so they can be compared"""
+    if isinstance(obj, (dict, MappingProxyType)):
+        return {key: plain(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [plain(value) for value in obj]
+    return obj
+
+
+@pytest.fixture
+def snapshot_path(tmp_path) -> str:
+    return str(tmp_path / "static_data.pickle")
+
+
+@pytest.fixture
+def checksum() -> str:
+    return asset_compiler.source_checksum(ASSETS_DIR, ASSET_FILES)
+
+
+def no_compiling(*args):
+    raise AssertionError("the assets were compiled instead of loaded from the snapshot")
+
+
+def test_snapshot_written_on_first_load(snapshot_path, checksum):
+    assert not os.path.exists(snapshot_path)
+
+    StaticData(snapshot_path=snapshot_path).unit_index()
+
+    assert asset_compiler.load_snapshot(snapshot_path, checksum) is not None
+
+
+def test_unit_index_from_snapshot_matches_json(monkeypatch, snapshot_path):
+    compiled = plain(StaticData(snapshot_path=snapshot_path).unit_index())
+
+    monkeypatch.setattr(asset_compiler, "compile_assets", no_compiling)
+    from_snapshot = plain(StaticData(snapshot_path=snapshot_path).unit_index())
+
+    assert from_snapshot == compiled
+
+    # every indexed record holds the fields the bot reads, as they are in the JSON files
+    for group, asset in UNIT_GROUP_ASSETS.items():
+        with open(os.path.join(ASSETS_DIR, ASSET_FILES[asset])) as jsonf:
+            records = [asset_compiler.strip_records({"": record}, asset_compiler.UNIT_FIELDS)[""]
+                       for record in json.load(jsonf).values()]
+        assert from_snapshot[group]
+        for record in from_snapshot[group].values():
+            assert record in records
+
+
+def test_stale_snapshot_is_recompiled(snapshot_path, checksum):
+    asset_compiler.write_snapshot(snapshot_path, {name: {} for name in ASSET_FILES}, "an older checksum")
+
+    registry = StaticData(snapshot_path=snapshot_path)
+
+    assert registry.unit_records("home_heroes")
+    assert asset_compiler.load_snapshot(snapshot_path, checksum) is not None
+
+
+@pytest.mark.parametrize("content", [
+    b"",
+    b"not a pickle",
+    # a pickle cut off halfway
+    pickle.dumps({"checksum": "x", "assets": {"a": list(range(1000))}})[:100],
+    # references to a module or class that does not exist (anymore)
+    b"cno_such_module\nThing\n.",
+    b"cbuiltins\nno_such_class\n.",
+    pickle.dumps(["not", "a", "dict"]),
+], ids=["empty", "garbage", "truncated", "missing module", "missing class", "wrong type"])
+def test_corrupt_snapshot_is_recompiled(snapshot_path, checksum, content):
+    with open(snapshot_path, "wb") as f:
+        f.write(content)
+
+    assert asset_compiler.load_snapshot(snapshot_path, checksum) is None
+
+    registry = StaticData(snapshot_path=snapshot_path)
+    assert registry.unit_records("home_heroes")
+    assert asset_compiler.load_snapshot(snapshot_path, checksum) is not None
@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+import bot_util
+from clash_of_clans import CoCAPIError
+from tag_cache import ClanTagCache
+
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path) -> ClanTagCache:
+    cache = ClanTagCache(str(tmp_path / "tag_cache.sqlite3"))
+    monkeypatch.setattr(bot_util, "clantag_cache", cache)
+    yield cache
+    cache.close()
+
+
+def test_database_opened_on_first_use(cache, tmp_path):
+    assert not os.path.exists(tmp_path / "tag_cache.sqlite3")
+
+    cache.put("#9C2PVQ8LJ", "#2G2GRVR09")
+    assert os.path.exists(tmp_path / "tag_cache.sqlite3")
+    assert cache.get("#9C2PVQ8LJ") == "#2G2GRVR09"
+
+
+@pytest.mark.parametrize("error", [CoCAPIError("busy", 429, "/clans/{tag}"), CoCAPIError("busy", 503, "/clans/{tag}"),
+                                   CoCAPIError("unreachable", 0, "/clans/{tag}"), Exception("not a tag"),
+                                   # not in CWL
+                                   CoCAPIError("not found", 404, "/clans/{tag}/currentwar/leaguegroup"),
+                                   # private war log
+                                   CoCAPIError("access denied", 403, "/clans/{tag}/currentwar"),
+                                   CoCAPIError("access denied", 403, "/clans/{tag}")])
+def test_forget_clantag_keeps_cache_of_existing_clan(cache, error):
+    cache.put("#9C2PVQ8LJ", "#2G2GRVR09")
+    bot_util.forget_clantag("#2G2GRVR09", error)
+    assert cache.get("#9C2PVQ8LJ") == "#2G2GRVR09"
+
+
+@pytest.mark.parametrize("endpoint", ["/clans/{tag}", "/clans/{tag}/currentwar"])
+def test_forget_clantag_drops_clan_that_cannot_be_found(cache, endpoint):
+    cache.put("#9C2PVQ8LJ", "#2G2GRVR09")
+    cache.put("#2PP", "#OTHERCLAN")
+
+    bot_util.forget_clantag("#2G2GRVR09", CoCAPIError("not found", 404, endpoint))
+
+    assert cache.get("#9C2PVQ8LJ") is None
+    assert cache.get("#2PP") == "#OTHERCLAN"
@@ -0,0 +1,95 @@
+import copy
+
+import pytest
+
+import war_events
+
+
+@pytest.fixture
+def war(league_war) -> dict:
+    """The league war fixture in battle day, without any attacks yet"""
+    war = copy.deepcopy(league_war)
+    war["state"] = "inWar"
+    for side in ("clan", "opponent"):
+        for member in war[side]["members"]:
+            member.pop("attacks", None)
+        war[side]["attacks"] = 0
+    return war
+
+
+def with_attacks(war: dict, *attacks: tuple) -> dict:
+    """The war plus attacks, each (attacking side, attacker index, defender index, stars)"""
+    war = copy.deepcopy(war)
+    order = max((attack["order"] for _, attack in war_events.iter_attacks(war)), default=0)
+    for side, attacker, defender, stars in attacks:
+        order += 1
+        defending_side = "opponent" if side == "clan" else "clan"
+        member = war[side]["members"][attacker]
+        member.setdefault("attacks", []).append({"attackerTag": member["tag"],
+                                                 "defenderTag": war[defending_side]["members"][defender]["tag"],
+                                                 "stars": stars, "destructionPercentage": 30 * stars, "order": order})
+        war[side]["attacks"] += 1
+    return war
+
+
+def test_nothing_before_the_first_snapshot(war):
+    assert war_events.diff_wars(None, war) == []
+
+
+def test_unchanged_war(war):
+    current = with_attacks(war, ("clan", 0, 0, 2))
+    assert war_events.diff_wars(current, copy.deepcopy(current)) == []
+
+
+def test_state_change(war):
+    preparation = dict(war, state="preparation")
+    events = war_events.diff_wars(preparation, war)
+    assert events == [{"type": "state", "from": "preparation", "to": "inWar"}]
+
+
+def test_new_war_reports_its_attacks(war):
+    previous = dict(war, preparationStartTime="20230801T000000.000Z")
+    current = with_attacks(war, ("clan", 0, 0, 1), ("opponent", 1, 2, 3))
+
+    events = war_events.diff_wars(previous, current)
+
+    # a new war has no previous state, and every attack in it is new
+    assert events[0] == {"type": "state", "from": None, "to": "inWar"}
+    assert [(event["ours"], event["attack"]["stars"]) for event in events[1:]] == [(True, 1), (False, 3)]
+
+
+def test_new_stars(war):
+    previous = with_attacks(war, ("clan", 0, 0, 2))
+    current = with_attacks(previous, ("clan", 1, 0, 3), ("clan", 2, 0, 3), ("opponent", 0, 1, 1))
+
+    events = war_events.diff_wars(previous, current)
+
+    assert all(event["type"] == "attack" for event in events)
+    # 2 stars were already won on that base, the first triple adds 1, the second nothing
+    assert [event["new_stars"] for event in events] == [1, 0, 1]
+    assert events[0]["attacker"]["tag"] == current["clan"]["members"][1]["tag"]
+    assert events[0]["defender"]["tag"] == current["opponent"]["members"][0]["tag"]
+
+
+def test_attacks_seen_from_the_opponent_side(war):
+    previous = with_attacks(war)
+    current = with_attacks(war, ("opponent", 0, 0, 3))
+
+    events = war_events.diff_wars(previous, current, clan_key="opponent")
+    assert events[0]["ours"] is True
+
+
+def test_split_messages_stay_under_the_limit():
+    lines = [f"Attacker {i} (TH 14) attacked Defender {i} (TH 14): 3 stars, 100% (+3 new stars)" for i in range(60)]
+
+    messages = war_events.split_messages("#2G2GRVR09", lines)
+
+    assert len(messages) > 1
+    assert all(len(message) <= war_events.DISCORD_MESSAGE_LIMIT for message in messages)
+    assert all(message.startswith("#2G2GRVR09\n") for message in messages)
+    assert [line for message in messages for line in message.split("\n")[1:]] == lines
+
+
+def test_split_messages_cuts_overlong_lines():
+    messages = war_events.split_messages("#2G2GRVR09", ["x" * 5000, "short"])
+    assert [len(message) for message in messages] == [2000, len("#2G2GRVR09\nshort")]
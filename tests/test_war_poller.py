@@ -0,0 +1,154 @@
+import time
+import asyncio
+
+import pytest
+
+import league
+from clash_of_clans import AsyncCoCAPI
+from fake_coc_api import FakeCoCAPI
+import war_poller
+from war_poller import WarPoller, POLL_INTERVALS
+
+CLAN_TAG = "#2G2GRVR09"
+
+
+def run_against_fake_api(test, setup=None):
+    """Run test(api, poller) against a fake CoC API on a free local port, setup(api) may change what it serves first"""
+    async def run():
+        api = FakeCoCAPI(latency=0, jitter=0, seed=0)
+        if setup is not None:
+            setup(api)
+        base_url = await api.start()
+
+        coc = AsyncCoCAPI(base_urls=[base_url], tokens=["test"])
+        poller = WarPoller(coc, league.LeagueIndex(":memory:"), clans=[])
+        try:
+            return await test(api, poller)
+        finally:
+            await poller.stop()
+            poller.index.close()
+            await coc.aclose()
+            await api.stop()
+
+    return asyncio.run(run())
+
+
+def test_poll_finds_regular_and_league_war():
+    async def test(api, poller):
+        return await poller.poll(CLAN_TAG)
+
+    snapshot = run_against_fake_api(test)
+
+    assert snapshot.war["state"] == "warEnded"
+    war, clan_key = snapshot.league_war
+    assert war["clan"]["tag"] == CLAN_TAG and clan_key == "clan"
+    assert snapshot.interval == POLL_INTERVALS["warEnded"]
+
+
+@pytest.mark.parametrize("state", ["inWar", "preparation"])
+def test_interval_follows_the_most_active_war(state):
+    async def test(api, poller):
+        api.war = dict(api.war, state=state)
+        return await poller.poll(CLAN_TAG)
+
+    assert run_against_fake_api(test).interval == POLL_INTERVALS[state]
+
+
+def test_interval_outside_of_cwl():
+    def outside_of_cwl(api):
+        api.league_group = None
+        api.war = dict(api.war, state="notInWar")
+
+    async def test(api, poller):
+        return await poller.poll(CLAN_TAG)
+
+    snapshot = run_against_fake_api(test, outside_of_cwl)
+
+    assert snapshot.league_group is None and snapshot.league_war is None
+    assert snapshot.interval == POLL_INTERVALS["notInWar"]
+
+
+def test_undrawn_league_wars_keep_the_regular_war():
+    def first_day_of_cwl(api):
+        # no war tags in any round yet
+        api.league_group = dict(api.league_group, state="preparation",
+                                rounds=[{"warTags": ["#0"] * 4} for _ in api.league_group["rounds"]])
+        api.war = dict(api.war, state="notInWar")
+
+    async def test(api, poller):
+        return await poller.poll(CLAN_TAG), poller.snapshot(CLAN_TAG)
+
+    snapshot, served = run_against_fake_api(test, first_day_of_cwl)
+
+    assert snapshot.war["state"] == "notInWar" and snapshot.league_war is None
+    assert served is snapshot
+    # polled like the league group's state, not like a clan outside of war
+    assert snapshot.interval == POLL_INTERVALS["preparation"]
+
+
+def test_snapshot_freshness():
+    async def test(api, poller):
+        snapshot = await poller.poll(CLAN_TAG)
+        fresh = poller.snapshot(CLAN_TAG)
+
+        # as if the poller fell behind by more than one interval
+        snapshot.fetched_at -= 2 * snapshot.interval + 1
+        return snapshot, fresh, poller.snapshot(CLAN_TAG)
+
+    snapshot, fresh, stale = run_against_fake_api(test)
+
+    assert fresh is snapshot
+    assert stale is None
+
+
+def test_quiet_snapshot_expires_before_its_next_poll(monkeypatch):
+    monkeypatch.setattr(war_poller, "SNAPSHOT_MAX_AGE", 120)
+
+    def outside_of_war(api):
+        api.league_group = None
+        api.war = dict(api.war, state="notInWar")
+
+    async def test(api, poller):
+        snapshot = await poller.poll(CLAN_TAG)
+        snapshot.fetched_at -= 121
+        return snapshot, poller.snapshot(CLAN_TAG)
+
+    snapshot, served = run_against_fake_api(test, outside_of_war)
+
+    # polled every 30 min, but the war may have started since, so it is not served
+    assert snapshot.interval == POLL_INTERVALS["notInWar"]
+    assert served is None
+
+
+def test_snapshot_does_not_register_unknown_clans():
+    async def test(api, poller):
+        poller.start()
+        served = poller.snapshot("#NOTACLAN")
+        await asyncio.sleep(0.05)
+        return served, poller._clans, api.requests
+
+    served, clans, requests = run_against_fake_api(test)
+
+    assert served is None and clans == {}
+    assert requests == {}
+
+
+def test_run_polls_registered_clans_on_their_interval():
+    async def test(api, poller):
+        api.war = dict(api.war, state="inWar")
+        poller.start()
+        # a command that found the clan registers it, the poller picks it up right away
+        assert poller.snapshot(CLAN_TAG) is None
+        poller.register(CLAN_TAG)
+
+        for _ in range(100):
+            if CLAN_TAG in poller.snapshots:
+                break
+            await asyncio.sleep(0.01)
+
+        return poller.snapshot(CLAN_TAG), poller._next_poll[CLAN_TAG] - time.monotonic()
+
+    snapshot, next_poll_in = run_against_fake_api(test)
+
+    assert snapshot is not None and snapshot.war["state"] == "inWar"
+    assert POLL_INTERVALS["inWar"] - 5 < next_poll_in <= POLL_INTERVALS["inWar"]